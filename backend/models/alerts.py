@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional
+from datetime import datetime
+import uuid
+
+from services.alerts import check_webhook_url
+
+class PriceAlert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    commodity: str
+    market: str
+    direction: Literal["above", "below"]
+    threshold: float
+    contact: Optional[str] = None
+    webhook_url: Optional[str] = None
+    last_triggered_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PriceAlertCreate(BaseModel):
+    commodity: str
+    market: str
+    direction: Literal["above", "below"]
+    threshold: float = Field(gt=0)
+    contact: Optional[str] = None
+    webhook_url: Optional[str] = None
+
+    @field_validator("webhook_url")
+    @classmethod
+    def webhook_is_allowed(cls, url: Optional[str]) -> Optional[str]:
+        # The server POSTs to this URL, so it must not reach internal services;
+        # host names are also resolved and checked before the alert is stored
+        return None if url is None else check_webhook_url(url)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime, date
 import uuid
 
@@ -23,13 +23,45 @@ class MarketPriceCreate(BaseModel):
     market: str
     price: float
     unit: str
-    change: str
+    # Free text kept for compatibility; /market/latest derives change from the previous observation
+    change: str = ""
     date: date
 
+# The `date` field of MarketPriceUpdate defaults to None, which shadows the type
+# when pydantic resolves its annotation
+DateValue = date
+
 class MarketPriceUpdate(BaseModel):
     commodity: Optional[BilingualText] = None
     market: Optional[str] = None
     price: Optional[float] = None
     unit: Optional[str] = None
     change: Optional[str] = None
-    date: Optional[date] = None
\ No newline at end of file
+    date: Optional[DateValue] = None
+class MarketRollup(BaseModel):
+    commodity: BilingualText
+    market: str
+    period: str
+    start: date
+    end: date
+    first: float
+    last: float
+    min: float
+    max: float
+    mean: float
+    count: int
+    moving_averages: Dict[str, Optional[float]] = {}
+
+class MarketLatestPrice(BaseModel):
+    commodity: BilingualText
+    market: str
+    price_id: str
+    price: float
+    unit: str
+    date: date
+    change: str
+    change_amount: Optional[float] = None
+    change_percent: Optional[float] = None
+    previous_price: Optional[float] = None
+    previous_date: Optional[date] = None
+    updated_at: datetime
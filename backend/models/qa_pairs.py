@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
@@ -29,6 +29,15 @@ class ChatRequest(BaseModel):
     question: str
     language: str = "hindi"
 
+class ChatAlternative(BaseModel):
+    id: str
+    question: str
+    category: str
+    confidence: float
+
 class ChatResponse(BaseModel):
     answer: str
-    category: str
\ No newline at end of file
+    category: str
+    confidence: float = 0.0
+    question_id: Optional[str] = None
+    alternatives: List[ChatAlternative] = []
\ No newline at end of file
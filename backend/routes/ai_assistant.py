@@ -1,66 +1,263 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
-from models.qa_pairs import QAPair, QAPairCreate, QAPairUpdate, ChatRequest, ChatResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional, List, Tuple
+from models.qa_pairs import QAPair, QAPairCreate, QAPairUpdate, ChatAlternative, ChatRequest, ChatResponse
 from datetime import datetime
+import os
+import asyncio
+from services.pagination import (
+    ID_SORT, MAX_PAGE_SIZE, fetch_page, keyset_cursor, ndjson_response, set_next_cursor, wants_ndjson
+)
+from services.projection import (
+    parse_fields, partial_model, projection_for, render_item, render_list, resolve_language
+)
+from services.cache import ANSWER_CACHE, CachedResponse, LIST_TAG, cache_key, content_cache, item_tag
+from services.coherence import publish_change
+from services.conditional import (
+    ITEM_VARY, LIST_VARY, conditional, item_validators, list_validators, replay
+)
+from services.qa_index import ALTERNATIVES, MIN_CONFIDENCE, Match, PreparedQuery, Ranking, qa_index
+from services.scoring_pool import CHAT_BATCH_DEADLINE_SECONDS, scoring_pool
+from services.search import normalize_question
 
 router = APIRouter()
 
 # MongoDB connection
 from database import db
 
+cache = content_cache("qa_pairs")
+
+# Largest batch accepted by /ai/chat/batch
+MAX_CHAT_BATCH = int(os.environ.get("MAX_CHAT_BATCH", "1000"))
+# Questions of a batch answered by the fallback ranking when the pool is busy;
+# the fallback runs on the event loop, so the rest get the busy answer instead
+CHAT_FALLBACK_BATCH = int(os.environ.get("CHAT_FALLBACK_BATCH", "20"))
+# Questions tokenized between two yields to the event loop
+PREPARE_CHUNK = 50
+
 @router.get("/ai/questions", response_model=List[QAPair])
-async def get_qa_pairs(category: Optional[str] = Query(None)):
-    """Get all Q&A pairs with optional category filtering"""
+async def get_qa_pairs(
+    request: Request,
+    category: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    format: Optional[str] = Query(None)
+):
+    """Get Q&A pairs with optional category filtering, one page at a time"""
     try:
         filter_query = {}
         
         if category and category != "all":
             filter_query["category"] = category
         
-        qa_pairs = await db.qa_pairs.find(filter_query).to_list(1000)
-        return [QAPair(**qa) for qa in qa_pairs]
+        selected = parse_fields(QAPair, fields)
+        language = resolve_language(request, lang)
+        item_model = partial_model(QAPair, selected, language)
+        projection = projection_for(QAPair, selected, ID_SORT, language)
+
+        if wants_ndjson(request, format):
+            cursor = keyset_cursor(
+                db.qa_pairs, filter_query, ID_SORT, after, limit, projection=projection
+            )
+            return ndjson_response(cursor, item_model)
+
+        key = cache_key(
+            "list", filter=filter_query, fields=selected, lang=language, limit=limit, after=after
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await list_validators(db.qa_pairs, key)
+        unchanged = conditional(request, validators, "qa_pairs", LIST_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        qa_pairs, next_cursor = await fetch_page(
+            db.qa_pairs, filter_query, ID_SORT, after, limit, projection=projection
+        )
+        page = render_list(qa_pairs, item_model)
+        set_next_cursor(page, next_cursor)
+        page.headers.update(validators.headers("qa_pairs", LIST_VARY))
+        tags = [LIST_TAG, *(item_tag(document["id"]) for document in qa_pairs)]
+        cache.set(key, CachedResponse.from_response(page), tags)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _text(value: dict, language: str) -> str:
+    return value["hindi"] if language == "hindi" else value["english"]
+
+def chat_key(question: str, language: str) -> Tuple[str, str]:
+    return normalize_question(question), language
+
+def chat_response(matches: List[Match], language: str) -> ChatResponse:
+    """Answer from the best match, or the default answer when no match is trusted"""
+    if matches and matches[0].confidence >= MIN_CONFIDENCE:
+        best, others = matches[0], matches[1:]
+        return ChatResponse(
+            answer=_text(best.qa["answer"], language),
+            category=best.qa["category"],
+            confidence=round(best.confidence, 3),
+            question_id=best.qa["id"],
+            alternatives=[
+                ChatAlternative(
+                    id=match.qa["id"],
+                    question=_text(match.qa["question"], language),
+                    category=match.qa["category"],
+                    confidence=round(match.confidence, 3),
+                )
+                for match in others
+            ],
+        )
+    # Default response if no match found
+    default_answer = (
+        "मुझे खुशी होगी आपकी मदद करने में। कृपया अपना प्रश्न और स्पष्ट तरीके से पूछें।" 
+        if language == "hindi" 
+        else "I would be happy to help you. Please ask your question more clearly."
+    )
+    return ChatResponse(answer=default_answer, category="General")
+
+def busy_response(language: str) -> ChatResponse:
+    """Answer for a question the overloaded scorer could not get to"""
+    busy_answer = (
+        "अभी बहुत सारे प्रश्न आ रहे हैं। कृपया थोड़ी देर बाद फिर से पूछें।"
+        if language == "hindi"
+        else "Too many questions are being answered right now. Please ask again in a little while."
+    )
+    return ChatResponse(answer=busy_answer, category="General")
+
+async def prepare_questions(questions: List[str]) -> List[PreparedQuery]:
+    """Tokenize a batch on the event loop, yielding regularly so other requests keep being served"""
+    prepared = []
+    for start in range(0, len(questions), PREPARE_CHUNK):
+        prepared.extend(qa_index.prepare(question) for question in questions[start:start + PREPARE_CHUNK])
+        await asyncio.sleep(0)
+    return prepared
+
+def quick_score_some(prepared: List[PreparedQuery], limit: int) -> List[Optional[Ranking]]:
+    """Batch fallback: cheap ranking for the first few questions only, None for the rest"""
+    answered = [qa_index.quick_score(query, limit) for query in prepared[:CHAT_FALLBACK_BATCH]]
+    return answered + [None] * (len(prepared) - len(answered))
+
+def remember_answer(key: Tuple[str, str], matches: List[Match], response: ChatResponse) -> None:
+    """Cache an answer tagged with every Q&A pair it was ranked from"""
+    tags = [LIST_TAG, *(item_tag(match.qa["id"]) for match in matches)]
+    ANSWER_CACHE.set(key, response, tags)
+
 @router.post("/ai/chat", response_model=ChatResponse)
 async def chat_with_ai(chat_request: ChatRequest):
-    """Simple chat functionality using predefined Q&A pairs"""
+    """Answer from the best BM25 match among the Q&A pairs, with alternatives"""
     try:
-        question = chat_request.question.lower()
-        language = chat_request.language
-        
-        # Search for matching Q&A pairs
-        matching_qa = await db.qa_pairs.find({
-            "$or": [
-                {"question.hindi": {"$regex": question, "$options": "i"}},
-                {"question.english": {"$regex": question, "$options": "i"}}
-            ]
-        }).to_list(100)
-        
-        if matching_qa:
-            # Return the best match (first one for now)
-            qa = QAPair(**matching_qa[0])
-            answer = qa.answer.hindi if language == "hindi" else qa.answer.english
-            return ChatResponse(answer=answer, category=qa.category)
-        else:
-            # Default response if no match found
-            default_answer = (
-                "मुझे खुशी होगी आपकी मदद करने में। कृपया अपना प्रश्न और स्पष्ट तरीके से पूछें।" 
-                if language == "hindi" 
-                else "I would be happy to help you. Please ask your question more clearly."
+        key = chat_key(chat_request.question, chat_request.language)
+        cached = ANSWER_CACHE.get(key)
+        if cached is not None:
+            return cached
+        if not qa_index.loaded:
+            await qa_index.load(db)
+
+        # Only the numpy scoring goes to the pool; tokenizing and building
+        # the answer are short and stay on the event loop
+        ranking, degraded = await scoring_pool.run(
+            qa_index.score, qa_index.quick_score, qa_index.prepare(chat_request.question), ALTERNATIVES + 1
+        )
+        matches = qa_index.matches(ranking)
+        response = chat_response(matches, chat_request.language)
+        # Fallback answers are not cached so the full ranking gets its turn
+        if not degraded:
+            remember_answer(key, matches, response)
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ai/chat/batch", response_model=List[ChatResponse])
+async def chat_batch(chat_requests: List[ChatRequest]):
+    """
+    Answer many questions in one request, e.g. from the SMS/IVR gateway.
+    Questions that normalize to the same text are resolved once, in a single
+    scoring job for the whole batch; answers come back in request order.
+    """
+    if len(chat_requests) > MAX_CHAT_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_CHAT_BATCH} questions per batch")
+    try:
+        keys = [chat_key(item.question, item.language) for item in chat_requests]
+        answers = {}
+        unresolved = {}
+        for key, item in zip(keys, chat_requests):
+            if key in answers or key in unresolved:
+                continue
+            cached = ANSWER_CACHE.get(key)
+            if cached is not None:
+                answers[key] = cached
+            else:
+                unresolved[key] = item.question
+
+        if unresolved:
+            if not qa_index.loaded:
+                await qa_index.load(db)
+            prepared = await prepare_questions(list(unresolved.values()))
+            rankings, degraded = await scoring_pool.run(
+                qa_index.score_many, quick_score_some, prepared,
+                ALTERNATIVES + 1, deadline=CHAT_BATCH_DEADLINE_SECONDS
             )
-            return ChatResponse(answer=default_answer, category="General")
+            for key, ranking in zip(unresolved, rankings):
+                if ranking is None:
+                    answers[key] = busy_response(key[1])
+                    continue
+                matches = qa_index.matches(ranking)
+                answers[key] = chat_response(matches, key[1])
+                if not degraded:
+                    remember_answer(key, matches, answers[key])
+
+        return [answers[key] for key in keys]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/ai/chat/stats")
+async def chat_stats():
+    """Answer cache hit rate and scoring pool saturation, for sizing both"""
+    return {
+        "index": {"qa_pairs": len(qa_index), "loaded": qa_index.loaded},
+        "answer_cache": ANSWER_CACHE.stats(),
+        "scoring_pool": scoring_pool.stats(),
+    }
+
 @router.get("/ai/questions/{qa_id}", response_model=QAPair)
-async def get_qa_pair(qa_id: str):
+async def get_qa_pair(
+    request: Request,
+    qa_id: str,
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None)
+):
     """Get a single Q&A pair by ID"""
     try:
-        qa = await db.qa_pairs.find_one({"id": qa_id})
+        selected = parse_fields(QAPair, fields)
+        language = resolve_language(request, lang)
+        projection = projection_for(QAPair, selected, language=language)
+        key = cache_key("item", id=qa_id, fields=selected, lang=language)
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await item_validators(db.qa_pairs, qa_id, key)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="Q&A pair not found")
+        unchanged = conditional(request, validators, "qa_pairs", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        qa = await db.qa_pairs.find_one({"id": qa_id}, projection)
         if qa is None:
             raise HTTPException(status_code=404, detail="Q&A pair not found")
-        return QAPair(**qa)
+        item = render_item(qa, partial_model(QAPair, selected, language))
+        item.headers.update(validators.headers("qa_pairs", ITEM_VARY))
+        cache.set(key, CachedResponse.from_response(item), [item_tag(qa_id)])
+        return item
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -70,6 +267,10 @@ async def create_qa_pair(qa_data: QAPairCreate):
     try:
         qa_pair = QAPair(**qa_data.dict())
         await db.qa_pairs.insert_one(qa_pair.dict())
+        qa_index.add(qa_pair.dict())
+        cache.invalidate(LIST_TAG)
+        ANSWER_CACHE.invalidate(LIST_TAG)
+        await publish_change(db, "qa_pairs", qa_pair.id, "insert")
         return qa_pair
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -88,8 +289,12 @@ async def update_qa_pair(qa_id: str, qa_data: QAPairUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Q&A pair not found")
+        cache.invalidate(LIST_TAG, item_tag(qa_id))
+        await publish_change(db, "qa_pairs", qa_id, "update")
             
         updated_qa = await db.qa_pairs.find_one({"id": qa_id})
+        qa_index.add(updated_qa)
+        ANSWER_CACHE.invalidate(item_tag(qa_id))
         return QAPair(**updated_qa)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -101,6 +306,10 @@ async def delete_qa_pair(qa_id: str):
         result = await db.qa_pairs.delete_one({"id": qa_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Q&A pair not found")
+        qa_index.remove(qa_id)
+        cache.invalidate(item_tag(qa_id))
+        ANSWER_CACHE.invalidate(item_tag(qa_id))
+        await publish_change(db, "qa_pairs", qa_id, "delete")
         return {"message": "Q&A pair deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
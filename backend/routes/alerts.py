@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Optional, List
+from models.alerts import PriceAlert, PriceAlertCreate
+from services.alerts import ALERTS_COLLECTION, alert_keys, name_key, verify_webhook_url
+from services.pagination import ID_SORT, MAX_PAGE_SIZE, fetch_page, set_next_cursor
+
+router = APIRouter()
+
+# MongoDB connection
+from database import db
+
+@router.get("/alerts", response_model=List[PriceAlert])
+async def get_price_alerts(
+    response: Response,
+    commodity: Optional[str] = Query(None),
+    market: Optional[str] = Query(None),
+    contact: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None)
+):
+    """List price alert subscriptions, one page at a time"""
+    try:
+        filter_query = {}
+        if commodity:
+            filter_query["commodity_key"] = name_key(commodity)
+        if market:
+            filter_query["market_key"] = name_key(market)
+        if contact:
+            filter_query["contact"] = contact
+
+        alerts, next_cursor = await fetch_page(
+            db[ALERTS_COLLECTION], filter_query, ID_SORT, after, limit, projection={"_id": 0}
+        )
+        set_next_cursor(response, next_cursor)
+        return [PriceAlert(**alert) for alert in alerts]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/alerts", response_model=PriceAlert)
+async def create_price_alert(alert_data: PriceAlertCreate):
+    """
+    Subscribe to a price crossing, e.g. wheat (in English or Hindi, any case)
+    at Azadpur going above 2500. The alert fires each time a new latest price
+    crosses the threshold in its direction.
+    """
+    try:
+        alert = PriceAlert(**alert_data.dict())
+        if alert.webhook_url:
+            try:
+                await verify_webhook_url(alert.webhook_url)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        await db[ALERTS_COLLECTION].insert_one({**alert.dict(), **alert_keys(alert.commodity, alert.market)})
+        return alert
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/alerts/{alert_id}")
+async def delete_price_alert(alert_id: str):
+    """Cancel a price alert subscription"""
+    try:
+        result = await db[ALERTS_COLLECTION].delete_one({"id": alert_id})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Price alert not found")
+        return {"message": "Price alert deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,51 +1,129 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List
 from models.crops import Crop, CropCreate, CropUpdate
 from datetime import datetime
+import re
+from services.search import (
+    match_clause, refresh_search_terms, touches_search_fields, with_search_terms
+)
+from services.pagination import (
+    ID_SORT, MAX_PAGE_SIZE, fetch_page, keyset_cursor, ndjson_response, set_next_cursor, wants_ndjson
+)
+from services.projection import (
+    parse_fields, partial_model, projection_for, render_item, render_list, resolve_language
+)
+from services.cache import CachedResponse, LIST_TAG, cache_key, content_cache, item_tag
+from services.coherence import publish_change
+from services.conditional import (
+    ITEM_VARY, LIST_VARY, conditional, item_validators, list_validators, replay
+)
 
 router = APIRouter()
 
 # MongoDB connection
 from database import db
 
+cache = content_cache("crops")
+
 @router.get("/crops", response_model=List[Crop])
 async def get_crops(
+    request: Request,
     season: Optional[str] = Query(None),
     soil_type: Optional[str] = Query(None),
-    region: Optional[str] = Query(None)
+    region: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    format: Optional[str] = Query(None)
 ):
-    """Get all crops with optional filtering"""
+    """Get crops with optional filtering, one page at a time"""
     try:
         filter_query = {}
+        term_clauses = []
         
         if season and season != "all":
-            filter_query["$or"] = [
-                {"season.hindi": {"$regex": season, "$options": "i"}},
-                {"season.english": {"$regex": season, "$options": "i"}}
-            ]
+            term_clauses.append(match_clause(["season"], season))
             
         if soil_type:
-            filter_query["$or"] = filter_query.get("$or", []) + [
-                {"soil_type.hindi": {"$regex": soil_type, "$options": "i"}},
-                {"soil_type.english": {"$regex": soil_type, "$options": "i"}}
-            ]
+            term_clauses.append(match_clause(["soil_type"], soil_type))
+
+        if term_clauses:
+            filter_query["$and"] = term_clauses
             
         if region:
-            filter_query["region"] = {"$regex": region, "$options": "i"}
+            filter_query["region"] = {"$regex": re.escape(region), "$options": "i"}
         
-        crops = await db.crops.find(filter_query).to_list(1000)
-        return [Crop(**crop) for crop in crops]
+        selected = parse_fields(Crop, fields)
+        language = resolve_language(request, lang)
+        item_model = partial_model(Crop, selected, language)
+        projection = projection_for(Crop, selected, ID_SORT, language)
+
+        if wants_ndjson(request, format):
+            cursor = keyset_cursor(
+                db.crops, filter_query, ID_SORT, after, limit, projection=projection
+            )
+            return ndjson_response(cursor, item_model)
+
+        key = cache_key(
+            "list", filter=filter_query, fields=selected, lang=language, limit=limit, after=after
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await list_validators(db.crops, key)
+        unchanged = conditional(request, validators, "crops", LIST_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        crops, next_cursor = await fetch_page(
+            db.crops, filter_query, ID_SORT, after, limit, projection=projection
+        )
+        page = render_list(crops, item_model)
+        set_next_cursor(page, next_cursor)
+        page.headers.update(validators.headers("crops", LIST_VARY))
+        tags = [LIST_TAG, *(item_tag(document["id"]) for document in crops)]
+        cache.set(key, CachedResponse.from_response(page), tags)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/crops/{crop_id}", response_model=Crop)
-async def get_crop(crop_id: str):
+async def get_crop(
+    request: Request,
+    crop_id: str,
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None)
+):
     """Get a single crop by ID"""
     try:
-        crop = await db.crops.find_one({"id": crop_id})
+        selected = parse_fields(Crop, fields)
+        language = resolve_language(request, lang)
+        projection = projection_for(Crop, selected, language=language)
+        key = cache_key("item", id=crop_id, fields=selected, lang=language)
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await item_validators(db.crops, crop_id, key)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="Crop not found")
+        unchanged = conditional(request, validators, "crops", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        crop = await db.crops.find_one({"id": crop_id}, projection)
         if crop is None:
             raise HTTPException(status_code=404, detail="Crop not found")
-        return Crop(**crop)
+        item = render_item(crop, partial_model(Crop, selected, language))
+        item.headers.update(validators.headers("crops", ITEM_VARY))
+        cache.set(key, CachedResponse.from_response(item), [item_tag(crop_id)])
+        return item
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -54,7 +132,9 @@ async def create_crop(crop_data: CropCreate):
     """Create a new crop"""
     try:
         crop = Crop(**crop_data.dict())
-        await db.crops.insert_one(crop.dict())
+        await db.crops.insert_one(with_search_terms("crops", crop.dict()))
+        cache.invalidate(LIST_TAG)
+        await publish_change(db, "crops", crop.id, "insert")
         return crop
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -73,6 +153,11 @@ async def update_crop(crop_id: str, crop_data: CropUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Crop not found")
+
+        if touches_search_fields("crops", update_data):
+            await refresh_search_terms(db, "crops", crop_id)
+        cache.invalidate(LIST_TAG, item_tag(crop_id))
+        await publish_change(db, "crops", crop_id, "update")
             
         updated_crop = await db.crops.find_one({"id": crop_id})
         return Crop(**updated_crop)
@@ -86,6 +171,8 @@ async def delete_crop(crop_id: str):
         result = await db.crops.delete_one({"id": crop_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Crop not found")
+        cache.invalidate(item_tag(crop_id))
+        await publish_change(db, "crops", crop_id, "delete")
         return {"message": "Crop deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
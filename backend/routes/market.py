@@ -1,59 +1,377 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
-from datetime import date, datetime
-from models.market import MarketPrice, MarketPriceCreate, MarketPriceUpdate
+from datetime import date, datetime, timedelta
+from models.market import MarketPrice, MarketPriceCreate, MarketPriceUpdate, MarketRollup, MarketLatestPrice
+import re
+from pymongo.errors import DuplicateKeyError
+from services.search import match_clause, refresh_search_terms, touches_search_fields
+from services.pagination import (
+    MAX_PAGE_SIZE, NDJSON_MEDIA_TYPE, fetch_page, keyset_cursor, ndjson_response, set_next_cursor,
+    wants_ndjson
+)
+from services.projection import (
+    parse_fields, partial_model, projection_for, render_item, render_list, resolve_language
+)
+from services.coherence import publish_change
+from services.market_ingest import (
+    MarketIngestor, json_rows, ndjson_rows, price_document, prices_written, stored_values, upsert_price
+)
+from services.latest_prices import LATEST_COLLECTION
+from services.market_buckets import BUCKETS_COLLECTION, bucket_pipeline, buckets_enabled
+from services.market_compare import DEFAULT_WINDOW, MAX_WINDOW, compare_markets
+from services.rollups import (
+    ROLLUPS_COLLECTION, add_moving_averages, parse_windows, period_bounds, period_start_before
+)
+from services.price_importer import CsvPriceImport, content_import_id, read_lines
+from services.market_export import EXPORT_PROJECTION, EXPORT_SORT, MEDIA_TYPES, STREAMS
+from services.cache import cache_key
+from services.conditional import (
+    ITEM_VARY, LIST_VARY, conditional, item_validators, list_validators
+)
 
 router = APIRouter()
 
+# Latest prices first; id breaks ties between entries of the same day
+LATEST_FIRST = [("date", -1), ("id", -1)]
+
 # MongoDB connection
 from database import db
 
+def date_range(from_date: Optional[date], to_date: Optional[date]) -> dict:
+    """Inclusive range condition on the stored ISO date strings"""
+    condition = {}
+    if from_date:
+        condition["$gte"] = from_date.isoformat()
+    if to_date:
+        condition["$lte"] = to_date.isoformat()
+    return condition
+
 @router.get("/market", response_model=List[MarketPrice])
 async def get_market_prices(
+    request: Request,
     commodity: Optional[str] = Query(None),
     market: Optional[str] = Query(None),
-    date_filter: Optional[date] = Query(None, alias="date")
+    date_filter: Optional[date] = Query(None, alias="date"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    format: Optional[str] = Query(None)
 ):
-    """Get all market prices with optional filtering"""
+    """Get market prices with optional filtering, latest first, one page at a time"""
     try:
         filter_query = {}
         
         if commodity:
-            filter_query["$or"] = [
-                {"commodity.hindi": {"$regex": commodity, "$options": "i"}},
-                {"commodity.english": {"$regex": commodity, "$options": "i"}}
-            ]
+            filter_query.update(match_clause(["commodity"], commodity))
             
         if market:
-            filter_query["market"] = {"$regex": market, "$options": "i"}
+            filter_query["market"] = {"$regex": re.escape(market), "$options": "i"}
             
         if date_filter:
-            filter_query["date"] = date_filter
+            filter_query["date"] = date_filter.isoformat()
+        elif from_date or to_date:
+            filter_query["date"] = date_range(from_date, to_date)
         
-        # Sort by date descending to get latest prices first
-        market_data = await db.market_prices.find(filter_query).sort("date", -1).to_list(1000)
-        return [MarketPrice(**price) for price in market_data]
+        selected = parse_fields(MarketPrice, fields)
+        language = resolve_language(request, lang)
+        item_model = partial_model(MarketPrice, selected, language)
+        projection = projection_for(MarketPrice, selected, LATEST_FIRST, language)
+
+        # Date-bounded scans read the monthly buckets when bucketed storage is on
+        collection, pipeline = db.market_prices, None
+        if buckets_enabled() and "date" in filter_query:
+            collection, pipeline = db[BUCKETS_COLLECTION], bucket_pipeline(filter_query)
+
+        if wants_ndjson(request, format):
+            cursor = keyset_cursor(
+                collection, filter_query, LATEST_FIRST, after, limit, pipeline, projection
+            )
+            return ndjson_response(cursor, item_model)
+
+        key = cache_key(
+            "list", filter=filter_query, fields=selected, lang=language, limit=limit, after=after
+        )
+        validators = await list_validators(collection, key, source="market_prices")
+        unchanged = conditional(request, validators, "market_prices", LIST_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        market_data, next_cursor = await fetch_page(
+            collection, filter_query, LATEST_FIRST, after, limit, pipeline, projection
+        )
+        page = render_list(market_data, item_model)
+        set_next_cursor(page, next_cursor)
+        page.headers.update(validators.headers("market_prices", LIST_VARY))
+        return page
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/market/export")
+async def export_market_prices(
+    commodity: Optional[str] = Query(None),
+    market: Optional[str] = Query(None),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|columnar)$")
+):
+    """
+    Stream the full price history matching the filters, oldest first, as
+    NDJSON, CSV or the columnar binary format described in services.market_export
+    """
+    try:
+        filter_query = {}
+
+        if commodity:
+            filter_query.update(match_clause(["commodity"], commodity))
+
+        if market:
+            filter_query["market"] = {"$regex": re.escape(market), "$options": "i"}
+
+        if from_date or to_date:
+            filter_query["date"] = date_range(from_date, to_date)
+
+        cursor = db.market_prices.find(filter_query, EXPORT_PROJECTION).sort(EXPORT_SORT)
+        extension = "bin" if format == "columnar" else format
+        return StreamingResponse(
+            STREAMS[format](cursor),
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="market_prices.{extension}"'},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/market/latest", response_model=List[MarketLatestPrice])
+async def get_latest_market_prices(
+    request: Request,
+    commodity: Optional[str] = Query(None),
+    market: Optional[str] = Query(None)
+):
+    """
+    Current price of every commodity/market pair with its change against the
+    previous observation, read from the materialized latest-price view
+    """
+    try:
+        filter_query = {}
+        if commodity:
+            filter_query["$or"] = [{"commodity.english": commodity}, {"commodity.hindi": commodity}]
+        if market:
+            filter_query["market"] = market
+
+        key = cache_key("latest", filter=filter_query)
+        validators = await list_validators(db[LATEST_COLLECTION], key, source="market_prices")
+        unchanged = conditional(request, validators, "market_prices", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        latest = await db[LATEST_COLLECTION].find(filter_query, {"_id": 0}).sort(
+            [("commodity.english", 1), ("market", 1)]
+        ).to_list(None)
+        response = render_list(latest, MarketLatestPrice)
+        response.headers.update(validators.headers("market_prices", ITEM_VARY))
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/market/compare")
+async def compare_market_prices(
+    commodity: str = Query(...),
+    local: Optional[str] = Query(None),
+    markets: Optional[str] = Query(None),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    window: int = Query(DEFAULT_WINDOW, ge=2, le=MAX_WINDOW),
+    matrix: bool = Query(False)
+):
+    """
+    Compare one commodity across mandis over a date window (default: the 90
+    days up to `to`): latest prices, spread, percent difference against the
+    `local` mandi, volatility and trailing `window` statistics, as parallel
+    arrays indexed like `markets`. `matrix=true` adds pairwise latest-price
+    differences.
+    """
+    try:
+        to_date = to_date or date.today()
+        from_date = from_date or to_date - timedelta(days=90)
+        filter_query = {
+            "$or": [{"commodity.english": commodity}, {"commodity.hindi": commodity}],
+            "date": date_range(from_date, to_date),
+        }
+        if markets:
+            selected = [name.strip() for name in markets.split(",") if name.strip()]
+            if local and local not in selected:
+                selected.append(local)
+            filter_query["market"] = {"$in": selected}
+
+        names, dates, prices = [], [], []
+        cursor = db.market_prices.find(filter_query, {"_id": 0, "market": 1, "date": 1, "price": 1})
+        async for price in cursor.sort([("date", 1), ("id", 1)]):
+            names.append(price["market"])
+            dates.append(price["date"])
+            prices.append(price["price"])
+
+        try:
+            comparison = compare_markets(names, dates, prices, local, window, matrix)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return {"commodity": commodity, **comparison}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/market/rollups", response_model=List[MarketRollup])
+async def get_market_rollups(
+    commodity: Optional[str] = Query(None),
+    market: Optional[str] = Query(None),
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    ma: Optional[str] = Query(None),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Precomputed first/last/min/max/mean prices per day, week or month for each
+    commodity and market, oldest first. `commodity` (English or Hindi name) and
+    `market` match exactly; `ma=7,30` adds moving averages of the bucket means.
+    """
+    try:
+        try:
+            windows = parse_windows(ma)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        filter_query = {"period": period}
+        if commodity:
+            filter_query["$or"] = [{"commodity.english": commodity}, {"commodity.hindi": commodity}]
+        if market:
+            filter_query["market"] = market
+
+        since = None
+        if from_date or to_date:
+            filter_query["start"] = {}
+            if from_date:
+                since = period_bounds(period, from_date)[0]
+                lookback = period_start_before(period, since, windows[-1] - 1) if windows else since
+                filter_query["start"]["$gte"] = lookback.isoformat()
+                since = since.isoformat()
+            if to_date:
+                filter_query["start"]["$lte"] = to_date.isoformat()
+
+        cursor = db[ROLLUPS_COLLECTION].find(filter_query, {"_id": 0}).sort(
+            [("commodity.english", 1), ("market", 1), ("start", 1)]
+        )
+        rollups = []
+        returned = 0
+        async for rollup in cursor:
+            rollups.append(rollup)
+            # Lookback buckets before `from` only feed the moving averages
+            if since is None or rollup["start"] >= since:
+                returned += 1
+                if returned >= limit:
+                    break
+        rollups = add_moving_averages(rollups, windows, since)
+        return [MarketRollup(**rollup) for rollup in rollups]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/market/{price_id}", response_model=MarketPrice)
-async def get_market_price(price_id: str):
+async def get_market_price(
+    request: Request,
+    price_id: str,
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None)
+):
     """Get a single market price by ID"""
     try:
-        price = await db.market_prices.find_one({"id": price_id})
+        selected = parse_fields(MarketPrice, fields)
+        language = resolve_language(request, lang)
+        projection = projection_for(MarketPrice, selected, language=language)
+        key = cache_key("item", id=price_id, fields=selected, lang=language)
+        validators = await item_validators(db.market_prices, price_id, key)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="Market price not found")
+        unchanged = conditional(request, validators, "market_prices", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        price = await db.market_prices.find_one({"id": price_id}, projection)
         if price is None:
             raise HTTPException(status_code=404, detail="Market price not found")
-        return MarketPrice(**price)
+        item = render_item(price, partial_model(MarketPrice, selected, language))
+        item.headers.update(validators.headers("market_prices", ITEM_VARY))
+        return item
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/market", response_model=MarketPrice)
 async def create_market_price(price_data: MarketPriceCreate):
-    """Create a new market price entry"""
+    """Create a market price entry, or update the one for the same commodity, market and date"""
     try:
         market_price = MarketPrice(**price_data.dict())
-        await db.market_prices.insert_one(market_price.dict())
-        return market_price
+        # An observation already recorded for the commodity, market and date is updated
+        stored = await upsert_price(db, price_document(market_price))
+        await prices_written(db, [stored])
+        operation = "insert" if stored["id"] == market_price.id else "update"
+        await publish_change(db, "market_prices", stored["id"], operation)
+        return MarketPrice(**stored)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/market/bulk")
+async def bulk_upsert_market_prices(request: Request):
+    """
+    Upsert many market prices on (commodity, market, date) from a JSON array
+    or an application/x-ndjson stream, reporting failed rows individually
+    """
+    try:
+        if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+            rows = ndjson_rows(request.stream())
+        else:
+            try:
+                payload = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+            if not isinstance(payload, list):
+                raise HTTPException(status_code=400, detail="Expected a JSON array of market prices")
+            rows = json_rows(payload)
+
+        report = await MarketIngestor(db).ingest(rows)
+        return report.to_dict()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/market/import")
+async def import_market_prices_csv(
+    file: UploadFile = File(...),
+    import_id: Optional[str] = Query(None)
+):
+    """
+    Stream an Agmarknet-style CSV upload into market prices. An interrupted
+    import resumes from its last committed chunk when re-sent with the same
+    import_id (defaults to the file name, size and content digest).
+    """
+    try:
+        if not import_id:
+            import_id = await content_import_id(file.filename, file.read)
+            await file.seek(0)
+        importer = CsvPriceImport(db, import_id)
+        return await importer.run(read_lines(file.read))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -61,19 +379,31 @@ async def create_market_price(price_data: MarketPriceCreate):
 async def update_market_price(price_id: str, price_data: MarketPriceUpdate):
     """Update an existing market price"""
     try:
-        update_data = price_data.dict(exclude_unset=True)
+        update_data = stored_values(price_data.dict(exclude_unset=True))
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await db.market_prices.update_one(
-            {"id": price_id}, 
-            {"$set": update_data}
-        )
+        try:
+            previous = await db.market_prices.find_one_and_update(
+                {"id": price_id}, 
+                {"$set": update_data}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409, detail="A market price for this commodity, market and date already exists"
+            )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Market price not found")
+
+        if touches_search_fields("market_prices", update_data):
+            await refresh_search_terms(db, "market_prices", price_id)
             
         updated_price = await db.market_prices.find_one({"id": price_id})
+        await prices_written(db, [previous, updated_price])
+        await publish_change(db, "market_prices", price_id, "update")
         return MarketPrice(**updated_price)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -81,9 +411,13 @@ async def update_market_price(price_id: str, price_data: MarketPriceUpdate):
 async def delete_market_price(price_id: str):
     """Delete a market price entry"""
     try:
-        result = await db.market_prices.delete_one({"id": price_id})
-        if result.deleted_count == 0:
+        deleted = await db.market_prices.find_one_and_delete({"id": price_id})
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Market price not found")
+        await prices_written(db, [deleted])
+        await publish_change(db, "market_prices", price_id, "delete")
         return {"message": "Market price deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,22 +1,45 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from models.schemes import Scheme, SchemeCreate, SchemeUpdate
+from services.search import (
+    RANKED_SORT, SEARCH_FIELDS, ranked_pipeline, refresh_search_terms, touches_search_fields,
+    with_search_terms
+)
+from services.pagination import (
+    ID_SORT, MAX_PAGE_SIZE, fetch_page, keyset_cursor, ndjson_response, set_next_cursor, wants_ndjson
+)
+from services.projection import (
+    parse_fields, partial_model, projection_for, render_item, render_list, resolve_language
+)
 from datetime import datetime
+from services.cache import CachedResponse, LIST_TAG, cache_key, content_cache, item_tag
+from services.coherence import publish_change
+from services.conditional import (
+    ITEM_VARY, LIST_VARY, conditional, item_validators, list_validators, replay
+)
 
 router = APIRouter()
 
 # MongoDB connection
 from database import db
 
+cache = content_cache("schemes")
+
 @router.get("/schemes", response_model=List[Scheme])
 async def get_schemes(
+    request: Request,
     category: Optional[str] = Query(None),
     state: Optional[str] = Query(None),
-    search: Optional[str] = Query(None)
+    search: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    format: Optional[str] = Query(None)
 ):
-    """Get all schemes with optional filtering"""
+    """Get schemes with optional filtering, one page at a time"""
     try:
         filter_query = {}
         
@@ -26,27 +49,83 @@ async def get_schemes(
         if state and state != "all":
             filter_query["state"] = state
             
+        sort, pipeline = ID_SORT, None
         if search:
-            filter_query["$or"] = [
-                {"name.hindi": {"$regex": search, "$options": "i"}},
-                {"name.english": {"$regex": search, "$options": "i"}},
-                {"description.hindi": {"$regex": search, "$options": "i"}},
-                {"description.english": {"$regex": search, "$options": "i"}}
-            ]
-        
-        schemes = await db.schemes.find(filter_query).to_list(1000)
-        return [Scheme(**scheme) for scheme in schemes]
+            # Rank matches by relevance through the search term index
+            sort = RANKED_SORT
+            pipeline = ranked_pipeline(filter_query, SEARCH_FIELDS["schemes"], search)
+
+        selected = parse_fields(Scheme, fields)
+        language = resolve_language(request, lang)
+        item_model = partial_model(Scheme, selected, language)
+        projection = projection_for(Scheme, selected, sort, language)
+
+        if wants_ndjson(request, format):
+            cursor = keyset_cursor(
+                db.schemes, filter_query, sort, after, limit, pipeline, projection=projection
+            )
+            return ndjson_response(cursor, item_model)
+
+        key = cache_key(
+            "list", filter=pipeline or filter_query, fields=selected, lang=language,
+            limit=limit, after=after
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await list_validators(db.schemes, key)
+        unchanged = conditional(request, validators, "schemes", LIST_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        schemes, next_cursor = await fetch_page(
+            db.schemes, filter_query, sort, after, limit, pipeline, projection=projection
+        )
+        page = render_list(schemes, item_model)
+        set_next_cursor(page, next_cursor)
+        page.headers.update(validators.headers("schemes", LIST_VARY))
+        tags = [LIST_TAG, *(item_tag(document["id"]) for document in schemes)]
+        cache.set(key, CachedResponse.from_response(page), tags)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/schemes/{scheme_id}", response_model=Scheme)
-async def get_scheme(scheme_id: str):
+async def get_scheme(
+    request: Request,
+    scheme_id: str,
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None)
+):
     """Get a single scheme by ID"""
     try:
-        scheme = await db.schemes.find_one({"id": scheme_id})
+        selected = parse_fields(Scheme, fields)
+        language = resolve_language(request, lang)
+        projection = projection_for(Scheme, selected, language=language)
+        key = cache_key("item", id=scheme_id, fields=selected, lang=language)
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await item_validators(db.schemes, scheme_id, key)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="Scheme not found")
+        unchanged = conditional(request, validators, "schemes", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        scheme = await db.schemes.find_one({"id": scheme_id}, projection)
         if scheme is None:
             raise HTTPException(status_code=404, detail="Scheme not found")
-        return Scheme(**scheme)
+        item = render_item(scheme, partial_model(Scheme, selected, language))
+        item.headers.update(validators.headers("schemes", ITEM_VARY))
+        cache.set(key, CachedResponse.from_response(item), [item_tag(scheme_id)])
+        return item
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -55,7 +134,9 @@ async def create_scheme(scheme_data: SchemeCreate):
     """Create a new scheme"""
     try:
         scheme = Scheme(**scheme_data.dict())
-        await db.schemes.insert_one(scheme.dict())
+        await db.schemes.insert_one(with_search_terms("schemes", scheme.dict()))
+        cache.invalidate(LIST_TAG)
+        await publish_change(db, "schemes", scheme.id, "insert")
         return scheme
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -74,6 +155,11 @@ async def update_scheme(scheme_id: str, scheme_data: SchemeUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Scheme not found")
+
+        if touches_search_fields("schemes", update_data):
+            await refresh_search_terms(db, "schemes", scheme_id)
+        cache.invalidate(LIST_TAG, item_tag(scheme_id))
+        await publish_change(db, "schemes", scheme_id, "update")
             
         updated_scheme = await db.schemes.find_one({"id": scheme_id})
         return Scheme(**updated_scheme)
@@ -87,6 +173,8 @@ async def delete_scheme(scheme_id: str):
         result = await db.schemes.delete_one({"id": scheme_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Scheme not found")
+        cache.invalidate(item_tag(scheme_id))
+        await publish_change(db, "schemes", scheme_id, "delete")
         return {"message": "Scheme deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,38 +1,116 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List
 from models.storage import StorageGuide, StorageGuideCreate, StorageGuideUpdate
 from datetime import datetime
+from services.search import (
+    match_clause, refresh_search_terms, touches_search_fields, with_search_terms
+)
+from services.pagination import (
+    ID_SORT, MAX_PAGE_SIZE, fetch_page, keyset_cursor, ndjson_response, set_next_cursor, wants_ndjson
+)
+from services.projection import (
+    parse_fields, partial_model, projection_for, render_item, render_list, resolve_language
+)
+from services.cache import CachedResponse, LIST_TAG, cache_key, content_cache, item_tag
+from services.coherence import publish_change
+from services.conditional import (
+    ITEM_VARY, LIST_VARY, conditional, item_validators, list_validators, replay
+)
 
 router = APIRouter()
 
 # MongoDB connection
-from server import db
+from database import db
+
+cache = content_cache("storage_guides")
 
 @router.get("/storage", response_model=List[StorageGuide])
-async def get_storage_guides(item: Optional[str] = Query(None)):
-    """Get all storage guides with optional item filtering"""
+async def get_storage_guides(
+    request: Request,
+    item: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    format: Optional[str] = Query(None)
+):
+    """Get storage guides with optional item filtering, one page at a time"""
     try:
         filter_query = {}
         
         if item:
-            filter_query["$or"] = [
-                {"item.hindi": {"$regex": item, "$options": "i"}},
-                {"item.english": {"$regex": item, "$options": "i"}}
-            ]
+            filter_query.update(match_clause(["item"], item))
         
-        storage_guides = await db.storage_guides.find(filter_query).to_list(1000)
-        return [StorageGuide(**guide) for guide in storage_guides]
+        selected = parse_fields(StorageGuide, fields)
+        language = resolve_language(request, lang)
+        item_model = partial_model(StorageGuide, selected, language)
+        projection = projection_for(StorageGuide, selected, ID_SORT, language)
+
+        if wants_ndjson(request, format):
+            cursor = keyset_cursor(
+                db.storage_guides, filter_query, ID_SORT, after, limit, projection=projection
+            )
+            return ndjson_response(cursor, item_model)
+
+        key = cache_key(
+            "list", filter=filter_query, fields=selected, lang=language, limit=limit, after=after
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await list_validators(db.storage_guides, key)
+        unchanged = conditional(request, validators, "storage_guides", LIST_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        storage_guides, next_cursor = await fetch_page(
+            db.storage_guides, filter_query, ID_SORT, after, limit, projection=projection
+        )
+        page = render_list(storage_guides, item_model)
+        set_next_cursor(page, next_cursor)
+        page.headers.update(validators.headers("storage_guides", LIST_VARY))
+        tags = [LIST_TAG, *(item_tag(document["id"]) for document in storage_guides)]
+        cache.set(key, CachedResponse.from_response(page), tags)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/storage/{guide_id}", response_model=StorageGuide)
-async def get_storage_guide(guide_id: str):
+async def get_storage_guide(
+    request: Request,
+    guide_id: str,
+    fields: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None)
+):
     """Get a single storage guide by ID"""
     try:
-        guide = await db.storage_guides.find_one({"id": guide_id})
+        selected = parse_fields(StorageGuide, fields)
+        language = resolve_language(request, lang)
+        projection = projection_for(StorageGuide, selected, language=language)
+        key = cache_key("item", id=guide_id, fields=selected, lang=language)
+        cached = cache.get(key)
+        if cached is not None:
+            return replay(request, cached)
+
+        validators = await item_validators(db.storage_guides, guide_id, key)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="Storage guide not found")
+        unchanged = conditional(request, validators, "storage_guides", ITEM_VARY)
+        if unchanged is not None:
+            return unchanged
+
+        guide = await db.storage_guides.find_one({"id": guide_id}, projection)
         if guide is None:
             raise HTTPException(status_code=404, detail="Storage guide not found")
-        return StorageGuide(**guide)
+        item = render_item(guide, partial_model(StorageGuide, selected, language))
+        item.headers.update(validators.headers("storage_guides", ITEM_VARY))
+        cache.set(key, CachedResponse.from_response(item), [item_tag(guide_id)])
+        return item
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -41,7 +119,9 @@ async def create_storage_guide(guide_data: StorageGuideCreate):
     """Create a new storage guide"""
     try:
         storage_guide = StorageGuide(**guide_data.dict())
-        await db.storage_guides.insert_one(storage_guide.dict())
+        await db.storage_guides.insert_one(with_search_terms("storage_guides", storage_guide.dict()))
+        cache.invalidate(LIST_TAG)
+        await publish_change(db, "storage_guides", storage_guide.id, "insert")
         return storage_guide
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -60,6 +140,11 @@ async def update_storage_guide(guide_id: str, guide_data: StorageGuideUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Storage guide not found")
+
+        if touches_search_fields("storage_guides", update_data):
+            await refresh_search_terms(db, "storage_guides", guide_id)
+        cache.invalidate(LIST_TAG, item_tag(guide_id))
+        await publish_change(db, "storage_guides", guide_id, "update")
             
         updated_guide = await db.storage_guides.find_one({"id": guide_id})
         return StorageGuide(**updated_guide)
@@ -73,6 +158,8 @@ async def delete_storage_guide(guide_id: str):
         result = await db.storage_guides.delete_one({"id": guide_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Storage guide not found")
+        cache.invalidate(item_tag(guide_id))
+        await publish_change(db, "storage_guides", guide_id, "delete")
         return {"message": "Storage guide deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
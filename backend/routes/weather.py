@@ -1,14 +1,22 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, Dict, Any, List
-import aiohttp
 import os
-from datetime import datetime, timedelta
 import asyncio
+from models.weather import WeatherBatchRequest
+from services.stations import DEFAULT_STATIONS, StationIndex, station_index
+from services.weather_cache import WeatherCache, WeatherEntry, location_key
+from services.weather_client import WeatherUnavailable, weather_client
+from services.weather_prefetch import WeatherPrefetcher
 
 router = APIRouter()
 
 # MongoDB connection
-from server import db
+from database import db
+
+# Largest batch accepted by /weather/batch
+MAX_WEATHER_BATCH = int(os.environ.get("MAX_WEATHER_BATCH", "200"))
+# Upstream loads in flight at once across all batch requests
+WEATHER_BATCH_CONCURRENCY = int(os.environ.get("WEATHER_BATCH_CONCURRENCY", "10"))
 
 # Mock weather data for free tier simulation
 MOCK_WEATHER_DATA = {
@@ -50,91 +58,213 @@ MOCK_WEATHER_DATA = {
     }
 }
 
+# Stations that have mock data, for finding the closest one to any other station
+mock_stations = StationIndex()
+mock_stations.build([station for station in DEFAULT_STATIONS if station["name"] in MOCK_WEATHER_DATA])
+
+async def fetch_weather(location: str) -> Dict[str, Any]:
+    """Weather for a station from OpenWeatherMap, or mock data when no API key is configured"""
+    station = station_index.find(location)
+    if station is None:
+        raise WeatherUnavailable(f"Unknown location: {location}")
+    if weather_client.enabled:
+        return await weather_client.fetch({"lat": station["lat"], "lon": station["lon"]})
+    # Mock data of the nearest location that has some
+    nearest, _ = mock_stations.nearest(station["lat"], station["lon"])
+    return MOCK_WEATHER_DATA[nearest["name"]]
+
+weather_cache = WeatherCache(db)
+weather_prefetcher = WeatherPrefetcher(weather_cache, fetch_weather)
+
+async def find_station(location: Optional[str], lat: Optional[float], lon: Optional[float]) -> Dict[str, Any]:
+    """The station named, or the one nearest to lat/lon with its distance in km"""
+    if not station_index.loaded:
+        await station_index.load(db)
+    if lat is not None or lon is not None:
+        if lat is None or lon is None:
+            raise HTTPException(status_code=400, detail="lat and lon must be given together")
+        nearest = station_index.nearest(lat, lon)
+        if nearest is None:
+            raise HTTPException(status_code=404, detail="No weather stations indexed")
+        station, distance = nearest
+        return {**station, "distanceKm": round(distance, 1)}
+    station = station_index.find(location or "")
+    if station is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown location: {location}. See /api/weather/locations or query by lat and lon"
+        )
+    return station
+
+async def resolve_weather(location: str) -> WeatherEntry:
+    """Cached weather, falling back to the last known copy while upstream is unavailable"""
+    try:
+        entry = await weather_cache.get(location, fetch_weather)
+    except WeatherUnavailable as e:
+        entry = weather_cache.peek(location)
+        if entry is None:
+            weather_prefetcher.record(location, None)
+            raise HTTPException(status_code=503, detail=f"Weather unavailable: {e}")
+    weather_prefetcher.record(location, entry)
+    return entry
+
 @router.get("/weather")
-async def get_current_weather(location: Optional[str] = Query("Delhi")):
-    """Get current weather for a location"""
+async def get_current_weather(
+    location: Optional[str] = Query("Delhi"),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """Get current weather for a location, or for the station nearest to lat/lon"""
     try:
-        # For now, using mock data (free tier simulation)
-        # In production, this would integrate with OpenWeatherMap API
-        
-        weather_data = MOCK_WEATHER_DATA.get(location, MOCK_WEATHER_DATA["Delhi"])
-        
-        # Cache weather data in database for better performance
-        cache_key = f"weather_{location}_{datetime.now().strftime('%Y%m%d')}"
-        await db.weather_cache.update_one(
-            {"cache_key": cache_key},
-            {
-                "$set": {
-                    "cache_key": cache_key,
-                    "location": location,
-                    "data": weather_data,
-                    "updated_at": datetime.utcnow(),
-                    "expires_at": datetime.utcnow() + timedelta(hours=1)
-                }
-            },
-            upsert=True
-        )
+        station = await find_station(location, lat, lon)
+        entry = await resolve_weather(station["name"])
+        weather_data = entry.data
         
         return {
-            "location": location,
+            "location": station["name"],
+            "station": station,
             "current": weather_data["current"],
-            "forecast": weather_data["forecast"]
+            "forecast": weather_data["forecast"],
+            "stale": not entry.fresh()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/weather/forecast")
 async def get_weather_forecast(
     location: Optional[str] = Query("Delhi"),
-    days: Optional[int] = Query(7)
+    days: Optional[int] = Query(7),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180)
 ):
     """Get weather forecast for specified days"""
     try:
-        weather_data = MOCK_WEATHER_DATA.get(location, MOCK_WEATHER_DATA["Delhi"])
+        station = await find_station(location, lat, lon)
+        entry = await resolve_weather(station["name"])
+        weather_data = entry.data
         
         # Limit forecast to requested days
         forecast = weather_data["forecast"][:days]
         
         return {
-            "location": location,
+            "location": station["name"],
+            "station": station,
             "forecast": forecast,
-            "days": len(forecast)
+            "days": len(forecast),
+            "stale": not entry.fresh()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/weather/locations")
-async def get_available_locations():
-    """Get list of available weather locations"""
+batch_slots = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+
+async def _batch_load(location: str) -> WeatherEntry:
+    async with batch_slots:
+        return await resolve_weather(location)
+
+async def weather_batch(locations: List[str]) -> Dict[str, Any]:
+    """
+    Weather for many locations in one response. Fresh entries come straight
+    from memory; the rest load concurrently, at most WEATHER_BATCH_CONCURRENCY
+    at a time, and a failing location does not fail the batch.
+    """
+    if not station_index.loaded:
+        await station_index.load(db)
+    requested = {}
+    unknown = set()
+    for location in locations:
+        location = location.strip()
+        if not location:
+            continue
+        station = station_index.find(location)
+        if station is None:
+            unknown.add(location_key(location))
+        else:
+            location = station["name"]
+        requested.setdefault(location_key(location), location)
+    if not requested:
+        raise HTTPException(status_code=400, detail="No locations given")
+    if len(requested) > MAX_WEATHER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_WEATHER_BATCH} locations per batch")
+
+    outcomes = {}
+    misses = []
+    for key, location in requested.items():
+        if key in unknown:
+            outcomes[key] = LookupError(f"Unknown location: {location}")
+            continue
+        entry = weather_cache.cached(location)
+        if entry is not None:
+            weather_prefetcher.record(location, entry)
+            outcomes[key] = entry
+        else:
+            misses.append(key)
+    loaded = await asyncio.gather(*(_batch_load(requested[key]) for key in misses), return_exceptions=True)
+    outcomes.update(zip(misses, loaded))
+
+    results = []
+    for key, location in requested.items():
+        outcome = outcomes[key]
+        if isinstance(outcome, WeatherEntry):
+            results.append({
+                "location": location,
+                "status": "ok" if outcome.fresh() else "stale",
+                "current": outcome.data["current"],
+                "forecast": outcome.data["forecast"],
+            })
+        else:
+            detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            results.append({"location": location, "status": "error", "error": detail})
+
+    return {
+        "results": results,
+        "count": len(results),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+    }
+
+@router.get("/weather/batch")
+async def get_weather_batch(locations: str = Query(..., description="Comma-separated location names")):
+    """Current weather and forecast for several locations, e.g. a district dashboard"""
     try:
-        locations = list(MOCK_WEATHER_DATA.keys())
-        return {"locations": locations}
+        return await weather_batch(locations.split(","))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_external_weather_data(location: str, api_key: str) -> Dict[str, Any]:
-    """
-    Future implementation for OpenWeatherMap API integration
-    This function would be used when API key is available
-    """
-    base_url = "http://api.openweathermap.org/data/2.5"
-    
+@router.post("/weather/batch")
+async def post_weather_batch(batch: WeatherBatchRequest):
+    """Batch weather for location lists too long for a query string"""
+    try:
+        return await weather_batch(batch.locations)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/weather/stats")
+async def get_weather_stats():
+    """Hit counters of the weather cache tiers, the upstream client and the prefetcher"""
+    return {
+        "cache": weather_cache.stats(),
+        "upstream": weather_client.stats(),
+        "prefetch": weather_prefetcher.stats()
+    }
+
+@router.get("/weather/locations")
+async def get_available_locations():
+    """Get the indexed weather stations"""
     try:
-        async with aiohttp.ClientSession() as session:
-            # Current weather
-            current_url = f"{base_url}/weather?q={location}&appid={api_key}&units=metric"
-            async with session.get(current_url) as response:
-                current_data = await response.json()
-            
-            # 7-day forecast
-            forecast_url = f"{base_url}/forecast?q={location}&appid={api_key}&units=metric&cnt=7"
-            async with session.get(forecast_url) as response:
-                forecast_data = await response.json()
-            
-            return {
-                "current": current_data,
-                "forecast": forecast_data
-            }
+        if not station_index.loaded:
+            await station_index.load(db)
+        return {
+            "locations": [station["name"] for station in station_index.stations],
+            "stations": station_index.stations,
+            "count": len(station_index)
+        }
     except Exception as e:
-        # Fallback to mock data
-        return MOCK_WEATHER_DATA.get(location, MOCK_WEATHER_DATA["Delhi"])
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
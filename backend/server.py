@@ -11,7 +11,20 @@ import uuid
 from datetime import datetime
 
 # Import route modules
-from routes import schemes, crops, market, ai_assistant, storage, weather
+from routes import schemes, crops, market, alerts, ai_assistant, storage, weather
+from services.indexes import ensure_indexes
+from services.search import backfill_search_terms
+from services.rollups import backfill_rollups
+from services.latest_prices import backfill_latest
+from services.market_buckets import backfill_buckets
+from services.pagination import NEXT_CURSOR_HEADER
+from services.cache import cache_stats
+from services.coherence import CacheCoherence
+from services.qa_index import qa_index
+from services.scoring_pool import scoring_pool
+from services.weather_client import weather_client
+from services.stations import station_index
+from services.alerts import WebhookDispatcher, backfill_alert_keys
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,6 +34,12 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Keeps this worker's caches in step with writes made by the other workers
+cache_coherence = CacheCoherence(db)
+
+# Posts queued price alert notifications to their webhooks (ALERT_SINK=webhook)
+alert_dispatcher = WebhookDispatcher(db)
+
 # Create the main app without a prefix
 app = FastAPI(
     title="KrishiSahyog API",
@@ -57,10 +76,16 @@ async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters of the content response caches"""
+    return {"coherence": cache_coherence.active_mode, "caches": cache_stats()}
+
 # Include all route modules
 api_router.include_router(schemes.router, tags=["Government Schemes"])
 api_router.include_router(crops.router, tags=["Crop Guidance"])
 api_router.include_router(market.router, tags=["Market Prices"])
+api_router.include_router(alerts.router, tags=["Price Alerts"])
 api_router.include_router(ai_assistant.router, tags=["AI Assistant"])
 api_router.include_router(storage.router, tags=["Storage Guidance"])
 api_router.include_router(weather.router, tags=["Weather"])
@@ -74,6 +99,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 # Configure logging
@@ -83,6 +109,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def prepare_database():
+    await ensure_indexes(db)
+    await backfill_search_terms(db)
+    await backfill_rollups(db)
+    await backfill_latest(db)
+    await backfill_buckets(db)
+    await backfill_alert_keys(db)
+    await qa_index.load(db)
+    qa_index.follow_changes(db)
+    await station_index.load(db)
+    cache_coherence.start()
+    await weather_client.start()
+    weather.weather_prefetcher.start()
+    await alert_dispatcher.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await cache_coherence.stop()
+    await weather.weather_prefetcher.stop()
+    await alert_dispatcher.stop()
+    scoring_pool.shutdown()
+    await weather_client.close()
     client.close()
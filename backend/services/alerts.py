@@ -0,0 +1,416 @@
+"""
+Price alert evaluation
+Subscriptions live in price_alerts under a (commodity_key, market_key,
+direction, threshold) index, where the keys are the names folded like search
+terms so "wheat", "Wheat" and "गेहूं" all match a Wheat price. When the latest
+price of a pair moves from p0 to p1, the alerts it crossed are exactly the
+thresholds in [p0, p1) ("above") or (p1, p0] ("below"), so each write reads
+one index range per pair however many subscriptions exist. Triggered alerts
+are handed to a pluggable sink, by default the alert_outbox collection.
+
+Webhooks are never called on the write path: with ALERT_SINK=webhook a
+background dispatcher claims queued notifications that carry a webhook_url and
+POSTs them over one shared session, retrying failures with backoff.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Protocol
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from services.search import normalize_question
+
+logger = logging.getLogger(__name__)
+
+ALERTS_COLLECTION = "price_alerts"
+OUTBOX_COLLECTION = "alert_outbox"
+
+# outbox: queue notifications in alert_outbox | webhook: also POST queued ones to their alert's webhook_url
+ALERT_SINK = os.environ.get("ALERT_SINK", "outbox").lower()
+ALERT_BATCH_SIZE = int(os.environ.get("ALERT_BATCH_SIZE", "1000"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get("ALERT_WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_CONCURRENCY = 20
+# Comma-separated hosts webhooks may point at; empty allows any public https host
+WEBHOOK_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get("ALERT_WEBHOOK_HOSTS", "").split(",") if host.strip()
+)
+WEBHOOK_POLL_SECONDS = float(os.environ.get("ALERT_WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("ALERT_WEBHOOK_MAX_ATTEMPTS", "5"))
+# First retry delay, doubled after every failed attempt
+WEBHOOK_RETRY_SECONDS = 30
+
+NOTIFIED_FIELDS = ("id", "commodity", "market", "direction", "threshold", "contact", "webhook_url")
+
+
+def name_key(name: str) -> str:
+    """Folded form of a commodity or market name that alerts are matched on"""
+    return normalize_question(name)
+
+
+def alert_keys(commodity: str, market: str) -> Dict[str, str]:
+    return {"commodity_key": name_key(commodity), "market_key": name_key(market)}
+
+
+def public_address(address: str) -> bool:
+    """Whether an IP address is reachable on the public internet (not internal to the server)"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not (
+        ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+        or ip.is_multicast or ip.is_unspecified
+    )
+
+
+def _ip_literal(host: str) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        return None
+
+
+def check_webhook_url(url: str) -> str:
+    """
+    Reject webhook URLs the server should not call on a user's behalf: only
+    https is allowed, when ALERT_WEBHOOK_HOSTS is set only those hosts, and
+    an address given literally must be public. Host names are checked by
+    verify_webhook_url, which resolves them.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        raise ValueError("webhook_url must be an https URL")
+    if parts.username or parts.password:
+        raise ValueError("webhook_url must not carry credentials")
+    host = parts.hostname.lower()
+    if WEBHOOK_HOSTS and host not in WEBHOOK_HOSTS:
+        raise ValueError(f"webhook_url host {host} is not allowed")
+    address = _ip_literal(host)
+    if host == "localhost" or host.endswith(".localhost") or (address and not public_address(address)):
+        raise ValueError(f"webhook_url host {host} is not a public address")
+    return url
+
+
+async def resolve_host(host: str, port: int) -> List[str]:
+    """Addresses a host name resolves to"""
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+async def verify_webhook_url(url: str) -> str:
+    """
+    check_webhook_url plus resolving the host: every address it resolves to
+    must be public. Run when an alert is created and again before each POST,
+    since the host's DNS records can change in between.
+    """
+    parts = urlsplit(check_webhook_url(url))
+    host = parts.hostname.lower()
+    if _ip_literal(host):
+        return url
+    try:
+        addresses = await resolve_host(host, parts.port or 443)
+    except (OSError, UnicodeError):
+        raise ValueError(f"webhook_url host {host} does not resolve")
+    if not addresses or not all(public_address(address) for address in addresses):
+        raise ValueError(f"webhook_url host {host} is not a public address")
+    return url
+
+
+class PublicResolver(AbstractResolver):
+    """
+    Resolver for the webhook session that drops non-public addresses, so a
+    record changed after verify_webhook_url still cannot make the connection
+    reach an internal service
+    """
+
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET
+                      ) -> List[ResolveResult]:
+        results = [
+            result for result in await self._resolver.resolve(host, port, family)
+            if public_address(result["host"])
+        ]
+        if not results:
+            raise OSError(f"{host} has no public address")
+        return results
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+class AlertSink(Protocol):
+    async def deliver(self, notifications: List[Dict[str, Any]]) -> None:
+        ...
+
+
+class OutboxSink:
+    """Queue notifications for a separate dispatcher; (alert, price) pairs are queued once"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def deliver(self, notifications: List[Dict[str, Any]]) -> None:
+        try:
+            await self.db[OUTBOX_COLLECTION].insert_many(
+                [
+                    {**notification, "delivered": False, "attempts": 0,
+                     "next_attempt_at": notification["created_at"]}
+                    for notification in notifications
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            # Duplicate keys are notifications already queued by an earlier write
+            failures = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+            if failures:
+                logger.error("Failed to queue %d price alert notifications", len(failures))
+
+
+def _jsonable(document: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in document.items()}
+
+
+# Outbox fields that are delivery bookkeeping rather than part of the notification
+DELIVERY_FIELDS = ("_id", "webhook_url", "delivered", "attempts", "next_attempt_at", "last_error")
+
+
+class WebhookDispatcher:
+    """
+    Delivers queued notifications to their webhooks in the background.
+    Each notification is claimed by pushing its next_attempt_at past the
+    request timeout, so several workers can run a dispatcher without posting
+    the same notification twice; failures are retried with exponential backoff
+    and given up after WEBHOOK_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, db, enabled: bool = ALERT_SINK == "webhook", batch_size: int = ALERT_BATCH_SIZE,
+                 poll_seconds: float = WEBHOOK_POLL_SECONDS, verify_urls: bool = True):
+        self.db = db
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.verify_urls = verify_urls
+        self.timeout = aiohttp.ClientTimeout(total=WEBHOOK_TIMEOUT_SECONDS)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._open()
+            self._task = asyncio.create_task(self._run())
+
+    def _open(self) -> None:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=WEBHOOK_CONCURRENCY, resolver=PublicResolver() if self.verify_urls else None
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delivered = await self.deliver_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Alert webhook dispatch failed")
+                delivered = 0
+            # A full batch means more are probably waiting
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _claim(self, now: datetime) -> Optional[Dict[str, Any]]:
+        return await self.db[OUTBOX_COLLECTION].find_one_and_update(
+            {"delivered": False, "webhook_url": {"$type": "string"}, "next_attempt_at": {"$lte": now}},
+            {"$set": {"next_attempt_at": now + timedelta(seconds=2 * WEBHOOK_TIMEOUT_SECONDS)}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def deliver_pending(self) -> int:
+        """Claim and POST up to one batch of due notifications; returns how many were attempted"""
+        self._open()
+        now = datetime.utcnow()
+        claimed = []
+        while len(claimed) < self.batch_size:
+            notification = await self._claim(now)
+            if notification is None:
+                break
+            claimed.append(notification)
+
+        semaphore = asyncio.Semaphore(WEBHOOK_CONCURRENCY)
+
+        async def post(notification: Dict[str, Any]) -> None:
+            async with semaphore:
+                error = await self._post(notification)
+            await self._record(notification, error)
+
+        await asyncio.gather(*(post(notification) for notification in claimed))
+        return len(claimed)
+
+    async def _post(self, notification: Dict[str, Any]) -> Optional[str]:
+        """POST one notification; returns why it failed, or None"""
+        url = notification["webhook_url"]
+        try:
+            if self.verify_urls:
+                await verify_webhook_url(url)
+            body = {key: value for key, value in notification.items() if key not in DELIVERY_FIELDS}
+            # Redirects are not followed so a vetted host cannot bounce the request elsewhere
+            async with self._session.post(url, json=_jsonable(body), allow_redirects=False) as response:
+                if response.status >= 300:
+                    return f"answered {response.status}"
+        except ValueError as e:
+            return str(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return str(e) or type(e).__name__
+        return None
+
+    async def _record(self, notification: Dict[str, Any], error: Optional[str]) -> None:
+        outbox = self.db[OUTBOX_COLLECTION]
+        if error is None:
+            await outbox.update_one(
+                {"_id": notification["_id"]},
+                {"$set": {"delivered": True, "delivered_at": datetime.utcnow()}},
+            )
+            return
+        attempts = notification.get("attempts", 0) + 1
+        retry = attempts < WEBHOOK_MAX_ATTEMPTS
+        logger.warning("Alert webhook %s failed (attempt %d): %s", notification["webhook_url"], attempts, error)
+        await outbox.update_one(
+            {"_id": notification["_id"]},
+            {"$set": {
+                "attempts": attempts,
+                "last_error": error,
+                # Given up notifications stay in the outbox for inspection but are never claimed again
+                "next_attempt_at": (
+                    datetime.utcnow() + timedelta(seconds=WEBHOOK_RETRY_SECONDS * 2 ** (attempts - 1))
+                    if retry else None
+                ),
+            }},
+        )
+
+
+_sink: Optional[AlertSink] = None
+
+
+def set_alert_sink(sink: AlertSink) -> None:
+    """Replace the configured sink, e.g. with a message queue publisher"""
+    global _sink
+    _sink = sink
+
+
+def alert_sink(db) -> AlertSink:
+    global _sink
+    if _sink is None:
+        _sink = OutboxSink(db)
+    return _sink
+
+
+async def backfill_alert_keys(db) -> int:
+    """Add the matching keys to alerts created before they were stored"""
+    count = 0
+    async for alert in db[ALERTS_COLLECTION].find({"commodity_key": {"$exists": False}}, {"_id": 0}):
+        await db[ALERTS_COLLECTION].update_one(
+            {"id": alert["id"]}, {"$set": alert_keys(alert["commodity"], alert["market"])}
+        )
+        count += 1
+    return count
+
+
+def crossed_filter(latest: Dict[str, Any]) -> Dict[str, Any]:
+    """Alerts whose threshold the move from previous_price to price went through"""
+    price, previous = latest["price"], latest.get("previous_price")
+    if previous is None:
+        above = {"direction": "above", "threshold": {"$lt": price}}
+        below = {"direction": "below", "threshold": {"$gt": price}}
+    else:
+        above = {"direction": "above", "threshold": {"$gte": previous, "$lt": price}}
+        below = {"direction": "below", "threshold": {"$gt": price, "$lte": previous}}
+    names = [name for name in (latest["commodity"].get("english"), latest["commodity"].get("hindi")) if name]
+    return {
+        # Alerts may name the commodity in either language
+        "commodity_key": {"$in": sorted({name_key(name) for name in names})},
+        "market_key": name_key(latest["market"]),
+        # Re-evaluating the same observation must not notify twice
+        "last_trigger": {"$ne": trigger_key(latest)},
+        "$or": [above, below],
+    }
+
+
+def trigger_key(latest: Dict[str, Any]) -> str:
+    return f"{latest['price_id']}:{latest['price']}"
+
+
+async def evaluate_alerts(db, latest_prices: Iterable[Dict[str, Any]]) -> int:
+    """Notify the alerts crossed by new latest prices; returns how many fired"""
+    sink = alert_sink(db)
+    fired = 0
+    for latest in latest_prices:
+        if latest.get("previous_price") == latest["price"]:
+            continue
+        now = datetime.utcnow()
+        cursor = db[ALERTS_COLLECTION].find(
+            crossed_filter(latest), {"_id": 0, **{name: 1 for name in NOTIFIED_FIELDS}}
+        ).batch_size(ALERT_BATCH_SIZE)
+        batch: List[Dict[str, Any]] = []
+        async for alert in cursor:
+            batch.append(alert)
+            if len(batch) >= ALERT_BATCH_SIZE:
+                fired += await _fire(db, sink, batch, latest, now)
+                batch = []
+        if batch:
+            fired += await _fire(db, sink, batch, latest, now)
+    return fired
+
+
+async def _fire(db, sink: AlertSink, alerts: List[Dict[str, Any]], latest: Dict[str, Any],
+                now: datetime) -> int:
+    await db[ALERTS_COLLECTION].update_many(
+        {"id": {"$in": [alert["id"] for alert in alerts]}},
+        {"$set": {"last_trigger": trigger_key(latest), "last_triggered_at": now}},
+    )
+    notifications = [
+        {
+            "alert_id": alert["id"],
+            "price_id": latest["price_id"],
+            "commodity": latest["commodity"],
+            "market": alert["market"],
+            "direction": alert["direction"],
+            "threshold": alert["threshold"],
+            "price": latest["price"],
+            "previous_price": latest.get("previous_price"),
+            "date": latest["date"],
+            "contact": alert.get("contact"),
+            "webhook_url": alert.get("webhook_url"),
+            "created_at": now,
+        }
+        for alert in alerts
+    ]
+    try:
+        await sink.deliver(notifications)
+    except Exception:
+        logger.exception("Price alert sink failed for %d notifications", len(notifications))
+    return len(notifications)
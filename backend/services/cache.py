@@ -0,0 +1,187 @@
+"""
+In-process response cache for KrishiSahyog reference collections
+Rendered list pages and detail documents are kept in a TTL + LRU cache keyed
+by normalized request parameters, and tagged so writes can drop exactly the
+entries they affect
+"""
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from bson import json_util
+from fastapi import Response
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("CONTENT_CACHE_TTL", "300"))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CONTENT_CACHE_MAX_ENTRIES", "1000"))
+
+# Chat answers are reused for repeated questions; see ANSWER_CACHE
+CHAT_CACHE_TTL_SECONDS = float(os.environ.get("CHAT_CACHE_TTL", "600"))
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", "5000"))
+
+# Tag carried by every list page: any insert or update may change list membership
+LIST_TAG = "list"
+
+
+def item_tag(document_id: str) -> str:
+    """Tag carried by every cached response that contains the given document"""
+    return f"id:{document_id}"
+
+
+def cache_key(kind: str, **params: Any) -> Tuple[Hashable, ...]:
+    """Normalized key: parameters that are unset or empty do not change the key"""
+    normalized = []
+    for name, value in sorted(params.items()):
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, (dict, list)):
+            # Filters and pipelines are keyed by their canonical JSON form
+            value = json_util.dumps(value, sort_keys=True)
+        normalized.append((name, value))
+    return (kind, tuple(normalized))
+
+
+@dataclass
+class CachedResponse:
+    """A rendered JSON response body and the headers to replay with it"""
+
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_response(cls, response: Response) -> "CachedResponse":
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in ("content-length", "content-type")
+        }
+        return cls(body=response.body, headers=headers)
+
+    def to_response(self) -> Response:
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    tags: Set[str]
+
+
+class ResponseCache:
+    """TTL + LRU cache with tag-based invalidation and hit/miss/eviction counters"""
+
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        if key in self._entries:
+            self._remove(key)
+        entry = _Entry(value=value, expires_at=time.monotonic() + self.ttl_seconds, tags=set(tags))
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry carrying any of the tags; returns how many were dropped"""
+        keys = set()
+        for tag in tags:
+            keys.update(self._keys_by_tag.get(tag, ()))
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> int:
+        dropped = len(self._entries)
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self.invalidations += dropped
+        return dropped
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# One cache per reference collection, shared by its list and detail handlers
+CONTENT_CACHES: Dict[str, ResponseCache] = {
+    name: ResponseCache(name) for name in ("schemes", "crops", "storage_guides", "qa_pairs")
+}
+
+
+# Chat answers keyed by normalized question and language, tagged with the Q&A
+# pairs they were built from (LIST_TAG for all, so new pairs can take over)
+ANSWER_CACHE = ResponseCache(
+    "chat_answers", max_entries=CHAT_CACHE_MAX_ENTRIES, ttl_seconds=CHAT_CACHE_TTL_SECONDS
+)
+
+
+def content_cache(collection_name: str) -> ResponseCache:
+    return CONTENT_CACHES[collection_name]
+
+
+def caches_for(collection_name: str) -> List[ResponseCache]:
+    """Every cache holding data derived from a collection"""
+    caches = [CONTENT_CACHES[collection_name]] if collection_name in CONTENT_CACHES else []
+    if collection_name == "qa_pairs":
+        caches.append(ANSWER_CACHE)
+    return caches
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {name: cache.stats() for name, cache in CONTENT_CACHES.items()}
+    stats[ANSWER_CACHE.name] = ANSWER_CACHE.stats()
+    return stats
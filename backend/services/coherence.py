@@ -0,0 +1,238 @@
+"""
+Cross-worker cache coherence for KrishiSahyog
+Every uvicorn worker keeps its own in-process caches, so each one follows the
+writes made by the others: through MongoDB change streams when the server is a
+replica set, or by polling a per-collection version document otherwise. The
+version documents log the ids of recent changes, so either way only the entries
+a change touched are dropped.
+
+To exercise the change stream path locally, start a single-node replica set
+(`mongod --replSet rs0`, then `rs.initiate()` in mongosh), point MONGO_URL at it
+and set CACHE_COHERENCE=changestream.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from services.cache import ANSWER_CACHE, LIST_TAG, caches_for, item_tag
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "cache_versions"
+
+# Collections whose writes are broadcast to every worker
+CONTENT_COLLECTIONS = ("schemes", "crops", "market_prices", "qa_pairs", "storage_guides")
+
+# auto: change streams when available, else polling | changestream | poll | off
+COHERENCE_MODE = os.environ.get("CACHE_COHERENCE", "auto").lower()
+POLL_INTERVAL_SECONDS = float(os.environ.get("CACHE_COHERENCE_POLL_SECONDS", "2"))
+RETRY_DELAY_SECONDS = 5.0
+
+# Recent changes kept on each version document, so a worker that polls after a
+# few writes can replay exactly which documents changed
+CHANGE_LOG_SIZE = int(os.environ.get("CACHE_COHERENCE_LOG_SIZE", "100"))
+
+# Callback(collection, document id or None, operation or None)
+ChangeListener = Callable[[str, Optional[str], Optional[str]], None]
+
+
+def invalidate_content_cache(collection: str, document_id: Optional[str],
+                             operation: Optional[str]) -> None:
+    """Drop the cache entries a change made in another worker may have staled"""
+    for cache in caches_for(collection):
+        if cache is ANSWER_CACHE:
+            # Answers come from the Q&A index, which drops them itself once
+            # it has applied the change (see invalidate_answers)
+            continue
+        if document_id is None:
+            # A bulk write or a gap in the change log: anything may have changed
+            cache.clear()
+        elif operation == "insert":
+            cache.invalidate(LIST_TAG)
+        elif operation == "delete":
+            # Every list page that held the document carries its item tag
+            cache.invalidate(item_tag(document_id))
+        else:
+            cache.invalidate(LIST_TAG, item_tag(document_id))
+
+
+def invalidate_answers(document_id: Optional[str], operation: Optional[str]) -> None:
+    """
+    Drop the chat answers a Q&A change may have staled. Called after the Q&A
+    index has applied the change: dropped any earlier, a chat request could
+    rank against the old index and cache the stale answer again.
+    """
+    if document_id is None:
+        ANSWER_CACHE.clear()
+    elif operation == "insert":
+        # A new pair may beat the answers cached for any question
+        ANSWER_CACHE.invalidate(LIST_TAG)
+    else:
+        # Like the local handler: only answers built from the pair go stale
+        ANSWER_CACHE.invalidate(item_tag(document_id))
+
+
+_listeners: List[ChangeListener] = [invalidate_content_cache]
+
+# Versions this worker has already accounted for, per collection
+_seen_versions: Dict[str, int] = {}
+
+
+def add_change_listener(listener: ChangeListener) -> None:
+    """Register a callback run for every change made by any worker"""
+    _listeners.append(listener)
+
+
+def _notify(collection: str, document_id: Optional[str] = None,
+            operation: Optional[str] = None) -> None:
+    for listener in _listeners:
+        try:
+            listener(collection, document_id, operation)
+        except Exception:
+            logger.exception("Cache coherence listener failed for %s", collection)
+
+
+async def publish_change(db, collection: str, document_id: Optional[str] = None,
+                         operation: Optional[str] = None) -> None:
+    """
+    Bump the collection version after a local write so polling workers notice,
+    logging which document changed and how (insert, update or delete); leave
+    both unset for bulk writes. The local caches were already invalidated
+    precisely by the write handler, so a bump that directly follows the last
+    version seen here is not replayed.
+    """
+    try:
+        document = await db[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": collection},
+            {
+                "$inc": {"version": 1},
+                "$set": {"changed_at": datetime.utcnow()},
+                "$push": {"changes": {
+                    "$each": [{"id": document_id, "operation": operation}],
+                    "$slice": -CHANGE_LOG_SIZE,
+                }},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except PyMongoError:
+        logger.exception("Failed to publish cache version for %s", collection)
+        return
+    if _seen_versions.get(collection) == document["version"] - 1:
+        _seen_versions[collection] = document["version"]
+
+
+def replay_changes(document: Dict, operations: Optional[Tuple[str, ...]] = None) -> None:
+    """
+    Notify the listeners of the changes logged on a version document since the
+    version this worker last saw, limited to `operations` when given. When more
+    changes happened than the log still holds, the collection is notified as a
+    whole.
+    """
+    collection, version = document["_id"], document["version"]
+    seen = _seen_versions.get(collection)
+    _seen_versions[collection] = version
+    if seen is None or version == seen:
+        return
+    changes = document.get("changes", [])
+    missed = version - seen
+    if missed < 0 or missed > len(changes):
+        _notify(collection)
+        return
+    for change in changes[len(changes) - missed:]:
+        if operations is None or change["operation"] in operations:
+            _notify(collection, change["id"], change["operation"])
+
+
+class CacheCoherence:
+    """Background task feeding other workers' writes to the change listeners"""
+
+    def __init__(self, db, collections=CONTENT_COLLECTIONS, mode: str = COHERENCE_MODE,
+                 poll_interval: float = POLL_INTERVAL_SECONDS):
+        self.db = db
+        self.collections = list(collections)
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.active_mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.mode != "off" and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.mode in ("auto", "changestream"):
+                    try:
+                        await self._watch()
+                    except PyMongoError as e:
+                        if self.mode == "changestream":
+                            raise
+                        logger.info("Change streams unavailable (%s), polling cache versions", e)
+                        self.mode = "poll"
+                        continue
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache coherence %s failed, retrying", self.active_mode)
+                # Changes may have been missed while disconnected
+                for collection in self.collections:
+                    _notify(collection)
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+    async def _watch(self) -> None:
+        # Deletes only carry the MongoDB _id, so they are taken from the change
+        # log on the version documents, which the stream also delivers
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": {"$in": self.collections}, "operationType": {"$ne": "delete"}},
+            {"ns.coll": VERSIONS_COLLECTION, "documentKey._id": {"$in": self.collections}},
+        ]}}]
+        async with self.db.watch(pipeline, full_document="updateLookup") as stream:
+            self.active_mode = "changestream"
+            await self._prime_versions()
+            async for change in stream:
+                full_document = change.get("fullDocument") or {}
+                if change["ns"]["coll"] == VERSIONS_COLLECTION:
+                    if full_document:
+                        replay_changes(full_document, operations=("delete",))
+                else:
+                    _notify(change["ns"]["coll"], full_document.get("id"), change["operationType"])
+
+    async def _prime_versions(self) -> None:
+        """Start from the current versions; changes before this were never cached here"""
+        async for document in self.db[VERSIONS_COLLECTION].find({"_id": {"$in": self.collections}}):
+            _seen_versions.setdefault(document["_id"], document["version"])
+        for collection in self.collections:
+            # Collections never written yet start at version 0
+            _seen_versions.setdefault(collection, 0)
+
+    async def poll_once(self) -> None:
+        """Replay the changes other workers logged since the previous poll"""
+        async for document in self.db[VERSIONS_COLLECTION].find({"_id": {"$in": self.collections}}):
+            replay_changes(document)
+        for collection in self.collections:
+            _seen_versions.setdefault(collection, 0)
+
+    async def _poll(self) -> None:
+        self.active_mode = "poll"
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,123 @@
+"""
+HTTP conditional GET for KrishiSahyog content endpoints
+List validators come from the collection's write version (bumped by
+publish_change on every insert, update and delete) and its newest updated_at
+read off the updated_at index, so a 304 is answered with two point reads
+instead of reading, counting or serializing the matching documents
+"""
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from services.cache import CachedResponse
+from services.coherence import VERSIONS_COLLECTION
+
+# Cache-Control sent by each router, overridable per collection from the environment
+CACHE_CONTROL: Dict[str, str] = {
+    "schemes": os.environ.get("CACHE_CONTROL_SCHEMES", "public, max-age=300"),
+    "crops": os.environ.get("CACHE_CONTROL_CROPS", "public, max-age=300"),
+    "storage_guides": os.environ.get("CACHE_CONTROL_STORAGE", "public, max-age=300"),
+    "qa_pairs": os.environ.get("CACHE_CONTROL_QA", "public, max-age=300"),
+    "market_prices": os.environ.get("CACHE_CONTROL_MARKET", "public, max-age=60"),
+}
+
+# List bodies depend on Accept (NDJSON negotiation) and, with lang=auto, Accept-Language
+LIST_VARY = "Accept, Accept-Language"
+ITEM_VARY = "Accept-Language"
+
+
+@dataclass
+class Validators:
+    """Strong ETag and Last-Modified of a response"""
+
+    etag: str
+    last_modified: Optional[datetime]
+
+    @classmethod
+    def build(cls, key: Hashable, last_modified: Optional[datetime], version: int) -> "Validators":
+        stamp = last_modified.isoformat() if last_modified else ""
+        digest = hashlib.sha1(f"{key!r}|{stamp}|{version}".encode()).hexdigest()
+        return cls(etag=f'"{digest}"', last_modified=last_modified)
+
+    def headers(self, collection: str, vary: str) -> Dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL[collection], "Vary": vary}
+        if self.last_modified:
+            last_modified = self.last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+            headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+        return headers
+
+
+async def list_validators(collection, key: Hashable, source: Optional[str] = None) -> Validators:
+    """
+    Validators of a list response whose filters are part of `key`. They change
+    with any write to the `source` collection (default: this one), so they are
+    conservative for narrow filters but never scan the matching set. The newest
+    updated_at also catches writes that bypass publish_change, such as seeding.
+    """
+    version_document, newest = await asyncio.gather(
+        collection.database[VERSIONS_COLLECTION].find_one({"_id": source or collection.name}),
+        collection.find({}, {"_id": 0, "updated_at": 1}).sort("updated_at", -1).limit(1).to_list(1),
+    )
+    version_document = version_document or {}
+    stamps = [
+        stamp for stamp in (version_document.get("changed_at"), newest[0].get("updated_at") if newest else None)
+        if stamp is not None
+    ]
+    return Validators.build(key, max(stamps) if stamps else None, version_document.get("version", 0))
+
+
+async def item_validators(collection, document_id: str, key: Hashable) -> Optional[Validators]:
+    """Validators of a detail response, or None if the document does not exist"""
+    document = await collection.find_one({"id": document_id}, {"_id": 0, "updated_at": 1})
+    if document is None:
+        return None
+    return Validators.build(key, document.get("updated_at"), 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    return etag in (candidate.strip() for candidate in header.split(","))
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[str]) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since as RFC 9110 requires"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return bool(etag) and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    """304 carrying the validators and caching headers, with no body"""
+    return Response(status_code=304, headers=headers)
+
+
+def conditional(request: Request, validators: Validators, collection: str,
+                vary: str) -> Optional[Response]:
+    """A 304 response if the client's copy is current, else None"""
+    headers = validators.headers(collection, vary)
+    if is_not_modified(request, headers["ETag"], headers.get("Last-Modified")):
+        return not_modified(headers)
+    return None
+
+
+def replay(request: Request, cached: CachedResponse) -> Response:
+    """Answer from a cached response, as a 304 when the client's copy is current"""
+    if is_not_modified(request, cached.headers.get("etag"), cached.headers.get("last-modified")):
+        return not_modified(cached.headers)
+    return cached.to_response()
@@ -8,6 +8,8 @@ from datetime import datetime, date
 import os
 import asyncio
 
+from services.search import with_search_terms
+
 # Mock data converted from frontend
 INITIAL_SCHEMES = [
     {
@@ -266,6 +268,10 @@ INITIAL_STORAGE_GUIDES = [
     }
 ]
 
+def seed_documents(collection_name, documents):
+    """Copies of the seed documents carrying their search terms"""
+    return [with_search_terms(collection_name, dict(document)) for document in documents]
+
 async def seed_database():
     """Seed the database with initial data"""
     try:
@@ -281,12 +287,12 @@ async def seed_database():
         await db.qa_pairs.delete_many({})
         await db.storage_guides.delete_many({})
         
-        # Insert initial data
-        await db.schemes.insert_many(INITIAL_SCHEMES)
-        await db.crops.insert_many(INITIAL_CROPS)
-        await db.market_prices.insert_many(INITIAL_MARKET_DATA)
+        # Insert initial data, with the search terms the filters look up
+        await db.schemes.insert_many(seed_documents("schemes", INITIAL_SCHEMES))
+        await db.crops.insert_many(seed_documents("crops", INITIAL_CROPS))
+        await db.market_prices.insert_many(seed_documents("market_prices", INITIAL_MARKET_DATA))
         await db.qa_pairs.insert_many(INITIAL_QA_PAIRS)
-        await db.storage_guides.insert_many(INITIAL_STORAGE_GUIDES)
+        await db.storage_guides.insert_many(seed_documents("storage_guides", INITIAL_STORAGE_GUIDES))
         
         print("✅ Database seeded successfully!")
         print(f"- {len(INITIAL_SCHEMES)} schemes inserted")
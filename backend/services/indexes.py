@@ -0,0 +1,182 @@
+"""
+Index manager for KrishiSahyog
+Declares the indexes every router relies on and reconciles them at startup
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes on the same key pattern behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Indexes required by the routes, keyed by collection name
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "schemes": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("state", ASCENDING)], name="category_state"),
+        IndexModel([("state", ASCENDING)], name="state"),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "crops": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("region", ASCENDING)], name="region"),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "market_prices": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Natural key of an observation: concurrent upserts cannot duplicate it
+        IndexModel(
+            [("commodity.english", ASCENDING), ("market", ASCENDING), ("date", DESCENDING)],
+            name="commodity_market_date_unique",
+            unique=True,
+        ),
+        IndexModel([("date", DESCENDING), ("id", DESCENDING)], name="date_id"),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "market_price_buckets": [
+        IndexModel(
+            [("commodity.english", ASCENDING), ("market", ASCENDING), ("month", ASCENDING)],
+            name="commodity_market_month_unique",
+            unique=True,
+        ),
+        IndexModel([("month", DESCENDING)], name="month"),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "market_latest": [
+        IndexModel(
+            [("commodity.english", ASCENDING), ("market", ASCENDING)],
+            name="commodity_market_unique",
+            unique=True,
+        ),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "market_rollups": [
+        IndexModel(
+            [("period", ASCENDING), ("commodity.english", ASCENDING), ("market", ASCENDING),
+             ("start", ASCENDING)],
+            name="period_commodity_market_start",
+            unique=True,
+        ),
+        IndexModel([("period", ASCENDING), ("start", ASCENDING)], name="period_start"),
+    ],
+    "price_alerts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("commodity_key", ASCENDING), ("market_key", ASCENDING), ("direction", ASCENDING),
+             ("threshold", ASCENDING)],
+            name="commodity_key_market_key_direction_threshold",
+        ),
+    ],
+    "alert_outbox": [
+        IndexModel(
+            [("alert_id", ASCENDING), ("price_id", ASCENDING), ("price", ASCENDING)],
+            name="alert_price_unique",
+            unique=True,
+        ),
+        IndexModel([("delivered", ASCENDING), ("created_at", ASCENDING)], name="delivered_created_at"),
+        IndexModel([("delivered", ASCENDING), ("next_attempt_at", ASCENDING)], name="delivered_next_attempt_at"),
+    ],
+    "qa_pairs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING)], name="category"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "storage_guides": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "weather_cache": [
+        IndexModel([("cache_key", ASCENDING)], name="cache_key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+def _key_pattern(index_info: Dict[str, Any]) -> List[tuple]:
+    """Return an index key pattern as a comparable list of (field, direction)"""
+    return [
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in index_info["key"].items()
+    ]
+
+
+def _option_drift(wanted: Dict[str, Any], existing: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the options that differ between a declared and an existing index"""
+    drift = {}
+    for option in COMPARED_OPTIONS:
+        if wanted.get(option) != existing.get(option):
+            drift[option] = {"wanted": wanted.get(option), "found": existing.get(option)}
+    return drift
+
+
+async def reconcile_collection(db, collection_name: str, specs: List[IndexModel]) -> Dict[str, List]:
+    """Create missing indexes on one collection and report any that drifted"""
+    report = {"created": [], "drift": [], "extra": [], "errors": []}
+    collection = db[collection_name]
+
+    existing = {}
+    async for index_info in collection.list_indexes():
+        if index_info["name"] != "_id_":
+            existing[index_info["name"]] = index_info
+    by_pattern = {tuple(_key_pattern(info)): info for info in existing.values()}
+
+    declared_names = set()
+    for spec in specs:
+        wanted = spec.document
+        name = wanted["name"]
+        pattern = tuple(_key_pattern(wanted))
+        found = existing.get(name) or by_pattern.get(pattern)
+
+        if found is None:
+            try:
+                await collection.create_indexes([spec])
+                report["created"].append(name)
+            except OperationFailure as e:
+                report["errors"].append({"index": name, "error": str(e)})
+            declared_names.add(name)
+            continue
+
+        declared_names.add(found["name"])
+        differences = _option_drift(wanted, found)
+        if found["name"] != name:
+            differences["name"] = {"wanted": name, "found": found["name"]}
+        if tuple(_key_pattern(found)) != pattern:
+            differences["key"] = {"wanted": list(pattern), "found": _key_pattern(found)}
+        if differences:
+            report["drift"].append({"index": name, "differences": differences})
+
+    report["extra"] = sorted(set(existing) - declared_names)
+    return report
+
+
+async def ensure_indexes(db, specs: Dict[str, List[IndexModel]] = None) -> Dict[str, Dict[str, List]]:
+    """
+    Reconcile every declared index. Safe to run on each startup: indexes that
+    already exist are left alone, and anything that differs is only reported
+    so an operator can decide whether to rebuild it.
+    """
+    specs = specs or INDEX_SPECS
+    report = {}
+    for collection_name, collection_specs in specs.items():
+        collection_report = await reconcile_collection(db, collection_name, collection_specs)
+        report[collection_name] = collection_report
+
+        if collection_report["created"]:
+            logger.info("Created indexes on %s: %s", collection_name, collection_report["created"])
+        for drift in collection_report["drift"]:
+            logger.warning("Index drift on %s: %s", collection_name, drift)
+        if collection_report["extra"]:
+            logger.info("Undeclared indexes on %s: %s", collection_name, collection_report["extra"])
+        for error in collection_report["errors"]:
+            logger.error("Failed to create index on %s: %s", collection_name, error)
+    return report
@@ -0,0 +1,120 @@
+"""
+Latest price per commodity and market
+A materialized view holding, for every commodity/market pair, its most recent
+observation and the change against the observation before it. Each write
+refreshes only the pairs it touched, from the two newest raw observations of
+every touched pair, found with two grouped queries whatever the number of pairs.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+LATEST_COLLECTION = "market_latest"
+
+# (commodity English name, market)
+Pair = Tuple[str, str]
+
+
+def format_change(amount: Optional[float]) -> str:
+    """Signed price difference in the "+50" / "-25" style the frontend shows"""
+    if amount is None:
+        return ""
+    return f"{amount:+.2f}".rstrip("0").rstrip(".")
+
+
+def latest_document(current: Dict[str, Any], previous: Optional[Dict[str, Any]],
+                    now: datetime) -> Dict[str, Any]:
+    amount = current["price"] - previous["price"] if previous else None
+    percent = amount / previous["price"] * 100 if previous and previous["price"] else None
+    return {
+        "commodity": current["commodity"],
+        "market": current["market"],
+        "price_id": current["id"],
+        "price": current["price"],
+        "unit": current["unit"],
+        "date": current["date"],
+        "change": format_change(amount),
+        "change_amount": amount,
+        "change_percent": round(percent, 2) if percent is not None else None,
+        "previous_price": previous["price"] if previous else None,
+        "previous_date": previous["date"] if previous else None,
+        "updated_at": now,
+    }
+
+
+LATEST_PROJECTION = {"_id": 0, "id": 1, "commodity": 1, "market": 1, "price": 1, "unit": 1, "date": 1}
+
+
+async def _newest_per_pair(db, conditions: List[Dict[str, Any]]) -> Dict[Pair, Dict[str, Any]]:
+    """
+    Newest observation of each pair matching one of the conditions. The sort
+    follows the unique (commodity, market, date desc) index, where a pair's
+    dates are distinct, so each group's first document is its newest.
+    """
+    pipeline = [
+        {"$match": {"$or": conditions}},
+        {"$sort": {"commodity.english": 1, "market": 1, "date": -1}},
+        {"$group": {
+            "_id": {"commodity": "$commodity.english", "market": "$market"},
+            "price": {"$first": "$$ROOT"},
+        }},
+    ]
+    newest = {}
+    async for group in db.market_prices.aggregate(pipeline, allowDiskUse=True):
+        price = {name: group["price"].get(name) for name in LATEST_PROJECTION if name != "_id"}
+        newest[(group["_id"]["commodity"], group["_id"]["market"])] = price
+    return newest
+
+
+async def refresh_latest(db, pairs: Iterable[Pair]) -> List[Dict[str, Any]]:
+    """Recompute the latest entry of each pair from its two newest observations and return them"""
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    newest = await _newest_per_pair(db, [
+        {"commodity.english": commodity, "market": market} for commodity, market in pairs
+    ])
+    previous = await _newest_per_pair(db, [
+        {"commodity.english": commodity, "market": market, "date": {"$lt": price["date"]}}
+        for (commodity, market), price in newest.items()
+    ]) if newest else {}
+
+    operations = []
+    refreshed = []
+    now = datetime.utcnow()
+    for pair in pairs:
+        key = {"commodity.english": pair[0], "market": pair[1]}
+        if pair not in newest:
+            operations.append(DeleteOne(key))
+            continue
+        latest = latest_document(newest[pair], previous.get(pair), now)
+        operations.append(UpdateOne(key, {"$set": latest}, upsert=True))
+        refreshed.append(latest)
+
+    await db[LATEST_COLLECTION].bulk_write(operations, ordered=False)
+    return refreshed
+
+
+def touched_pairs(observations: Iterable[Dict[str, Any]]) -> Set[Pair]:
+    return {(observation["commodity"]["english"], observation["market"]) for observation in observations}
+
+
+async def backfill_latest(db, batch_size: int = 500) -> int:
+    """Build the view for price history written before it existed"""
+    if await db[LATEST_COLLECTION].find_one({}, {"_id": 1}) is not None:
+        return 0
+    count = 0
+    batch: List[Pair] = []
+    pipeline = [{"$group": {"_id": {"commodity": "$commodity.english", "market": "$market"}}}]
+    async for group in db.market_prices.aggregate(pipeline):
+        batch.append((group["_id"]["commodity"], group["_id"]["market"]))
+        if len(batch) >= batch_size:
+            await refresh_latest(db, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await refresh_latest(db, batch)
+        count += len(batch)
+    return count
@@ -0,0 +1,139 @@
+"""
+Bucketed storage of market prices
+With MARKET_STORAGE=buckets, observations are also kept grouped into one
+document per commodity/market/month, and date range queries scan those buckets
+instead of one index entry and document per observation.
+
+The buckets are a read layout kept next to market_prices, not a replacement
+for it: market_prices remains the record that ids address, that the unique
+(commodity, market, date) key protects during concurrent upserts, and that
+the rollups, latest-price view and exports are rebuilt from. Enabling buckets
+therefore adds roughly one more copy of each observation and one bucket write
+per touched month; it pays off for deployments whose traffic is dominated by
+long date-range scans, and is off by default.
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+from services.search import with_search_terms
+
+BUCKETS_COLLECTION = "market_price_buckets"
+
+# documents: one document per observation only | buckets: also maintain monthly
+# buckets and serve date range scans from them (see the module docstring)
+MARKET_STORAGE = os.environ.get("MARKET_STORAGE", "documents").lower()
+
+OBSERVATION_FIELDS = ("id", "price", "unit", "change", "date", "created_at", "updated_at")
+
+# (commodity English name, market, "YYYY-MM")
+BucketKey = Tuple[str, str, str]
+
+
+def buckets_enabled() -> bool:
+    return MARKET_STORAGE == "buckets"
+
+
+def bucket_key(key: BucketKey) -> Dict[str, Any]:
+    return {"commodity.english": key[0], "market": key[1], "month": key[2]}
+
+
+async def refresh_buckets(db, observations: Iterable[Dict[str, Any]]) -> None:
+    """Rebuild the monthly buckets containing the observations from market_prices"""
+    if not buckets_enabled():
+        return
+    touched: Set[BucketKey] = {
+        (observation["commodity"]["english"], observation["market"], observation["date"][:7])
+        for observation in observations
+    }
+    if not touched:
+        return
+
+    # One query reads the observations of every touched bucket
+    months = [
+        {
+            "commodity.english": commodity,
+            "market": market,
+            "date": {"$gte": f"{month}-01", "$lte": f"{month}-31"},
+        }
+        for commodity, market, month in touched
+    ]
+    raw_by_key: Dict[BucketKey, List[Dict[str, Any]]] = defaultdict(list)
+    projection = {"_id": 0, "commodity": 1, "market": 1, **{name: 1 for name in OBSERVATION_FIELDS}}
+    async for price in db.market_prices.find({"$or": months}, projection):
+        raw_by_key[(price["commodity"]["english"], price["market"], price["date"][:7])].append(price)
+
+    operations = []
+    now = datetime.utcnow()
+    for key in touched:
+        commodity, market, month = key
+        raw = sorted(raw_by_key[key], key=lambda price: (price["date"], price["id"]))
+        if not raw:
+            operations.append(DeleteOne(bucket_key(key)))
+            continue
+        bucket = with_search_terms("market_prices", {
+            "commodity": raw[-1]["commodity"],
+            "market": market,
+            "month": month,
+            "count": len(raw),
+            "min_date": raw[0]["date"],
+            "max_date": raw[-1]["date"],
+            "observations": [{name: price.get(name) for name in OBSERVATION_FIELDS} for price in raw],
+            "updated_at": now,
+        })
+        operations.append(UpdateOne(bucket_key(key), {"$set": bucket}, upsert=True))
+
+    if operations:
+        await db[BUCKETS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def bucket_query(filter_query: Dict[str, Any]) -> Dict[str, Any]:
+    """Translate a market_prices filter into one selecting the buckets that can match"""
+    query = {field: value for field, value in filter_query.items() if field != "date"}
+    date_filter = filter_query.get("date")
+    if isinstance(date_filter, str):
+        query["month"] = date_filter[:7]
+    elif date_filter:
+        query["month"] = {operator: value[:7] for operator, value in date_filter.items()}
+    return query
+
+
+def bucket_pipeline(filter_query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Stages turning the matching buckets back into market_prices shaped
+    observations. The sort that follows runs after $unwind, so callers run
+    the pipeline with allowDiskUse.
+    """
+    stages = [
+        {"$match": bucket_query(filter_query)},
+        {"$unwind": "$observations"},
+        {"$project": {
+            "_id": 0, "commodity": 1, "market": 1,
+            **{name: f"$observations.{name}" for name in OBSERVATION_FIELDS},
+        }},
+    ]
+    if "date" in filter_query:
+        stages.append({"$match": {"date": filter_query["date"]}})
+    return stages
+
+
+async def backfill_buckets(db, batch_size: int = 1000) -> int:
+    """Bucket price history written before bucketed storage was enabled"""
+    if not buckets_enabled() or await db[BUCKETS_COLLECTION].find_one({}, {"_id": 1}) is not None:
+        return 0
+    count = 0
+    batch: List[Dict[str, Any]] = []
+    async for observation in db.market_prices.find({}, {"_id": 0, "commodity": 1, "market": 1, "date": 1}):
+        batch.append(observation)
+        if len(batch) >= batch_size:
+            await refresh_buckets(db, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await refresh_buckets(db, batch)
+        count += len(batch)
+    return count
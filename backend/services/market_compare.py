@@ -0,0 +1,122 @@
+"""
+Cross-mandi comparison of one commodity
+The price slice is pivoted into a markets x dates NumPy matrix once, and every
+statistic (latest prices, difference against the local mandi, spread,
+volatility and rolling statistics) is computed with whole-array operations.
+"""
+
+import warnings
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_WINDOW = 7
+MAX_WINDOW = 90
+
+
+def pivot(markets: List[str], dates: List[str], prices: List[float]):
+    """Market names, ISO dates and a markets x dates price matrix (NaN where unobserved)"""
+    market_names, market_index = np.unique(np.asarray(markets), return_inverse=True)
+    date_values, date_index = np.unique(np.asarray(dates), return_inverse=True)
+    matrix = np.full((len(market_names), len(date_values)), np.nan)
+    # Observations arrive in date order, so a repeated cell keeps the latest one
+    matrix[market_index, date_index] = np.asarray(prices, dtype=float)
+    return market_names, date_values, matrix
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry each market's last observed price forward over unobserved dates"""
+    observed = ~np.isnan(matrix)
+    positions = np.where(observed, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], positions]
+    # Dates before a market's first observation stay unobserved
+    filled[np.cumsum(observed, axis=1) == 0] = np.nan
+    return filled
+
+
+def trailing_window(filled: np.ndarray, window: int):
+    """Mean and standard deviation of each market over its last `window` dates"""
+    tail = filled[:, -window:]
+    with _nan_tolerant():
+        return np.nanmean(tail, axis=1), np.nanstd(tail, axis=1)
+
+
+def volatility(filled: np.ndarray) -> np.ndarray:
+    """Standard deviation of day-over-day log returns, per market"""
+    if filled.shape[1] < 2:
+        return np.full(filled.shape[0], np.nan)
+    with _nan_tolerant():
+        returns = np.diff(np.log(filled), axis=1)
+        returns[~np.isfinite(returns)] = np.nan
+        return np.nanstd(returns, axis=1)
+
+
+@contextmanager
+def _nan_tolerant():
+    """Silence numpy's warnings for all-NaN rows and zero prices; those cells become nulls"""
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
+
+
+def _column(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    """JSON friendly list: rounded, with NaN and infinities as null"""
+    rounded = np.round(values.astype(float), digits)
+    return [float(value) if np.isfinite(value) else None for value in rounded]
+
+
+def compare_markets(markets: List[str], dates: List[str], prices: List[float],
+                    local: Optional[str] = None, window: int = DEFAULT_WINDOW,
+                    include_matrix: bool = False) -> Dict[str, Any]:
+    """Columnar comparison of every market over the slice, optionally against a local mandi"""
+    if not prices:
+        return {"markets": [], "dates": 0}
+
+    names, date_values, matrix = pivot(markets, dates, prices)
+    filled = forward_fill(matrix)
+    latest = filled[:, -1]
+    with _nan_tolerant():
+        daily_spread = np.nanmax(filled, axis=0) - np.nanmin(filled, axis=0)
+        result: Dict[str, Any] = {
+            "markets": names.tolist(),
+            "from": str(date_values[0]),
+            "to": str(date_values[-1]),
+            "dates": len(date_values),
+            "window": window,
+            "observations": np.count_nonzero(~np.isnan(matrix), axis=1).tolist(),
+            "latest": _column(latest),
+            "mean": _column(np.nanmean(matrix, axis=1)),
+            "min": _column(np.nanmin(matrix, axis=1)),
+            "max": _column(np.nanmax(matrix, axis=1)),
+            "volatility": _column(volatility(filled), 4),
+            "spread": {
+                "latest": _column(np.array([np.nanmax(latest) - np.nanmin(latest)]))[0],
+                "mean": _column(np.array([np.nanmean(daily_spread)]))[0],
+                "max": _column(np.array([np.nanmax(daily_spread)]))[0],
+            },
+        }
+
+    rolling_mean, rolling_std = trailing_window(filled, window)
+    result["rolling_mean"] = _column(rolling_mean)
+    result["rolling_std"] = _column(rolling_std)
+
+    if local is not None:
+        matches = np.flatnonzero(names == local)
+        if not matches.size:
+            raise ValueError(f"No prices for local market '{local}' in this window")
+        # A zero local price has no meaningful ratio: those dates are left out
+        local_series = filled[matches[0]]
+        local_series = np.where(local_series == 0, np.nan, local_series)
+        with _nan_tolerant():
+            result["local"] = local
+            result["pct_vs_local"] = _column((latest - local_series[-1]) / local_series[-1] * 100)
+            result["mean_pct_vs_local"] = _column(
+                np.nanmean((filled - local_series) / local_series * 100, axis=1)
+            )
+
+    if include_matrix:
+        # Latest price of the row market minus that of the column market
+        result["matrix"] = [_column(row) for row in latest[:, None] - latest[None, :]]
+    return result
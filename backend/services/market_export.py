@@ -0,0 +1,184 @@
+"""
+Streaming export of market price history
+Documents are read from the Motor cursor in fixed-size batches and encoded
+batch by batch as NDJSON, CSV or a compact columnar binary format, without
+building a model per row, so memory stays constant however long the export.
+
+Columnar format ("KSC1"): the stream starts with the 4 magic bytes b"KSC1",
+followed by one frame per batch. A frame is a little-endian uint32 header
+length, a UTF-8 JSON header, then the column buffers in header order:
+    {"rows": n,
+     "columns": [{"name": "date", "dtype": "<i4", "nbytes": ...}, ...],
+     "dictionaries": {"commodity": [...new strings...], "market": [...]}}
+`date` holds days since 1970-01-01, `price` float64, and `commodity`,
+`commodity_hindi`, `market`, `unit` and `change` uint32 codes into
+dictionaries that grow across frames: each frame lists only the strings first
+seen in it. Ids are unique, so they are not dictionary coded: `id_offsets`
+holds rows + 1 uint32 byte offsets into the UTF-8 bytes of `id_data`.
+decode_columnar reads a whole stream back into records.
+"""
+
+import csv
+import io
+import json
+import os
+import struct
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+EXPORT_BATCH_SIZE = int(os.environ.get("MARKET_EXPORT_BATCH_SIZE", "5000"))
+
+EXPORT_PROJECTION = {
+    "_id": 0, "id": 1, "date": 1, "commodity": 1, "market": 1, "price": 1, "unit": 1, "change": 1,
+}
+EXPORT_SORT = [("date", 1), ("id", 1)]
+
+CSV_COLUMNS = ["id", "date", "commodity_english", "commodity_hindi", "market", "price", "unit", "change"]
+COLUMNAR_MAGIC = b"KSC1"
+DICTIONARY_COLUMNS = ("commodity", "commodity_hindi", "market", "unit", "change")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "columnar": "application/octet-stream",
+}
+
+
+async def document_batches(cursor, batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Pull raw documents from a Motor cursor a batch at a time"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    cursor.batch_size(batch_size)
+    while True:
+        batch = await cursor.to_list(batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def _commodity(document: Dict[str, Any], language: str) -> str:
+    commodity = document.get("commodity") or {}
+    return commodity.get(language, "")
+
+
+async def ndjson_stream(cursor) -> AsyncIterator[bytes]:
+    async for batch in document_batches(cursor):
+        yield "".join(json.dumps(document, ensure_ascii=False, default=str) + "\n" for document in batch).encode()
+
+
+async def csv_stream(cursor) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for batch in document_batches(cursor):
+        writer.writerows(
+            [
+                document.get("id"),
+                document.get("date"),
+                _commodity(document, "english"),
+                _commodity(document, "hindi"),
+                document.get("market"),
+                document.get("price"),
+                document.get("unit"),
+                document.get("change"),
+            ]
+            for document in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Dictionary:
+    """String dictionary shared by all frames of one columnar export"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, values: List[str]) -> "tuple[np.ndarray, List[str]]":
+        added = []
+        codes = np.empty(len(values), dtype="<u4")
+        for position, value in enumerate(values):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.codes)
+                added.append(value)
+            codes[position] = code
+        return codes, added
+
+
+async def columnar_stream(cursor) -> AsyncIterator[bytes]:
+    dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+    yield COLUMNAR_MAGIC
+    async for batch in document_batches(cursor):
+        columns = {
+            "date": np.array([document.get("date") for document in batch], dtype="datetime64[D]")
+            .astype("<i4"),
+            "price": np.array([document.get("price") for document in batch], dtype="<f8"),
+        }
+        ids = [(document.get("id") or "").encode() for document in batch]
+        columns["id_offsets"] = np.cumsum([0] + [len(value) for value in ids], dtype="<u4")
+        columns["id_data"] = np.frombuffer(b"".join(ids), dtype="|u1")
+        strings = {
+            "commodity": [_commodity(document, "english") for document in batch],
+            "commodity_hindi": [_commodity(document, "hindi") for document in batch],
+            "market": [document.get("market") or "" for document in batch],
+            "unit": [document.get("unit") or "" for document in batch],
+            "change": [document.get("change") or "" for document in batch],
+        }
+        additions = {}
+        for name, values in strings.items():
+            columns[name], additions[name] = dictionaries[name].encode(values)
+
+        header = json.dumps({
+            "rows": len(batch),
+            "columns": [
+                {"name": name, "dtype": column.dtype.str, "nbytes": column.nbytes}
+                for name, column in columns.items()
+            ],
+            "dictionaries": additions,
+        }, ensure_ascii=False).encode()
+        yield struct.pack("<I", len(header)) + header + b"".join(column.tobytes() for column in columns.values())
+
+
+def decode_columnar(data: bytes) -> List[Dict[str, Any]]:
+    """Read a complete columnar export back into records shaped like the NDJSON ones"""
+    if data[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Not a KSC1 columnar export")
+    dictionaries: Dict[str, List[str]] = {name: [] for name in DICTIONARY_COLUMNS}
+    records = []
+    position = 4
+    while position < len(data):
+        (header_length,) = struct.unpack_from("<I", data, position)
+        position += 4
+        header = json.loads(data[position:position + header_length])
+        position += header_length
+        columns = {}
+        for column in header["columns"]:
+            columns[column["name"]] = np.frombuffer(
+                data, dtype=column["dtype"], count=column["nbytes"] // np.dtype(column["dtype"]).itemsize,
+                offset=position,
+            )
+            position += column["nbytes"]
+        for name, added in header["dictionaries"].items():
+            dictionaries[name].extend(added)
+
+        dates = columns["date"].astype("datetime64[D]").astype(str)
+        offsets, id_data = columns["id_offsets"], columns["id_data"].tobytes()
+        for row in range(header["rows"]):
+            text = {name: dictionaries[name][columns[name][row]] for name in DICTIONARY_COLUMNS}
+            records.append({
+                "id": id_data[offsets[row]:offsets[row + 1]].decode(),
+                "date": str(dates[row]),
+                "commodity": {"english": text["commodity"], "hindi": text["commodity_hindi"]},
+                "market": text["market"],
+                "price": float(columns["price"][row]),
+                "unit": text["unit"],
+                "change": text["change"],
+            })
+    return records
+
+
+STREAMS = {"ndjson": ndjson_stream, "csv": csv_stream, "columnar": columnar_stream}
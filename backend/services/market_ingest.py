@@ -0,0 +1,274 @@
+"""
+Bulk ingestion of mandi market prices
+Rows are validated in chunks and upserted on (commodity, market, date) through
+unordered bulk writes, with the next chunk validated while the previous one is
+being written. Bad rows are reported individually instead of failing the batch.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from models.market import MarketPrice, MarketPriceCreate
+from services.alerts import evaluate_alerts
+from services.coherence import publish_change
+from services.latest_prices import refresh_latest, touched_pairs
+from services.market_buckets import refresh_buckets
+from services.rollups import refresh_rollups
+from services.search import with_search_terms
+
+BULK_CHUNK_SIZE = int(os.environ.get("MARKET_BULK_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 1000
+DUPLICATE_KEY = 11000
+
+# A row number paired with either the decoded row or the error decoding it
+Row = Tuple[int, Any]
+
+# Called after each chunk is written with the number of its last row
+CommitCallback = Callable[[int, "IngestReport"], Awaitable[None]]
+
+
+def price_document(price: MarketPrice) -> Dict[str, Any]:
+    """Stored form of a market price: ISO date string plus search terms"""
+    document = price.dict()
+    document["date"] = price.date.isoformat()
+    return with_search_terms("market_prices", document)
+
+
+def stored_values(update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert partial update values to their stored form"""
+    if isinstance(update_data.get("date"), date):
+        update_data["date"] = update_data["date"].isoformat()
+    return update_data
+
+
+def price_key(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Natural key of an observation, matching the commodity_market_date_unique index"""
+    return {
+        "commodity.english": document["commodity"]["english"],
+        "market": document["market"],
+        "date": document["date"],
+    }
+
+
+def upsert_update(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Update setting an observation's values, keeping id and created_at of an existing one"""
+    document = dict(document)
+    inserted_only = {"id": document.pop("id"), "created_at": document.pop("created_at")}
+    return {"$set": document, "$setOnInsert": inserted_only}
+
+
+def upsert_operation(document: Dict[str, Any]) -> UpdateOne:
+    """Upsert one observation on its natural key"""
+    return UpdateOne(price_key(document), upsert_update(document), upsert=True)
+
+
+async def upsert_price(db, document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Upsert one observation on its natural key and return it as stored. Two
+    writers inserting the same key at once make one upsert fail on the unique
+    index; retried, it finds the other's document and updates it.
+    """
+    for attempt in range(2):
+        try:
+            return await db.market_prices.find_one_and_update(
+                price_key(document), upsert_update(document), {"_id": 0},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+
+async def prices_written(db, documents: List[Dict[str, Any]]) -> None:
+    """
+    Bring the views derived from market prices up to date after a write.
+    `documents` are the stored forms of the observations written, plus the
+    previous form of any observation that was updated or deleted.
+    """
+    # Each view reads all touched pairs in one or two queries, and they run concurrently
+    _, _, latest = await asyncio.gather(
+        refresh_buckets(db, documents),
+        refresh_rollups(db, documents),
+        refresh_latest(db, touched_pairs(documents)),
+    )
+
+    # Only a write that produced a pair's newest observation can cross an alert threshold
+    written = {(document["commodity"]["english"], document["market"], document["date"]) for document in documents}
+    await evaluate_alerts(db, [
+        price for price in latest
+        if (price["commodity"]["english"], price["market"], price["date"]) in written
+    ])
+
+
+@dataclass
+class IngestReport:
+    """Outcome of a bulk ingestion, with per-row errors"""
+
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    # Matched an existing observation already holding the same values
+    unchanged: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    started_at: float = field(default_factory=time.monotonic)
+    seconds: float = 0.0
+
+    def add_error(self, row: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.received / self.seconds) if self.seconds else None,
+        }
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+async def json_rows(payload: List[Any]) -> AsyncIterator[Row]:
+    """Number the rows of an already decoded JSON array"""
+    for number, row in enumerate(payload, start=1):
+        yield number, row
+
+
+async def ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Row]:
+    """Decode an NDJSON byte stream line by line as it arrives"""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                number += 1
+                yield number, _decode_line(line)
+    if buffer.strip():
+        yield number + 1, _decode_line(buffer)
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+
+class MarketIngestor:
+    """Validates rows in chunks and upserts them with unordered bulk writes"""
+
+    def __init__(self, db, chunk_size: int = BULK_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    async def ingest(self, rows: AsyncIterable[Row],
+                     on_commit: Optional[CommitCallback] = None) -> IngestReport:
+        """
+        Consume rows and write them chunk by chunk. Rows are only pulled while
+        at most one chunk write is outstanding, so a slow database throttles
+        the producer instead of letting rows pile up in memory.
+        """
+        report = IngestReport()
+        pending: Optional[asyncio.Task] = None
+        documents: List[Dict[str, Any]] = []
+        row_numbers: List[int] = []
+        now = datetime.utcnow()
+
+        try:
+            async for number, row in rows:
+                report.received += 1
+                price = self._validate(number, row, report)
+                if price is None:
+                    continue
+                documents.append(price_document(MarketPrice(**price.dict(), created_at=now, updated_at=now)))
+                row_numbers.append(number)
+
+                if len(documents) >= self.chunk_size:
+                    # Keep one write in flight while the next chunk is validated
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.create_task(self._write(documents, row_numbers, report, on_commit))
+                    documents, row_numbers = [], []
+        except Exception:
+            # A failing source still lets the chunk in flight land and be checkpointed
+            if pending is not None:
+                await pending
+            raise
+
+        if pending is not None:
+            await pending
+        if documents:
+            await self._write(documents, row_numbers, report, on_commit)
+
+        if report.inserted or report.updated:
+            await publish_change(self.db, "market_prices")
+        report.seconds = time.monotonic() - report.started_at
+        return report
+
+    def _validate(self, number: int, row: Any, report: IngestReport) -> Optional[MarketPriceCreate]:
+        if isinstance(row, Exception):
+            report.add_error(number, f"Invalid JSON: {row}")
+            return None
+        if not isinstance(row, dict):
+            report.add_error(number, "Row must be a JSON object")
+            return None
+        try:
+            return MarketPriceCreate(**row)
+        except ValidationError as e:
+            report.add_error(number, _validation_message(e))
+            return None
+
+    async def _write(self, documents: List[Dict[str, Any]], row_numbers: List[int],
+                     report: IngestReport, on_commit: Optional[CommitCallback] = None) -> None:
+        operations = [upsert_operation(document) for document in documents]
+        indexes = list(range(len(operations)))
+        # Upserts that lost an insert race to a concurrent writer are retried once as updates
+        for attempt in range(2):
+            try:
+                result = await self.db.market_prices.bulk_write(operations, ordered=False)
+                details, write_errors = result.bulk_api_result, []
+            except BulkWriteError as e:
+                details, write_errors = e.details, e.details.get("writeErrors", [])
+            report.inserted += details.get("nUpserted", 0)
+            report.updated += details.get("nModified", 0)
+            report.unchanged += details.get("nMatched", 0) - details.get("nModified", 0)
+
+            retry = [] if attempt else [
+                error["index"] for error in write_errors if error.get("code") == DUPLICATE_KEY
+            ]
+            for write_error in write_errors:
+                if write_error["index"] not in retry:
+                    report.add_error(
+                        row_numbers[indexes[write_error["index"]]], write_error.get("errmsg", "Write failed")
+                    )
+            if not retry:
+                break
+            operations = [operations[index] for index in retry]
+            indexes = [indexes[index] for index in retry]
+
+        await prices_written(self.db, documents)
+        if on_commit is not None:
+            await on_commit(row_numbers[-1], report)
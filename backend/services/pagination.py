@@ -0,0 +1,138 @@
+"""
+Keyset pagination and NDJSON streaming for KrishiSahyog list endpoints
+Pages are addressed by an opaque cursor holding the sort key values of the
+last document returned, so each page is an index range scan
+"""
+
+import base64
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from bson import json_util
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Without ?limit a page holds as many documents as the unpaginated endpoints
+# used to return, so existing clients get the same rows plus a next cursor
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = MAX_PAGE_SIZE
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Sort order shared by collections paged by their unique id
+ID_SORT: List[Tuple[str, int]] = [("id", 1)]
+
+Sort = List[Tuple[str, int]]
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode sort key values into an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def cursor_values(document: Dict[str, Any], sort: Sort) -> List[Any]:
+    """Return the sort key values of a document, in sort order"""
+    return [_get_path(document, field) for field, _ in sort]
+
+
+def keyset_filter(sort: Sort, values: List[Any]) -> Dict[str, Any]:
+    """
+    Filter selecting documents strictly after the given sort key values.
+    For sort (a, b) this is a > va OR (a == va AND b > vb), with the
+    comparison flipped for descending keys.
+    """
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    branches = []
+    for position, (field, direction) in enumerate(sort):
+        branch = {sort[i][0]: values[i] for i in range(position)}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[position]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def keyset_cursor(collection, filter_query: Dict[str, Any], sort: Sort,
+                  after: Optional[str] = None, limit: Optional[int] = None,
+                  pipeline: Optional[List[Dict[str, Any]]] = None,
+                  projection: Optional[Dict[str, Any]] = None):
+    """
+    Open a Motor cursor over the documents following `after` in sort order.
+    When a pipeline is given (e.g. ranked search) it is used instead of the
+    plain filter and may sort on fields it computes.
+    """
+    keyset = keyset_filter(sort, decode_cursor(after)) if after else None
+
+    if pipeline is None:
+        query = {"$and": [filter_query, keyset]} if keyset else filter_query
+        cursor = collection.find(query, projection).sort(sort)
+        return cursor.limit(limit) if limit else cursor
+
+    stages = list(pipeline)
+    if keyset:
+        stages.append({"$match": keyset})
+    stages.append({"$sort": dict(sort)})
+    if limit:
+        stages.append({"$limit": limit})
+    if projection:
+        stages.append({"$project": projection})
+    # Computed sort keys (unwound buckets, search scores) cannot use an index;
+    # without a limit the sort may outgrow the in-memory sort limit
+    return collection.aggregate(stages, allowDiskUse=True)
+
+
+async def fetch_page(collection, filter_query: Dict[str, Any], sort: Sort,
+                     after: Optional[str] = None, limit: Optional[int] = None,
+                     pipeline: Optional[List[Dict[str, Any]]] = None,
+                     projection: Optional[Dict[str, Any]] = None):
+    """Return one page of documents and the cursor of the next page, if any"""
+    limit = limit or DEFAULT_PAGE_SIZE
+    cursor = keyset_cursor(collection, filter_query, sort, after, limit + 1, pipeline, projection)
+    documents = await cursor.to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(cursor_values(documents[-1], sort))
+    return documents, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Advertise the next page cursor on a list response"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    """Whether the client opted into streaming via ?format=ndjson or Accept"""
+    if format:
+        return format.lower() == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(cursor, model: Type[BaseModel]) -> StreamingResponse:
+    """Stream documents from a Motor cursor as they arrive, one JSON object per line"""
+
+    async def lines() -> AsyncIterator[str]:
+        async for document in cursor:
+            yield model(**document).json() + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
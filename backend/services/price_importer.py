@@ -0,0 +1,325 @@
+"""
+Streaming importer for Agmarknet-style market price CSV files
+Parses the file incrementally, maps its columns onto MarketPrice and writes
+through the bulk market ingestor, so memory stays flat whatever the file size.
+Progress is checkpointed per committed chunk and an interrupted import resumes
+from the last committed byte offset.
+
+Usage (from the backend directory):
+    python -m services.price_importer prices.csv [--import-id ID] [--restart]
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.market_ingest import BULK_CHUNK_SIZE, IngestReport, MarketIngestor
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_COLLECTION = "import_checkpoints"
+READ_CHUNK_BYTES = 1 << 20
+DEFAULT_UNIT = "per quintal"
+
+# Hindi names of commodities as they appear in Agmarknet files
+COMMODITY_NAMES: Dict[str, str] = {
+    "wheat": "गेहूं",
+    "paddy": "धान",
+    "paddy(dhan)(common)": "धान",
+    "rice": "चावल",
+    "maize": "मक्का",
+    "bajra(pearl millet/cumbu)": "बाजरा",
+    "bajra": "बाजरा",
+    "jowar(sorghum)": "ज्वार",
+    "jowar": "ज्वार",
+    "barley (jau)": "जौ",
+    "barley": "जौ",
+    "ragi (finger millet)": "रागी",
+    "bengal gram(gram)(whole)": "चना",
+    "gram": "चना",
+    "arhar (tur/red gram)(whole)": "अरहर",
+    "arhar": "अरहर",
+    "green gram (moong)(whole)": "मूंग",
+    "moong": "मूंग",
+    "black gram (urd beans)(whole)": "उड़द",
+    "urad": "उड़द",
+    "lentil (masur)(whole)": "मसूर",
+    "masur": "मसूर",
+    "mustard": "सरसों",
+    "soyabean": "सोयाबीन",
+    "groundnut": "मूंगफली",
+    "sunflower": "सूरजमुखी",
+    "cotton": "कपास",
+    "sugarcane": "गन्ना",
+    "potato": "आलू",
+    "onion": "प्याज",
+    "tomato": "टमाटर",
+    "cauliflower": "फूलगोभी",
+    "cabbage": "पत्तागोभी",
+    "brinjal": "बैंगन",
+    "garlic": "लहसुन",
+    "ginger(green)": "अदरक",
+    "green chilli": "हरी मिर्च",
+    "banana": "केला",
+    "apple": "सेब",
+    "mango": "आम",
+    "turmeric": "हल्दी",
+    "coriander(leaves)": "धनिया",
+}
+
+# Accepted header spellings for each MarketPrice field
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "commodity": ("commodity", "commodity name"),
+    "market": ("market", "market name", "mandi", "apmc"),
+    "price": ("modal price", "modal_price", "price"),
+    "date": ("arrival date", "arrival_date", "price date", "reported date", "date"),
+    "unit": ("unit", "unit of price"),
+}
+REQUIRED_COLUMNS = ("commodity", "market", "price", "date")
+
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y")
+
+
+def normalize_header(name: str) -> str:
+    """Lower-case a header, decode data.gov.in's _x0020_ and drop unit suffixes"""
+    name = name.replace("_x0020_", " ").strip().lower()
+    name = re.sub(r"\s*\(.*\)$", "", name)
+    return re.sub(r"\s+", " ", name)
+
+
+def resolve_columns(header: List[str]) -> Dict[str, int]:
+    """Map MarketPrice fields onto column positions; raises if one is missing"""
+    positions = {normalize_header(name): index for index, name in enumerate(header)}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions:
+                columns[field] = positions[alias]
+                break
+    missing = [field for field in REQUIRED_COLUMNS if field not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing columns for: {', '.join(missing)}")
+    return columns
+
+
+def parse_price_date(value: str) -> str:
+    """ISO date of a CSV date cell, or the raw value for validation to reject"""
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def commodity_text(name: str) -> Dict[str, str]:
+    """Bilingual commodity name; unknown commodities keep the English name"""
+    english = name.strip()
+    return {"english": english, "hindi": COMMODITY_NAMES.get(english.lower(), english)}
+
+
+def row_to_price(record: List[str], columns: Dict[str, int]) -> Dict[str, Any]:
+    """Raw MarketPriceCreate payload for one CSV record"""
+    def cell(field: str) -> str:
+        index = columns.get(field)
+        return record[index].strip() if index is not None and index < len(record) else ""
+
+    return {
+        "commodity": commodity_text(cell("commodity")),
+        "market": cell("market"),
+        "price": cell("price").replace(",", ""),
+        "unit": cell("unit") or DEFAULT_UNIT,
+        "change": "",
+        "date": parse_price_date(cell("date")),
+    }
+
+
+async def read_lines(read: Callable[[int], Awaitable[bytes]],
+                     chunk_bytes: int = READ_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Split a byte source into lines (newline kept) while reading it in fixed chunks"""
+    buffer = b""
+    while True:
+        chunk = await read(chunk_bytes)
+        if not chunk:
+            break
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if buffer:
+        yield buffer
+
+
+async def content_import_id(name: Optional[str], read: Callable[[int], Awaitable[bytes]],
+                            chunk_bytes: int = READ_CHUNK_BYTES) -> str:
+    """
+    Default import id of an upload: its name, size and content digest, so a
+    re-sent interrupted file resumes while a different file of the same name
+    starts its own import
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await read(chunk_bytes)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    return f"{name or 'upload'}:{size}:{digest.hexdigest()[:32]}"
+
+
+async def csv_records(lines: AsyncIterable[bytes],
+                      skip_to: int = 0) -> AsyncIterator[Tuple[List[str], int]]:
+    """
+    Yield (record, byte offset after it). The header is always parsed; data
+    lines before `skip_to` are passed over without parsing. Quoted fields
+    spanning lines are reassembled before they are handed to the csv module.
+    """
+    offset = 0
+    pending = ""
+    header_seen = False
+    async for line in lines:
+        offset += len(line)
+        if header_seen and offset <= skip_to:
+            continue
+        pending += line.decode("utf-8-sig" if offset == len(line) else "utf-8", errors="replace")
+        if pending.count('"') % 2:
+            continue
+        record = next(csv.reader([pending]), [])
+        pending = ""
+        if any(cell.strip() for cell in record):
+            header_seen = True
+            yield record, offset
+
+
+class CsvPriceImport:
+    """One resumable CSV import, identified by an import id"""
+
+    def __init__(self, db, import_id: str, chunk_size: int = BULK_CHUNK_SIZE):
+        self.db = db
+        self.import_id = import_id
+        self.chunk_size = chunk_size
+        self._offsets: Dict[int, int] = {}
+        self._last_progress = 0.0
+
+    async def checkpoint(self) -> Optional[Dict[str, Any]]:
+        return await self.db[CHECKPOINTS_COLLECTION].find_one({"_id": self.import_id})
+
+    async def reset(self) -> None:
+        await self.db[CHECKPOINTS_COLLECTION].delete_one({"_id": self.import_id})
+
+    async def run(self, lines: AsyncIterable[bytes]) -> Dict[str, Any]:
+        checkpoint = await self.checkpoint() or {}
+        if checkpoint.get("completed"):
+            return {
+                "import_id": self.import_id,
+                "status": "already completed",
+                **checkpoint.get("report", {}),
+            }
+
+        skip_to = checkpoint.get("bytes", 0)
+        first_row = checkpoint.get("rows", 0)
+        records = csv_records(lines, skip_to)
+
+        async for header, _ in records:
+            columns = resolve_columns(header)
+            break
+        else:
+            raise ValueError("CSV file is empty")
+
+        report = await MarketIngestor(self.db, self.chunk_size).ingest(
+            self._rows(records, columns, first_row), on_commit=self._commit
+        )
+        summary = report.to_dict()
+        await self.db[CHECKPOINTS_COLLECTION].update_one(
+            {"_id": self.import_id},
+            {"$set": {"completed": True, "report": summary, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        return {
+            "import_id": self.import_id,
+            "status": "completed",
+            "resumed_from_row": first_row,
+            **summary,
+        }
+
+    async def _rows(self, records: AsyncIterator[Tuple[List[str], int]], columns: Dict[str, int],
+                    first_row: int) -> AsyncIterator[Tuple[int, Any]]:
+        number = first_row
+        async for record, offset in records:
+            number += 1
+            self._offsets[number] = offset
+            yield number, row_to_price(record, columns)
+
+    async def _commit(self, last_row: int, report: IngestReport) -> None:
+        """Persist the byte offset after the last row of a written chunk"""
+        offset = self._offsets[last_row]
+        for number in [n for n in self._offsets if n <= last_row]:
+            del self._offsets[number]
+        await self.db[CHECKPOINTS_COLLECTION].update_one(
+            {"_id": self.import_id},
+            {"$set": {"bytes": offset, "rows": last_row, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+        now = time.monotonic()
+        if now - self._last_progress >= 5:
+            self._last_progress = now
+            elapsed = now - report.started_at
+            logger.info(
+                "Import %s: %d rows committed, %.0f rows/s",
+                self.import_id, last_row, report.received / elapsed if elapsed else 0,
+            )
+
+
+async def file_import_id(path: str) -> str:
+    """Default import id of a file on disk, computed like that of an upload"""
+    with open(path, "rb") as csv_file:
+        return await content_import_id(
+            os.path.basename(path), lambda size: asyncio.to_thread(csv_file.read, size)
+        )
+
+
+async def import_file(path: str, import_id: Optional[str] = None, restart: bool = False) -> Dict[str, Any]:
+    """Import a CSV file from disk, resuming any earlier interrupted run"""
+    from database import client, db
+
+    import_id = import_id or await file_import_id(path)
+    importer = CsvPriceImport(db, import_id)
+    if restart:
+        await importer.reset()
+    try:
+        with open(path, "rb") as csv_file:
+            lines = read_lines(lambda size: asyncio.to_thread(csv_file.read, size))
+            return await importer.run(lines)
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import market prices from an Agmarknet-style CSV file")
+    parser.add_argument("path", help="CSV file to import")
+    parser.add_argument("--import-id", help="Checkpoint id (defaults to file name, size and content digest)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(import_file(args.path, args.import_id, args.restart))
+    errors = result.pop("errors", [])
+    print(f"✅ Import {result['import_id']} {result['status']}")
+    for name, value in result.items():
+        print(f"- {name}: {value}")
+    for error in errors[:20]:
+        print(f"  row {error['row']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
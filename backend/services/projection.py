@@ -0,0 +1,164 @@
+"""
+Sparse fieldsets and single-language responses for KrishiSahyog
+Turns ?fields=a,b,c and ?lang=hindi|english into a MongoDB projection so
+unrequested fields and the unused language never leave the database, and
+into a partial response model to serialize what is left
+"""
+
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, Tuple, Type, get_args, get_origin
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, create_model, model_validator
+
+Fields = Optional[Tuple[str, ...]]
+
+LANGUAGES = ("hindi", "english")
+
+# Accept-Language primary tags mapped onto the stored languages
+LANGUAGE_TAGS = {"hi": "hindi", "en": "english"}
+
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Fields:
+    """Validate a comma-separated field list against a model; id is always kept"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields for {model.__name__}: {', '.join(unknown)}"
+        )
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def _accepted_language(header: str) -> Optional[str]:
+    """Pick the preferred stored language from an Accept-Language header"""
+    ranked = []
+    for position, part in enumerate(header.split(",")):
+        tag, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        language = LANGUAGE_TAGS.get(tag.strip().split("-")[0].lower())
+        if language and quality > 0:
+            ranked.append((-quality, position, language))
+    return min(ranked)[2] if ranked else None
+
+
+def resolve_language(request: Request, lang: Optional[str]) -> Optional[str]:
+    """
+    Language to project responses onto, or None for bilingual responses.
+    lang=auto defers to the Accept-Language header; it is opt-in because
+    browsers always send that header and existing clients expect both languages.
+    """
+    if not lang:
+        return None
+    lang = lang.lower()
+    if lang == "auto":
+        return _accepted_language(request.headers.get("accept-language", ""))
+    if lang not in LANGUAGES:
+        raise HTTPException(status_code=400, detail="lang must be one of: hindi, english, auto")
+    return lang
+
+
+def _is_bilingual(annotation: Any) -> bool:
+    return (
+        isinstance(annotation, type)
+        and issubclass(annotation, BaseModel)
+        and set(annotation.model_fields) == set(LANGUAGES)
+    )
+
+
+def bilingual_kind(annotation: Any) -> Optional[str]:
+    """'text' for BilingualText, 'list' for List[BilingualText], else None"""
+    if _is_bilingual(annotation):
+        return "text"
+    if get_origin(annotation) in (list, List) and any(_is_bilingual(arg) for arg in get_args(annotation)):
+        return "list"
+    return None
+
+
+def projection_for(model: Type[BaseModel], fields: Fields, sort: Iterable[Tuple[str, int]] = (),
+                   language: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """
+    MongoDB projection for the selected fields, narrowed to one language when
+    requested. Sort keys are kept as well so pagination cursors can still be
+    built from the projected documents.
+    """
+    if fields is None and language is None:
+        return None
+    projection = {"_id": 0}
+    for name in fields or model.model_fields:
+        if language and bilingual_kind(model.model_fields[name].annotation):
+            projection[f"{name}.{language}"] = 1
+        else:
+            projection[name] = 1
+    for path, _ in sort:
+        top_level = path.split(".")[0]
+        if not any(key.split(".")[0] == top_level for key in projection):
+            projection[top_level] = 1
+    return projection
+
+
+def _pick_language(value: Any, language: str) -> Any:
+    if isinstance(value, dict) and language in value:
+        return value[language]
+    if isinstance(value, list):
+        return [_pick_language(item, language) for item in value]
+    return value
+
+
+class SingleLanguageModel(BaseModel):
+    """Base of single-language response models: flattens {hindi, english} values"""
+
+    view_language: ClassVar[str] = "english"
+
+    @model_validator(mode="before")
+    @classmethod
+    def flatten_bilingual(cls, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {key: _pick_language(value, cls.view_language) for key, value in data.items()}
+        return data
+
+
+@lru_cache(maxsize=None)
+def partial_model(model: Type[BaseModel], fields: Fields,
+                  language: Optional[str] = None) -> Type[BaseModel]:
+    """Response model limited to the selected fields and language (the model itself if neither)"""
+    if fields is None and language is None:
+        return model
+
+    definitions = {}
+    for name in fields or model.model_fields:
+        annotation = model.model_fields[name].annotation
+        kind = bilingual_kind(annotation) if language else None
+        if kind == "text":
+            annotation = str
+        elif kind == "list":
+            annotation = List[str]
+        definitions[name] = (Optional[annotation], None)
+
+    if language is None:
+        return create_model(f"{model.__name__}Fields", **definitions)
+    view = create_model(
+        f"{model.__name__}{language.capitalize()}", __base__=SingleLanguageModel, **definitions
+    )
+    view.view_language = language
+    return view
+
+
+def render_list(documents: List[Dict[str, Any]], model: Type[BaseModel]) -> JSONResponse:
+    """Serialize documents through a (possibly partial) response model"""
+    return JSONResponse(content=jsonable_encoder([model(**document) for document in documents]))
+
+
+def render_item(document: Dict[str, Any], model: Type[BaseModel]) -> JSONResponse:
+    """Serialize one document through a (possibly partial) response model"""
+    return JSONResponse(content=jsonable_encoder(model(**document)))
@@ -0,0 +1,301 @@
+"""
+In-memory BM25 retrieval over the Q&A pairs
+Questions, answers and categories in both languages are tokenized with the
+search module's normalization and stemming into one inverted index, with
+question terms weighted above category and answer terms. The Q&A handlers
+keep it current, and writes made by other workers reach it through the cache
+coherence listeners.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.coherence import add_change_listener, invalidate_answers
+from services.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Term frequency multipliers per field (a simplified BM25F)
+FIELD_WEIGHTS = {"question": 3.0, "category": 2.0, "answer": 1.0}
+K1 = 1.2
+B = 0.75
+
+# Below this confidence a match is not trusted and chat falls back to its default answer
+MIN_CONFIDENCE = 0.2
+ALTERNATIVES = 3
+
+# Relative drift of the average document length that triggers recomputing impacts
+AVERAGE_LENGTH_TOLERANCE = 0.05
+
+
+@dataclass
+class PreparedQuery:
+    """
+    A tokenized query with the BM25 impact arrays of its known terms, so it
+    can be scored without touching the index or running tokenizer code
+    """
+
+    weighted: List[Tuple[float, np.ndarray, np.ndarray]]
+    size: int
+    best_possible: float
+
+
+@dataclass
+class Ranking:
+    """Best document slots of a query and their scores, highest first"""
+
+    slots: np.ndarray
+    scores: np.ndarray
+    best_possible: float
+
+
+NO_RANKING = Ranking(np.zeros(0, dtype=np.int64), np.zeros(0), 0.0)
+
+
+@dataclass
+class Match:
+    """A ranked Q&A pair; confidence is the score relative to a perfect match of the query"""
+
+    qa: Dict[str, Any]
+    score: float
+    confidence: float
+
+
+def _texts(value: Any) -> List[str]:
+    if isinstance(value, dict):
+        return [text for text in value.values() if isinstance(text, str)]
+    return [value] if isinstance(value, str) else []
+
+
+def weighted_terms(qa: Dict[str, Any]) -> Counter:
+    """Field-weighted term frequencies of a Q&A pair"""
+    frequencies: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for text in _texts(qa.get(field)):
+            for term in tokenize(text):
+                frequencies[term] += weight
+    return frequencies
+
+
+class QAIndex:
+    """
+    Inverted index with BM25 ranking. Postings map terms to field-weighted
+    frequencies per document slot; per-term numpy arrays of BM25 impacts are
+    derived lazily and reused until the term's postings or the average
+    document length move, so a query is a few vectorized additions.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.slots: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.lengths: List[float] = []
+        self.total_length = 0.0
+        self.loaded = False
+        self._free: List[int] = []
+        self._impacts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._average_length = 0.0
+        # Writes come from the event loop while searches may run in worker threads
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, qa: Dict[str, Any]) -> None:
+        """Index a Q&A pair, replacing any earlier version of it"""
+        frequencies = weighted_terms(qa)
+        with self._lock:
+            self._add(qa, frequencies)
+
+    def _add(self, qa: Dict[str, Any], frequencies: Counter) -> None:
+        qa_id = qa["id"]
+        self._remove(qa_id)
+        slot = self._free.pop() if self._free else len(self.ids)
+        if slot == len(self.ids):
+            self.ids.append(None)
+            self.lengths.append(0.0)
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[slot] = frequency
+            self._impacts.pop(term, None)
+        self.ids[slot] = qa_id
+        self.slots[qa_id] = slot
+        self.lengths[slot] = sum(frequencies.values())
+        self.total_length += self.lengths[slot]
+        self.documents[qa_id] = {
+            "id": qa_id,
+            "question": qa.get("question"),
+            "answer": qa.get("answer"),
+            "category": qa.get("category"),
+        }
+
+    def remove(self, qa_id: str) -> None:
+        with self._lock:
+            self._remove(qa_id)
+
+    def _remove(self, qa_id: str) -> None:
+        document = self.documents.pop(qa_id, None)
+        if document is None:
+            return
+        slot = self.slots.pop(qa_id)
+        for term in weighted_terms(document):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(slot, None)
+                if not posting:
+                    del self.postings[term]
+            self._impacts.pop(term, None)
+        self.total_length -= self.lengths[slot]
+        self.ids[slot] = None
+        self.lengths[slot] = 0.0
+        self._free.append(slot)
+
+    def idf(self, term: str) -> float:
+        frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.documents) - frequency + 0.5) / (frequency + 0.5))
+
+    def _term_impacts(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots of a term's documents and their BM25 term weights (before idf)"""
+        average_length = self.total_length / len(self.documents) or 1.0
+        if abs(average_length - self._average_length) > AVERAGE_LENGTH_TOLERANCE * self._average_length:
+            # Length normalization moved enough to matter: recompute every impact lazily
+            self._impacts.clear()
+            self._average_length = average_length
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            posting = self.postings[term]
+            slots = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            frequencies = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+            lengths = np.asarray(self.lengths)[slots]
+            norms = K1 * (1 - B + B * lengths / self._average_length)
+            impacts = self._impacts[term] = (slots, frequencies * (K1 + 1) / (frequencies + norms))
+        return impacts
+
+    def _best_possible(self, terms: Counter) -> float:
+        """Score of a document matching every query term as well as BM25 allows"""
+        return sum(frequency * self.idf(term) for term, frequency in terms.items()) * (K1 + 1)
+
+    def prepare(self, query: str) -> PreparedQuery:
+        """Tokenize a query and collect the impacts of its known terms (pure Python, kept short)"""
+        terms = Counter(tokenize(query))
+        with self._lock:
+            if not terms or not self.documents:
+                return PreparedQuery([], len(self.ids), 0.0)
+            return PreparedQuery(
+                [
+                    (terms[term] * self.idf(term), *self._term_impacts(term))
+                    for term in terms if term in self.postings
+                ],
+                len(self.ids),
+                self._best_possible(terms),
+            )
+
+    def score(self, prepared: PreparedQuery, limit: int = ALTERNATIVES + 1) -> Ranking:
+        """
+        Full BM25 ranking of a prepared query: numpy work only, so it can run
+        on a worker thread. Impact arrays are replaced, never modified, so
+        scoring needs no lock.
+        """
+        if not prepared.weighted:
+            return NO_RANKING
+        scores = np.zeros(prepared.size)
+        for weight, slots, impacts in prepared.weighted:
+            scores[slots] += weight * impacts
+
+        matched = int(np.count_nonzero(scores))
+        if not matched:
+            return NO_RANKING
+        count = min(limit, matched)
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return Ranking(top, scores[top], prepared.best_possible)
+
+    def quick_score(self, prepared: PreparedQuery, limit: int = ALTERNATIVES + 1) -> Ranking:
+        """
+        Cheap fallback ranking by the query's most selective term alone, used
+        when full scoring is saturated or too slow. Confidence stays on the
+        scale of score(): the partial score of one term can only be below the
+        full score of the same document.
+        """
+        if not prepared.weighted:
+            return NO_RANKING
+        weight, slots, impacts = min(prepared.weighted, key=lambda candidate: len(candidate[1]))
+        count = min(limit, len(slots))
+        top = np.argpartition(-impacts, count - 1)[:count]
+        top = top[np.argsort(-impacts[top])]
+        return Ranking(slots[top], weight * impacts[top], prepared.best_possible)
+
+    def score_many(self, prepared: List[PreparedQuery], limit: int = ALTERNATIVES + 1) -> List[Ranking]:
+        return [self.score(query, limit) for query in prepared]
+
+    def matches(self, ranking: Ranking) -> List[Match]:
+        """The Q&A pairs of a ranking, with their confidence"""
+        return self._matches(ranking.slots, ranking.scores, ranking.best_possible)
+
+    def search(self, query: str, limit: int = ALTERNATIVES + 1) -> List[Match]:
+        """Best matches for a query, highest score first"""
+        return self.matches(self.score(self.prepare(query), limit))
+
+    def quick_search(self, query: str, limit: int = ALTERNATIVES + 1) -> List[Match]:
+        return self.matches(self.quick_score(self.prepare(query), limit))
+
+    def _matches(self, slots: np.ndarray, scores: np.ndarray, best_possible: float) -> List[Match]:
+        matches = []
+        with self._lock:
+            for slot, score in zip(slots.tolist(), scores.tolist()):
+                qa_id = self.ids[slot]
+                # The slot may have been freed by a write since scoring started
+                if qa_id is not None:
+                    matches.append(Match(self.documents[qa_id], score, min(1.0, score / best_possible)))
+        return matches
+
+    async def load(self, db) -> None:
+        """(Re)build the index from the collection and swap it in at once"""
+        fresh = QAIndex()
+        async for qa in db.qa_pairs.find({}, {"_id": 0, "id": 1, "question": 1, "answer": 1, "category": 1}):
+            fresh.add(qa)
+        fresh.loaded = True
+        with self._lock:
+            for name, value in vars(fresh).items():
+                if name != "_lock":
+                    setattr(self, name, value)
+        logger.info("Indexed %d Q&A pairs for chat", len(self.documents))
+
+    async def refresh(self, db, qa_id: Optional[str]) -> None:
+        """Re-read one Q&A pair after a change, or everything when the change is unspecified"""
+        if qa_id is None:
+            await self.load(db)
+            return
+        qa = await db.qa_pairs.find_one({"id": qa_id}, {"_id": 0})
+        if qa is None:
+            self.remove(qa_id)
+        else:
+            self.add(qa)
+
+    async def apply_change(self, db, qa_id: Optional[str], operation: Optional[str]) -> None:
+        """Bring the index up to date with a change, then drop the answers it staled"""
+        try:
+            await self.refresh(db, qa_id)
+        finally:
+            invalidate_answers(qa_id, operation)
+
+    def follow_changes(self, db) -> None:
+        """Apply Q&A writes made by other workers"""
+        def listener(collection: str, document_id: Optional[str], operation: Optional[str]) -> None:
+            if collection != "qa_pairs":
+                return
+            # A known pair is re-read (and dropped if it was deleted); only
+            # unspecified changes rebuild the whole index
+            asyncio.get_running_loop().create_task(self.apply_change(db, document_id, operation))
+
+        add_change_listener(listener)
+
+
+qa_index = QAIndex()
@@ -0,0 +1,177 @@
+"""
+Daily, weekly and monthly market price rollups
+One document per (period, commodity, market, bucket start) holds the first,
+last, min, max and mean price of the bucket. Writes refresh only the buckets
+containing the dates they touched, recomputed from the raw observations of
+that commodity/market pair, so updates and deletes stay exact.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+ROLLUPS_COLLECTION = "market_rollups"
+PERIODS = ("day", "week", "month")
+MAX_MOVING_AVERAGE = 365
+
+RAW_PROJECTION = {"_id": 0, "id": 1, "commodity": 1, "market": 1, "price": 1, "date": 1}
+
+# (commodity English name, market)
+Pair = Tuple[str, str]
+
+
+def period_bounds(period: str, day: date) -> Tuple[date, date]:
+    """First and last day of the bucket of `period` containing `day`; weeks start on Monday"""
+    if period == "day":
+        return day, day
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    return start, day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def period_start_before(period: str, start: date, buckets: int) -> date:
+    """Start of the bucket `buckets` periods before the one beginning at `start`"""
+    if period == "day":
+        return start - timedelta(days=buckets)
+    if period == "week":
+        return start - timedelta(weeks=buckets)
+    month = start.year * 12 + start.month - 1 - buckets
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def _as_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def summarize(prices: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregates of observations already sorted by date"""
+    values = [price["price"] for price in prices]
+    return {
+        "first": values[0],
+        "last": values[-1],
+        "min": min(values),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+        "count": len(values),
+    }
+
+
+def rollup_key(period: str, pair: Pair, start: date) -> Dict[str, Any]:
+    return {"period": period, "commodity.english": pair[0], "market": pair[1], "start": start.isoformat()}
+
+
+async def refresh_rollups(db, observations: Iterable[Dict[str, Any]]) -> None:
+    """
+    Recompute every bucket containing one of the observations' dates. All
+    touched pairs are read in one query, each through an indexed range
+    covering that pair's touched buckets.
+    """
+    touched: Dict[Pair, Set[date]] = defaultdict(set)
+    for observation in observations:
+        pair = (observation["commodity"]["english"], observation["market"])
+        touched[pair].add(_as_date(observation["date"]))
+    if not touched:
+        return
+
+    buckets_by_pair = {}
+    ranges = []
+    for pair, days in touched.items():
+        buckets = {(period, *period_bounds(period, day)) for day in days for period in PERIODS}
+        buckets_by_pair[pair] = buckets
+        ranges.append({
+            "commodity.english": pair[0],
+            "market": pair[1],
+            "date": {
+                "$gte": min(start for _, start, _ in buckets).isoformat(),
+                "$lte": max(end for _, _, end in buckets).isoformat(),
+            },
+        })
+
+    raw_by_pair: Dict[Pair, List[Dict[str, Any]]] = defaultdict(list)
+    async for price in db.market_prices.find({"$or": ranges}, RAW_PROJECTION):
+        raw_by_pair[(price["commodity"]["english"], price["market"])].append(price)
+
+    operations = []
+    now = datetime.utcnow()
+    for pair, buckets in buckets_by_pair.items():
+        raw = sorted(raw_by_pair[pair], key=lambda price: (price["date"], price["id"]))
+        for period, start, end in buckets:
+            prices = [price for price in raw if start.isoformat() <= price["date"] <= end.isoformat()]
+            key = rollup_key(period, pair, start)
+            if not prices:
+                operations.append(DeleteOne(key))
+                continue
+            document = {
+                **summarize(prices),
+                "commodity": prices[-1]["commodity"],
+                "market": pair[1],
+                "period": period,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "updated_at": now,
+            }
+            operations.append(UpdateOne(key, {"$set": document}, upsert=True))
+
+    if operations:
+        await db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def backfill_rollups(db, batch_size: int = 1000) -> int:
+    """Build rollups for price history written before rollups existed"""
+    if await db[ROLLUPS_COLLECTION].find_one({}, {"_id": 1}) is not None:
+        return 0
+    count = 0
+    batch = []
+    async for observation in db.market_prices.find({}, RAW_PROJECTION):
+        batch.append(observation)
+        if len(batch) >= batch_size:
+            await refresh_rollups(db, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await refresh_rollups(db, batch)
+        count += len(batch)
+    return count
+
+
+def parse_windows(ma: Optional[str]) -> List[int]:
+    """Moving average window sizes from a comma separated list"""
+    if not ma:
+        return []
+    windows = []
+    for part in ma.split(","):
+        part = part.strip()
+        if not part.isdigit() or not 1 < int(part) <= MAX_MOVING_AVERAGE:
+            raise ValueError(f"Moving average windows must be integers between 2 and {MAX_MOVING_AVERAGE}")
+        windows.append(int(part))
+    return sorted(set(windows))
+
+
+def add_moving_averages(rollups: List[Dict[str, Any]], windows: List[int],
+                        since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Attach trailing moving averages of the bucket means, per commodity/market
+    series, to rollups sorted by pair then start. Averages run over the buckets
+    that have observations; buckets starting before `since` only serve as
+    lookback and are dropped from the result.
+    """
+    result = []
+    series: List[float] = []
+    current: Optional[Pair] = None
+    for rollup in rollups:
+        pair = (rollup["commodity"]["english"], rollup["market"])
+        if pair != current:
+            current, series = pair, []
+        series.append(rollup["mean"])
+        rollup["moving_averages"] = {
+            str(window): sum(series[-window:]) / window if len(series) >= window else None
+            for window in windows
+        }
+        if since is None or rollup["start"] >= since:
+            result.append(rollup)
+    return result
@@ -0,0 +1,87 @@
+"""
+Worker pool for CPU-bound chat scoring
+Callers tokenize on the event loop and hand only the numpy scoring of the
+prepared query to a small thread pool. That work releases the GIL for its
+array operations, so the event loop keeps serving the other routers while it
+runs; pure Python work on the pool would hold the GIL and starve the loop. When
+too many jobs are queued, or a job misses its deadline, the caller gets the
+cheap fallback result instead of waiting.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHAT_WORKERS = int(os.environ.get("CHAT_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHAT_MAX_PENDING = int(os.environ.get("CHAT_MAX_PENDING", "64"))
+CHAT_DEADLINE_SECONDS = float(os.environ.get("CHAT_DEADLINE_MS", "200")) / 1000
+CHAT_BATCH_DEADLINE_SECONDS = float(os.environ.get("CHAT_BATCH_DEADLINE_MS", "2000")) / 1000
+
+
+class ScoringPool:
+    """Bounded thread pool with a per-job deadline and a fallback when saturated"""
+
+    def __init__(self, workers: int = CHAT_WORKERS, max_pending: int = CHAT_MAX_PENDING,
+                 deadline: float = CHAT_DEADLINE_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.pending = 0
+        self.completed = 0
+        self.saturated = 0
+        self.timed_out = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chat-scoring")
+        return self._executor
+
+    def _finished(self, _future: asyncio.Future) -> None:
+        self.pending -= 1
+
+    async def run(self, job: Callable[..., Any], fallback: Callable[..., Any], *args: Any,
+                  deadline: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run job(*args) on the pool and return (result, degraded). degraded is
+        True when fallback(*args) answered instead, either because the queue was
+        full or because the job missed its deadline; the job then still runs to
+        completion in the background and keeps counting against the queue.
+        """
+        if self.pending >= self.max_pending:
+            self.saturated += 1
+            return fallback(*args), True
+
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self._pool(), job, *args)
+        future.add_done_callback(self._finished)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), deadline or self.deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return fallback(*args), True
+        self.completed += 1
+        return result, False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "deadline_ms": round(self.deadline * 1000),
+            "pending": self.pending,
+            "completed": self.completed,
+            "saturated": self.saturated,
+            "timed_out": self.timed_out,
+        }
+
+
+scoring_pool = ScoringPool()
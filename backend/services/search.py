@@ -0,0 +1,290 @@
+"""
+Bilingual search for KrishiSahyog
+Tokenizes Hindi (Devanagari) and English text into normalized, stemmed terms
+that are stored on each document and served from a multikey index
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List
+
+from pymongo import UpdateOne
+
+# Field under which the indexed terms are stored on every searchable document
+SEARCH_TERMS_FIELD = "search_terms"
+
+# Bumped whenever tokenizing changes, so stored terms are recomputed at startup
+SEARCH_TERMS_VERSION = 2
+SEARCH_VERSION_FIELD = "search_terms_version"
+
+# Bilingual fields that are tokenized for each collection
+SEARCH_FIELDS: Dict[str, List[str]] = {
+    "schemes": ["name", "description"],
+    "crops": ["crop", "season", "soil_type"],
+    "market_prices": ["commodity"],
+    "storage_guides": ["item"],
+}
+
+# Order of ranked search results: best score first, ties broken by id
+RANKED_SORT = [("_score", -1), ("id", 1)]
+
+# Relative weight of a matching term per field when ranking results
+FIELD_WEIGHTS: Dict[str, int] = {
+    "name": 3,
+    "crop": 3,
+    "commodity": 3,
+    "item": 3,
+}
+
+# Precomposed nukta letters (क़ ख़ ग़ ...) folded onto their base letter
+NUKTA_LETTERS = {
+    "\u0958": "\u0915", "\u0959": "\u0916", "\u095a": "\u0917", "\u095b": "\u091c",
+    "\u095c": "\u0921", "\u095d": "\u0922", "\u095e": "\u092b", "\u095f": "\u092f",
+    "\u0929": "\u0928", "\u0931": "\u0930", "\u0934": "\u0933",
+}
+
+# Spelling variants that users type interchangeably: long/short matras and
+# independent vowels, candrabindu for anusvara, and the nukta sign itself
+DEVANAGARI_FOLDS = {
+    "\u093c": "",        # nukta
+    "\u0901": "\u0902",  # candrabindu -> anusvara
+    "\u0940": "\u093f",  # vowel sign ii -> i
+    "\u0942": "\u0941",  # vowel sign uu -> u
+    "\u0908": "\u0907",  # letter ii -> i
+    "\u090a": "\u0909",  # letter uu -> u
+    "\u200c": "",        # zero width non-joiner
+    "\u200d": "",        # zero width joiner
+}
+DEVANAGARI_TRANSLATION = str.maketrans({**NUKTA_LETTERS, **DEVANAGARI_FOLDS})
+
+# A nasal consonant + virama before another consonant is written either way
+# (हिन्दी / हिंदी), so it is folded onto the anusvara
+HALF_NASAL = re.compile("[\u0919\u091e\u0923\u0928\u092e]\u094d(?=[\u0915-\u0939])")
+
+# Runs of Devanagari letters and signs (excluding the danda punctuation), or
+# runs of any other letters and digits
+TOKEN_PATTERN = re.compile("[\u0900-\u0963\u0966-\u097f]+|[^\\W_]+")
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and canonicalize Hindi and English spellings"""
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    text = text.translate(DEVANAGARI_TRANSLATION)
+    text = HALF_NASAL.sub("\u0902", text)
+    # Drop Latin diacritics while leaving Devanagari combining marks intact
+    return "".join(
+        ch for ch in unicodedata.normalize("NFD", text)
+        if not (unicodedata.combining(ch) and ord(ch) < 0x0900)
+    )
+
+
+ENGLISH_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or "
+    "the to what when where which who why will with".split()
+)
+HINDI_STOPWORDS = frozenset(
+    normalize_text(word) for word in
+    "का की के को में से पर है हैं और या क्या कैसे कब कहां मैं हम यह वह एक "
+    "लिए तो भी ही था थी थे".split()
+)
+
+# Inflectional suffixes stripped by the light Hindi stemmer, longest first.
+# They are folded like the text so long/short matra spellings share a stem.
+HINDI_SUFFIXES = sorted(
+    {
+        normalize_text(suffix) for suffix in [
+            "ियों", "ियां", "ाएं", "ाओं", "ुओं", "ुएं", "ाने", "ाना", "ाते", "ाती",
+            "ता", "ती", "ते", "ना", "ने", "नी", "ों", "ें", "ां", "ी", "ा", "े", "ि", "ु", "ो",
+            # After a vowel sign the ending is written with an independent
+            # vowel instead (बोएं, बोइए, बोओ)
+            "िए", "इए", "एं", "ओं", "ए", "ओ",
+        ]
+    },
+    key=len,
+    reverse=True,
+)
+
+
+def _is_devanagari(token: str) -> bool:
+    return "\u0900" <= token[0] <= "\u097f"
+
+
+def stem_english(token: str) -> str:
+    """Light suffix-stripping stemmer for English plurals and verb forms"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if token.endswith(("ches", "shes", "xes", "zes")):
+        return token[:-2]
+    if token.endswith("ing") and len(token) > 5:
+        token = token[:-3]
+    elif token.endswith("ed") and len(token) > 4:
+        token = token[:-2]
+    elif token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    else:
+        return token
+    # Undo consonant doubling left by -ing/-ed (planning -> plan)
+    if len(token) > 3 and token[-1] == token[-2] and token[-1] not in "aeioulsz":
+        token = token[:-1]
+    return token
+
+
+def stem_hindi(token: str) -> str:
+    """Strip one inflectional suffix while keeping a stem of two or more letters"""
+    for suffix in HINDI_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized, stemmed search terms without stopwords"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(normalize_text(text)):
+        if _is_devanagari(token):
+            if token not in HINDI_STOPWORDS:
+                terms.append(stem_hindi(token))
+        elif token not in ENGLISH_STOPWORDS:
+            terms.append(stem_english(token))
+    return terms
+
+
+def normalize_question(text: str) -> str:
+    """Canonical form of a free-text question: folded spelling, no punctuation, single spaces"""
+    return " ".join(TOKEN_PATTERN.findall(normalize_text(text)))
+
+
+def _field_texts(value: Any) -> Iterable[str]:
+    """Yield every string stored in a bilingual value or list of them"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for text in value.values():
+            yield from _field_texts(text)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _field_texts(item)
+
+
+def field_terms(field: str, query: str) -> List[str]:
+    """Return the field-scoped index terms for a query string"""
+    return sorted({f"{field}:{term}" for term in tokenize(query)})
+
+
+def search_terms_for(collection_name: str, document: Dict[str, Any]) -> List[str]:
+    """Compute the index terms of a document from its searchable fields"""
+    terms = set()
+    for field in SEARCH_FIELDS.get(collection_name, []):
+        for text in _field_texts(document.get(field)):
+            terms.update(field_terms(field, text))
+    return sorted(terms)
+
+
+def with_search_terms(collection_name: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the search terms to a document about to be written"""
+    document[SEARCH_TERMS_FIELD] = search_terms_for(collection_name, document)
+    document[SEARCH_VERSION_FIELD] = SEARCH_TERMS_VERSION
+    return document
+
+
+def touches_search_fields(collection_name: str, update_data: Dict[str, Any]) -> bool:
+    """Whether an update changes any field the search terms are derived from"""
+    return any(field in update_data for field in SEARCH_FIELDS.get(collection_name, []))
+
+
+async def refresh_search_terms(db, collection_name: str, document_id: str) -> None:
+    """Recompute the stored terms of one document after a partial update"""
+    document = await db[collection_name].find_one({"id": document_id})
+    if document is not None:
+        await db[collection_name].update_one(
+            {"id": document_id},
+            {"$set": {
+                SEARCH_TERMS_FIELD: search_terms_for(collection_name, document),
+                SEARCH_VERSION_FIELD: SEARCH_TERMS_VERSION,
+            }},
+        )
+
+
+def match_clause(fields: List[str], query: str) -> Dict[str, Any]:
+    """
+    Filter matching documents that contain every query term, each in any of
+    the given fields, so "red onion" finds Red Onion but not Onion. A query
+    with no indexable terms (only stopwords or punctuation) does not filter at
+    all rather than matching nothing.
+    """
+    groups = [[f"{field}:{term}" for field in fields] for term in sorted(set(tokenize(query)))]
+    if not groups:
+        return {}
+    if len(fields) == 1:
+        return {SEARCH_TERMS_FIELD: {"$all": [group[0] for group in groups]}}
+    return {"$and": [{SEARCH_TERMS_FIELD: {"$in": group}} for group in groups]}
+
+
+def any_term_clause(fields: List[str], query: str) -> Dict[str, Any]:
+    """
+    Filter documents sharing at least one term with the query, for ranked
+    search where the score orders partial matches below full ones
+    """
+    terms = [term for field in fields for term in field_terms(field, query)]
+    if not terms:
+        return {}
+    return {SEARCH_TERMS_FIELD: {"$in": terms}}
+
+
+def score_expression(fields: List[str], query: str) -> Dict[str, Any]:
+    """Aggregation expression scoring a document by its weighted matching terms"""
+    parts = []
+    for field in fields:
+        terms = field_terms(field, query)
+        if terms:
+            parts.append({
+                "$multiply": [
+                    FIELD_WEIGHTS.get(field, 1),
+                    {"$size": {"$setIntersection": [f"${SEARCH_TERMS_FIELD}", terms]}},
+                ]
+            })
+    return {"$add": parts} if parts else {"$literal": 0}
+
+
+def ranked_pipeline(filter_query: Dict[str, Any], fields: List[str], query: str) -> List[Dict[str, Any]]:
+    """
+    Aggregation stages that find documents through the search term index and
+    score them by relevance; sort on RANKED_SORT to get the best match first.
+    Only documents sharing at least one term with the query are scored, so the
+    cost follows the result size, not the collection.
+    """
+    return [
+        {"$match": {**filter_query, **any_term_clause(fields, query)}},
+        {"$addFields": {"_score": score_expression(fields, query)}},
+    ]
+
+
+async def backfill_search_terms(db, batch_size: int = 500) -> Dict[str, int]:
+    """Add search terms to documents written before indexing existed or by an older tokenizer"""
+    updated = {}
+    for collection_name in SEARCH_FIELDS:
+        collection = db[collection_name]
+        operations = []
+        count = 0
+        cursor = collection.find({SEARCH_VERSION_FIELD: {"$ne": SEARCH_TERMS_VERSION}})
+        async for document in cursor:
+            operations.append(UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {
+                    SEARCH_TERMS_FIELD: search_terms_for(collection_name, document),
+                    SEARCH_VERSION_FIELD: SEARCH_TERMS_VERSION,
+                }},
+            ))
+            if len(operations) >= batch_size:
+                await collection.bulk_write(operations, ordered=False)
+                count += len(operations)
+                operations = []
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            count += len(operations)
+        updated[collection_name] = count
+    return updated
@@ -0,0 +1,198 @@
+"""
+Weather stations and nearest-station lookup
+Stations (cities, tehsils, observation sites) come from the weather_stations
+collection, or a built-in list of major agricultural centres while it is
+empty. They are indexed once at startup in a KD-tree over unit vectors on the
+sphere, where straight-line (chord) distance orders points exactly like
+great-circle distance, so a nearest lookup for a lat/lon visits a few small
+leaves instead of every station.
+
+Bulk-load stations with documents of the form
+{"name": ..., "nameHindi": ..., "state": ..., "lat": ..., "lon": ...}.
+"""
+
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STATIONS_COLLECTION = "weather_stations"
+STATION_PROJECTION = {"_id": 0, "name": 1, "nameHindi": 1, "state": 1, "lat": 1, "lon": 1}
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 16
+
+DEFAULT_STATIONS = [
+    {"name": name, "nameHindi": name_hindi, "state": state, "lat": lat, "lon": lon}
+    for name, name_hindi, state, lat, lon in [
+        ("Delhi", "दिल्ली", "Delhi", 28.6139, 77.2090),
+        ("Mumbai", "मुंबई", "Maharashtra", 19.0760, 72.8777),
+        ("Pune", "पुणे", "Maharashtra", 18.5204, 73.8567),
+        ("Nagpur", "नागपुर", "Maharashtra", 21.1458, 79.0882),
+        ("Nashik", "नासिक", "Maharashtra", 19.9975, 73.7898),
+        ("Kolkata", "कोलकाता", "West Bengal", 22.5726, 88.3639),
+        ("Chennai", "चेन्नई", "Tamil Nadu", 13.0827, 80.2707),
+        ("Coimbatore", "कोयंबटूर", "Tamil Nadu", 11.0168, 76.9558),
+        ("Madurai", "मदुरै", "Tamil Nadu", 9.9252, 78.1198),
+        ("Bengaluru", "बेंगलुरु", "Karnataka", 12.9716, 77.5946),
+        ("Hubballi", "हुबली", "Karnataka", 15.3647, 75.1240),
+        ("Hyderabad", "हैदराबाद", "Telangana", 17.3850, 78.4867),
+        ("Visakhapatnam", "विशाखापत्तनम", "Andhra Pradesh", 17.6868, 83.2185),
+        ("Vijayawada", "विजयवाड़ा", "Andhra Pradesh", 16.5062, 80.6480),
+        ("Thiruvananthapuram", "तिरुवनंतपुरम", "Kerala", 8.5241, 76.9366),
+        ("Kochi", "कोच्चि", "Kerala", 9.9312, 76.2673),
+        ("Panaji", "पणजी", "Goa", 15.4909, 73.8278),
+        ("Ahmedabad", "अहमदाबाद", "Gujarat", 23.0225, 72.5714),
+        ("Rajkot", "राजकोट", "Gujarat", 22.3039, 70.8022),
+        ("Jaipur", "जयपुर", "Rajasthan", 26.9124, 75.7873),
+        ("Jodhpur", "जोधपुर", "Rajasthan", 26.2389, 73.0243),
+        ("Lucknow", "लखनऊ", "Uttar Pradesh", 26.8467, 80.9462),
+        ("Kanpur", "कानपुर", "Uttar Pradesh", 26.4499, 80.3319),
+        ("Varanasi", "वाराणसी", "Uttar Pradesh", 25.3176, 82.9739),
+        ("Agra", "आगरा", "Uttar Pradesh", 27.1767, 78.0081),
+        ("Meerut", "मेरठ", "Uttar Pradesh", 28.9845, 77.7064),
+        ("Patna", "पटना", "Bihar", 25.5941, 85.1376),
+        ("Bhopal", "भोपाल", "Madhya Pradesh", 23.2599, 77.4126),
+        ("Indore", "इंदौर", "Madhya Pradesh", 22.7196, 75.8577),
+        ("Jabalpur", "जबलपुर", "Madhya Pradesh", 23.1815, 79.9864),
+        ("Raipur", "रायपुर", "Chhattisgarh", 21.2514, 81.6296),
+        ("Ranchi", "रांची", "Jharkhand", 23.3441, 85.3096),
+        ("Bhubaneswar", "भुवनेश्वर", "Odisha", 20.2961, 85.8245),
+        ("Chandigarh", "चंडीगढ़", "Chandigarh", 30.7333, 76.7794),
+        ("Ludhiana", "लुधियाना", "Punjab", 30.9010, 75.8573),
+        ("Amritsar", "अमृतसर", "Punjab", 31.6340, 74.8723),
+        ("Karnal", "करनाल", "Haryana", 29.6857, 76.9905),
+        ("Hisar", "हिसार", "Haryana", 29.1492, 75.7217),
+        ("Dehradun", "देहरादून", "Uttarakhand", 30.3165, 78.0322),
+        ("Shimla", "शिमला", "Himachal Pradesh", 31.1048, 77.1734),
+        ("Srinagar", "श्रीनगर", "Jammu and Kashmir", 34.0837, 74.7973),
+        ("Guwahati", "गुवाहाटी", "Assam", 26.1445, 91.7362),
+    ]
+]
+
+
+def station_key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord_squared: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+class StationIndex:
+    """
+    Stations by name and a KD-tree for nearest lookups. The tree is stored
+    flat in parallel lists (split dimension, split value, children, leaf
+    ranges) so a query is a short loop without numpy call overhead.
+    """
+
+    def __init__(self, leaf_size: int = LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.stations: List[Dict[str, Any]] = []
+        self.loaded = False
+        self._by_name: Dict[str, int] = {}
+        self._points: List[Tuple[float, float, float]] = []
+        self._order: List[int] = []
+        self._dims: List[int] = []
+        self._splits: List[float] = []
+        self._children: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def build(self, stations: List[Dict[str, Any]]) -> None:
+        """Index a list of stations, replacing the current set"""
+        stations = [station for station in stations
+                    if station.get("name") and station.get("lat") is not None and station.get("lon") is not None]
+        by_name: Dict[str, int] = {}
+        for position, station in enumerate(stations):
+            for name in (station["name"], station.get("nameHindi")):
+                if name:
+                    # The first station listed keeps a name shared by several
+                    by_name.setdefault(station_key(name), position)
+
+        points = unit_vectors(
+            np.array([station["lat"] for station in stations], dtype=np.float64),
+            np.array([station["lon"] for station in stations], dtype=np.float64),
+        ).reshape(-1, 3)
+        order = np.arange(len(stations))
+        self._dims, self._splits, self._children = [], [], []
+        if len(stations):
+            self._split(points, order, 0, len(stations))
+
+        self._points = [tuple(point) for point in points[order].tolist()]
+        self._order = order.tolist()
+        self._by_name = by_name
+        self.stations = stations
+        self.loaded = True
+
+    def _split(self, points: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        node = len(self._dims)
+        self._dims.append(-1)
+        self._splits.append(0.0)
+        self._children.append((start, end))
+        if end - start <= self.leaf_size:
+            return node
+        subset = points[order[start:end]]
+        dim = int(np.argmax(np.ptp(subset, axis=0)))
+        middle = (end - start) // 2
+        order[start:end] = order[start:end][np.argpartition(subset[:, dim], middle)]
+        self._dims[node] = dim
+        self._splits[node] = float(points[order[start + middle], dim])
+        left = self._split(points, order, start, start + middle)
+        right = self._split(points, order, start + middle, end)
+        self._children[node] = (left, right)
+        return node
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """A station by its English or Hindi name"""
+        position = self._by_name.get(station_key(name))
+        return self.stations[position] if position is not None else None
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """The station closest to a point and its great-circle distance in km"""
+        if not self.stations:
+            return None
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        query = (math.cos(lat_r) * math.cos(lon_r), math.cos(lat_r) * math.sin(lon_r), math.sin(lat_r))
+        best, best_slot = math.inf, -1
+        dims, splits, children, points = self._dims, self._splits, self._children, self._points
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound >= best:
+                continue
+            dim = dims[node]
+            if dim < 0:
+                start, end = children[node]
+                for slot in range(start, end):
+                    x, y, z = points[slot]
+                    distance = (x - query[0]) ** 2 + (y - query[1]) ** 2 + (z - query[2]) ** 2
+                    if distance < best:
+                        best, best_slot = distance, slot
+                continue
+            offset = query[dim] - splits[node]
+            left, right = children[node]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # The far side can only be closer than the splitting plane
+            stack.append((far, offset * offset))
+            stack.append((near, bound))
+        return self.stations[self._order[best_slot]], chord_to_km(best)
+
+    async def load(self, db) -> None:
+        """(Re)build from the stations collection, or the built-in list when it is empty"""
+        stations = await db[STATIONS_COLLECTION].find({}, STATION_PROJECTION).to_list(None)
+        self.build(stations or DEFAULT_STATIONS)
+        logger.info("Indexed %d weather stations", len(self.stations))
+
+
+station_index = StationIndex()
@@ -0,0 +1,199 @@
+"""
+Read-through weather cache
+Lookups go to an in-process tier first, then to the weather_cache collection
+(expired documents are removed by its TTL index), and only then upstream.
+Concurrent misses for the same location share one load. Entries live until
+the end of the upstream refresh window they were fetched in, so the cache
+key changes exactly when the provider can have new data. Expired entries are
+kept in memory as a stale copy for when upstream is unavailable, and for a
+short grace period they are served straight away while a background load
+revalidates them.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+WEATHER_COLLECTION = "weather_cache"
+
+# The provider recomputes current conditions about every ten minutes
+WEATHER_REFRESH_SECONDS = int(os.environ.get("WEATHER_REFRESH_SECONDS", "600"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", "5000"))
+# How long after expiry an entry is still served while it is being revalidated
+WEATHER_STALE_GRACE_SECONDS = int(os.environ.get("WEATHER_STALE_GRACE_SECONDS", "300"))
+
+Fetcher = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+def location_key(location: str) -> str:
+    return " ".join(location.split()).casefold()
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    """POSIX time of a naive UTC datetime as stored by Mongo"""
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else None
+
+
+@dataclass
+class WeatherEntry:
+    location: str
+    data: Dict[str, Any]
+    fetched_at: float
+    expires_at: float
+    source: str = "upstream"
+
+    def fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+
+class WeatherCache:
+    """Memory tier over a Mongo tier over the upstream fetcher, with single-flight loads"""
+
+    def __init__(self, db, refresh_seconds: int = WEATHER_REFRESH_SECONDS,
+                 max_entries: int = WEATHER_CACHE_MAX_ENTRIES,
+                 stale_grace: int = WEATHER_STALE_GRACE_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.max_entries = max_entries
+        self.stale_grace = stale_grace
+        self._entries: "OrderedDict[str, WeatherEntry]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.upstream_fetches = 0
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def window(self, now: float):
+        """Start slot and end time of the upstream refresh window containing `now`"""
+        slot = int(now // self.refresh_seconds)
+        return slot, (slot + 1) * self.refresh_seconds
+
+    def cache_key(self, location: str, now: float) -> str:
+        return f"weather:{location_key(location)}:{self.window(now)[0]}"
+
+    def peek(self, location: str) -> Optional[WeatherEntry]:
+        """The in-memory entry for a location, fresh or stale, without counting a lookup"""
+        return self._entries.get(location_key(location))
+
+    def remember(self, entry: WeatherEntry) -> None:
+        key = location_key(entry.location)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def cached(self, location: str) -> Optional[WeatherEntry]:
+        """The fresh in-memory entry for a location, counted as a memory hit, or None"""
+        entry = self.peek(location)
+        if entry is None or not entry.fresh():
+            return None
+        self._entries.move_to_end(location_key(location))
+        self.memory_hits += 1
+        return entry
+
+    async def get(self, location: str, fetch: Fetcher) -> WeatherEntry:
+        """
+        Weather for a location from the nearest tier that has it. An entry that
+        expired less than the grace period ago is returned as is while it is
+        reloaded in the background.
+        """
+        entry = self.cached(location)
+        if entry is not None:
+            return entry
+        stale = self.peek(location)
+        if stale is not None and time.time() < stale.expires_at + self.stale_grace:
+            self.stale_served += 1
+            if location_key(location) not in self._loading:
+                self._start_load(location, fetch, skip_mongo=False)
+            return stale
+        return await self.load(location, fetch)
+
+    async def load(self, location: str, fetch: Fetcher, skip_mongo: bool = False) -> WeatherEntry:
+        """Load past the memory tier; concurrent loads of one location share a single call"""
+        return await asyncio.shield(self._start_load(location, fetch, skip_mongo))
+
+    def _start_load(self, location: str, fetch: Fetcher, skip_mongo: bool) -> asyncio.Task:
+        key = location_key(location)
+        task = self._loading.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # A task, so a caller that goes away does not cancel the load for the others
+            task = asyncio.create_task(self._load(location, fetch, skip_mongo))
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self._loaded(key, done))
+        return task
+
+    def _loaded(self, key: str, task: asyncio.Task) -> None:
+        self._loading.pop(key, None)
+        if not task.cancelled():
+            # Retrieve the exception so a load nobody waited for does not log it as lost
+            task.exception()
+
+    async def _load(self, location: str, fetch: Fetcher, skip_mongo: bool) -> WeatherEntry:
+        now = time.time()
+        cache_key = self.cache_key(location, now)
+        if not skip_mongo:
+            try:
+                document = await self.db[WEATHER_COLLECTION].find_one(
+                    {"cache_key": cache_key, "expires_at": {"$gt": datetime.utcfromtimestamp(now)}}
+                )
+            except PyMongoError:
+                logger.exception("Weather cache read failed for %s", location)
+                document = None
+            if document is not None:
+                self.mongo_hits += 1
+                entry = WeatherEntry(
+                    location=location,
+                    data=document["data"],
+                    fetched_at=_timestamp(document.get("fetched_at")) or now,
+                    expires_at=self.window(now)[1],
+                    source="mongo",
+                )
+                self.remember(entry)
+                return entry
+
+        data = await fetch(location)
+        self.upstream_fetches += 1
+        fetched_at = time.time()
+        expires_at = self.window(fetched_at)[1]
+        entry = WeatherEntry(location=location, data=data, fetched_at=fetched_at, expires_at=expires_at)
+        self.remember(entry)
+        try:
+            # One write per upstream fetch, shared by every worker until the window ends
+            await self.db[WEATHER_COLLECTION].update_one(
+                {"cache_key": self.cache_key(location, fetched_at)},
+                {"$set": {
+                    "location": location,
+                    "data": data,
+                    "fetched_at": datetime.utcfromtimestamp(fetched_at),
+                    "expires_at": datetime.utcfromtimestamp(expires_at),
+                }},
+                upsert=True,
+            )
+        except PyMongoError:
+            logger.exception("Weather cache write failed for %s", location)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.mongo_hits + self.upstream_fetches + self.coalesced + self.stale_served
+        return {
+            "entries": len(self._entries),
+            "refresh_seconds": self.refresh_seconds,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "upstream_fetches": self.upstream_fetches,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "hit_rate": round((lookups - self.upstream_fetches) / lookups, 4) if lookups else 0.0,
+        }
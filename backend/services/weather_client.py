@@ -0,0 +1,217 @@
+"""
+Upstream weather client (OpenWeatherMap)
+One aiohttp session per process, opened and closed with the app, with a
+bounded connection pool and DNS cache. Current conditions and the forecast are
+fetched concurrently under per-request timeouts, and a circuit breaker stops
+calling a failing upstream for a while so callers can fall back to stale data.
+
+The base URL is configurable (WEATHER_API_BASE_URL), so the client can be
+pointed at a local stub server that serves /weather and /forecast.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+WEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY", "")
+WEATHER_API_BASE_URL = os.environ.get("WEATHER_API_BASE_URL", "https://api.openweathermap.org/data/2.5")
+WEATHER_POOL_SIZE = int(os.environ.get("WEATHER_POOL_SIZE", "20"))
+WEATHER_DNS_TTL_SECONDS = int(os.environ.get("WEATHER_DNS_TTL_SECONDS", "300"))
+WEATHER_REQUEST_TIMEOUT_SECONDS = float(os.environ.get("WEATHER_REQUEST_TIMEOUT_SECONDS", "3"))
+WEATHER_BREAKER_FAILURES = int(os.environ.get("WEATHER_BREAKER_FAILURES", "5"))
+WEATHER_BREAKER_RESET_SECONDS = float(os.environ.get("WEATHER_BREAKER_RESET_SECONDS", "30"))
+
+# Provider condition groups in the labels the app shows
+CONDITIONS = {
+    "Clear": ("Sunny", "धूप"),
+    "Clouds": ("Cloudy", "बादल"),
+    "Rain": ("Rain", "बारिश"),
+    "Drizzle": ("Drizzle", "बूंदाबांदी"),
+    "Thunderstorm": ("Thunderstorm", "आंधी-तूफान"),
+    "Snow": ("Snow", "बर्फबारी"),
+    "Mist": ("Fog", "कोहरा"),
+    "Fog": ("Fog", "कोहरा"),
+    "Haze": ("Haze", "धुंध"),
+    "Smoke": ("Haze", "धुंध"),
+    "Dust": ("Haze", "धुंध"),
+}
+
+DAY_LABELS = [
+    ("Today", "आज"), ("Tomorrow", "कल"), ("Day 3", "तीसरा दिन"), ("Day 4", "चौथा दिन"),
+    ("Day 5", "पांचवा दिन"), ("Day 6", "छठा दिन"), ("Day 7", "सातवां दिन"),
+]
+
+
+class WeatherUnavailable(Exception):
+    """Upstream weather could not be fetched"""
+
+
+class CircuitOpen(WeatherUnavailable):
+    """Upstream is considered unhealthy and is not being called"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after a cool-down lets one trial call through"""
+
+    def __init__(self, failure_threshold: int = WEATHER_BREAKER_FAILURES,
+                 reset_seconds: float = WEATHER_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def release(self) -> None:
+        """End a call that was abandoned without a verdict, so a new trial can go through"""
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+def _condition(payload: Dict[str, Any]) -> tuple:
+    group = (payload.get("weather") or [{}])[0].get("main", "")
+    return CONDITIONS.get(group, (group or "Unknown", group or "अज्ञात"))
+
+
+def current_conditions(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """App shape of a /weather response"""
+    condition, condition_hindi = _condition(payload)
+    return {
+        "temperature": round(payload["main"]["temp"]),
+        "humidity": payload["main"]["humidity"],
+        # m/s to km/h
+        "windSpeed": round(payload.get("wind", {}).get("speed", 0) * 3.6),
+        "condition": condition,
+        "conditionHindi": condition_hindi,
+    }
+
+
+def daily_forecast(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Fold the 3-hourly /forecast list into daily highs, lows and the midday condition"""
+    offset = payload.get("city", {}).get("timezone", 0)
+    days: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for slot in payload.get("list", []):
+        local_day = datetime.fromtimestamp(slot["dt"] + offset, tz=timezone.utc).date().isoformat()
+        days.setdefault(local_day, []).append(slot)
+
+    forecast = []
+    for (label, label_hindi), slots in zip(DAY_LABELS, days.values()):
+        condition, condition_hindi = _condition(slots[len(slots) // 2])
+        forecast.append({
+            "day": label,
+            "dayHindi": label_hindi,
+            "high": round(max(slot["main"]["temp_max"] for slot in slots)),
+            "low": round(min(slot["main"]["temp_min"] for slot in slots)),
+            "condition": condition,
+            "conditionHindi": condition_hindi,
+        })
+    return forecast
+
+
+class WeatherClient:
+    """Long-lived upstream client; start() and close() are tied to the app lifespan"""
+
+    def __init__(self, api_key: str = WEATHER_API_KEY, base_url: str = WEATHER_API_BASE_URL,
+                 pool_size: int = WEATHER_POOL_SIZE, timeout: float = WEATHER_REQUEST_TIMEOUT_SECONDS,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    async def start(self) -> None:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=WEATHER_DNS_TTL_SECONDS)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self._session is None:
+            await self.start()
+        query = {**params, "appid": self.api_key, "units": "metric"}
+        async with self._session.get(f"{self.base_url}/{path}", params=query, timeout=self.timeout) as response:
+            if response.status != 200:
+                raise WeatherUnavailable(f"{path} answered {response.status}")
+            return await response.json()
+
+    async def fetch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Current conditions and daily forecast for a location given as provider
+        query parameters ({"q": "Delhi"} or {"lat": ..., "lon": ...})
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("Weather upstream circuit is open")
+        try:
+            current, forecast = await asyncio.gather(
+                self._get("weather", params),
+                self._get("forecast", params),
+            )
+            data = {"current": current_conditions(current), "forecast": daily_forecast(forecast)}
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError, WeatherUnavailable) as e:
+            self.breaker.record_failure()
+            logger.warning("Weather upstream failed for %s: %r", params, e)
+            raise WeatherUnavailable(str(e) or type(e).__name__) from e
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled by the caller: says nothing about upstream, but must not
+            # leave a half-open breaker waiting forever for this trial
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+
+weather_client = WeatherClient()
@@ -0,0 +1,160 @@
+"""
+Background refresh of popular weather locations
+Requests are counted per location with a per-window decay, and when an
+upstream refresh window ends the hottest locations are reloaded in the
+background before users ask for them again. Cache entries expire exactly at
+the window boundary (the provider has nothing newer before it), so the
+refresh starts just after the boundary; requests that arrive in the meantime
+get the previous entry through the cache's stale-while-revalidate grace.
+Refreshes are spaced out and jittered to stay under the API key's rate limit
+and so that workers do not all call upstream in the same second.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from services.weather_cache import Fetcher, WeatherCache, WeatherEntry, location_key
+from services.weather_client import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# on | off
+WEATHER_PREFETCH = os.environ.get("WEATHER_PREFETCH", "on").lower()
+WEATHER_PREFETCH_TOP = int(os.environ.get("WEATHER_PREFETCH_TOP", "50"))
+# Upstream loads per second spent on prefetching (each load is two API calls)
+WEATHER_PREFETCH_RATE = float(os.environ.get("WEATHER_PREFETCH_RATE", "0.5"))
+# Refreshes of one window are spread over this many seconds after its start
+WEATHER_PREFETCH_SPREAD_SECONDS = float(os.environ.get("WEATHER_PREFETCH_SPREAD_SECONDS", "120"))
+
+# Request counts are multiplied by this at every window boundary
+DECAY = 0.5
+# Locations whose decayed count falls below this are forgotten
+MIN_COUNT = 0.1
+LAG_SAMPLES = 500
+
+
+class WeatherPrefetcher:
+    """Tracks location popularity and refreshes the hottest locations each window"""
+
+    def __init__(self, cache: WeatherCache, fetch: Fetcher, top: int = WEATHER_PREFETCH_TOP,
+                 rate: float = WEATHER_PREFETCH_RATE, spread: float = WEATHER_PREFETCH_SPREAD_SECONDS,
+                 enabled: bool = WEATHER_PREFETCH != "off"):
+        self.cache = cache
+        self.fetch = fetch
+        self.top = top
+        self.rate = rate
+        self.spread = spread
+        self.enabled = enabled
+        self.counts: Dict[str, float] = {}
+        self.names: Dict[str, str] = {}
+        # Entry loaded by the last prefetch of each location
+        self._prefetched: Dict[str, WeatherEntry] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.prefetch_hits = 0
+        self.refreshes = 0
+        self.skipped = 0
+        self.failures = 0
+        self.lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+
+    def record(self, location: str, entry: Optional[WeatherEntry]) -> None:
+        """Count a request for a location and whether a prefetched entry answered it"""
+        key = location_key(location)
+        self.requests += 1
+        self.counts[key] = self.counts.get(key, 0.0) + 1
+        self.names.setdefault(key, location)
+        if entry is not None and self._prefetched.get(key) is entry:
+            self.prefetch_hits += 1
+
+    def hottest(self):
+        """Names of the most requested locations, hottest first"""
+        keys = heapq.nlargest(self.top, self.counts, key=self.counts.get)
+        return [self.names[key] for key in keys]
+
+    def _decay(self) -> None:
+        for key in list(self.counts):
+            self.counts[key] *= DECAY
+            if self.counts[key] < MIN_COUNT:
+                del self.counts[key]
+                self.names.pop(key, None)
+                self._prefetched.pop(key, None)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.time()
+            boundary = self.cache.window(now)[1]
+            await asyncio.sleep(boundary - now)
+            try:
+                self._decay()
+                await self.refresh(boundary)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Weather prefetch round failed")
+
+    async def refresh(self, boundary: float) -> None:
+        """Reload the hottest locations for the window starting at `boundary`"""
+        locations = self.hottest()
+        if not locations:
+            return
+        spread = min(self.spread, self.cache.refresh_seconds / 2)
+        interval = max(spread / len(locations), 1 / self.rate)
+        # A random start keeps the workers' rounds from lining up
+        await asyncio.sleep(random.uniform(0, interval))
+        for location in locations:
+            entry = self.cache.peek(location)
+            if entry is not None and entry.fresh():
+                # A request already brought it up to date
+                self.skipped += 1
+                continue
+            try:
+                entry = await self.cache.load(location, self.fetch)
+            except CircuitOpen:
+                logger.warning("Weather upstream circuit open, prefetch round stopped")
+                return
+            except Exception as e:
+                self.failures += 1
+                logger.warning("Weather prefetch failed for %s: %r", location, e)
+            else:
+                self.refreshes += 1
+                self._prefetched[location_key(location)] = entry
+                self.lags.append(max(0.0, entry.fetched_at - boundary))
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+
+    def stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "tracked_locations": len(self.counts),
+            "requests": self.requests,
+            "prefetch_hits": self.prefetch_hits,
+            "prefetch_hit_ratio": round(self.prefetch_hits / self.requests, 4) if self.requests else 0.0,
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "refresh_lag_seconds": {
+                "average": round(sum(lags) / len(lags), 3) if lags else 0.0,
+                "p95": round(lags[int(0.95 * (len(lags) - 1))], 3) if lags else 0.0,
+                "max": round(lags[-1], 3) if lags else 0.0,
+            },
+        }
@@ -0,0 +1,54 @@
+"""
+Shared fixtures for the backend tests
+Tests run against an in-memory MongoDB (mongomock-motor); route tests mount a
+single router on a throwaway app and point the route module at that database.
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+from fastapi import APIRouter, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from services.cache import ANSWER_CACHE, CONTENT_CACHES  # noqa: E402
+
+
+def run(coroutine):
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["krishi_test"]
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Every test starts with cold content caches"""
+    for cache in (*CONTENT_CACHES.values(), ANSWER_CACHE):
+        cache.clear()
+    yield
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """Return a factory building a TestClient for one route module wired to `db`"""
+    def build(route_module) -> TestClient:
+        monkeypatch.setattr(route_module, "db", db)
+        api_router = APIRouter(prefix="/api")
+        api_router.include_router(route_module.router)
+        app = FastAPI()
+        app.include_router(api_router)
+        return TestClient(app)
+    return build
@@ -0,0 +1,92 @@
+import pytest
+from fastapi.responses import JSONResponse
+
+from services import cache as cache_module
+from services.cache import CachedResponse, LIST_TAG, ResponseCache, cache_key, item_tag
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock the test moves by hand"""
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+def counters(cache):
+    stats = cache.stats()
+    return {name: stats[name] for name in ("entries", "hits", "misses", "evictions", "expirations", "invalidations")}
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = ResponseCache("test", ttl_seconds=60)
+    cache.set("a", 1)
+    clock["now"] += 59.9
+    assert cache.get("a") == 1
+
+    # Reading does not extend the lifetime; writing again does
+    clock["now"] += 0.1
+    assert cache.get("a") is None
+    cache.set("a", 2)
+    clock["now"] += 30
+    assert cache.get("a") == 2
+
+    assert counters(cache) == {
+        "entries": 1, "hits": 2, "misses": 1, "evictions": 0, "expirations": 1, "invalidations": 0,
+    }
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = ResponseCache("test", max_entries=3)
+    for key in "abc":
+        cache.set(key, key.upper())
+
+    cache.get("a")            # a is now the most recently used
+    cache.set("b", "B2")      # and rewriting b moves it behind a
+    cache.set("d", "D")
+    assert cache.get("c") is None
+    cache.set("e", "E")
+    assert cache.get("a") is None
+    assert [cache.get(key) for key in "bde"] == ["B2", "D", "E"]
+
+    assert counters(cache) == {
+        "entries": 3, "hits": 4, "misses": 2, "evictions": 2, "expirations": 0, "invalidations": 0,
+    }
+
+
+def test_invalidation_drops_exactly_the_tagged_entries(clock):
+    cache = ResponseCache("test")
+    cache.set(cache_key("list", season="rabi"), "rabi page", [LIST_TAG, item_tag("c1"), item_tag("c2")])
+    cache.set(cache_key("list", season="kharif"), "kharif page", [LIST_TAG, item_tag("c3")])
+    cache.set(cache_key("item", id="c1"), "c1", [item_tag("c1")])
+    cache.set(cache_key("item", id="c3"), "c3", [item_tag("c3")])
+
+    assert cache.invalidate(item_tag("c1")) == 2
+    assert cache.get(cache_key("list", season="rabi")) is None
+    assert cache.get(cache_key("item", id="c1")) is None
+    assert cache.get(cache_key("list", season="kharif")) == "kharif page"
+
+    assert cache.invalidate(LIST_TAG, "unknown") == 1
+    assert cache.invalidate(LIST_TAG) == 0
+    assert cache.get(cache_key("item", id="c3")) == "c3"
+
+    # An evicted or replaced entry no longer answers to its old tags
+    cache.set(cache_key("item", id="c3"), "c3 again", [item_tag("c9")])
+    assert cache.invalidate(item_tag("c3")) == 0
+    assert cache.clear() == 1
+    assert counters(cache)["invalidations"] == 4
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_cache_keys_ignore_unset_parameters_and_order():
+    assert cache_key("list", season=" rabi ", region=None, after="") == cache_key("list", season="rabi")
+    assert cache_key("list", filter={"b": 1, "a": 2}) == cache_key("list", filter={"a": 2, "b": 1})
+    assert cache_key("list", limit=10) != cache_key("item", limit=10)
+
+
+def test_cached_responses_replay_body_and_headers():
+    response = JSONResponse(content={"id": "c1"}, headers={"ETag": '"v1"'})
+    replayed = CachedResponse.from_response(response).to_response()
+    assert replayed.body == response.body
+    assert replayed.headers["etag"] == '"v1"'
+    assert replayed.media_type == "application/json"
@@ -0,0 +1,52 @@
+from routes import ai_assistant
+from services.qa_index import QAIndex
+from services.scoring_pool import ScoringPool
+
+QA = {
+    "id": "q1",
+    "question": {"english": "When should I sow wheat?", "hindi": "गेहूं कब बोएं?"},
+    "answer": {"english": "Sow wheat in November.", "hindi": "गेहूं नवंबर में बोएं।"},
+    "category": "sowing",
+}
+
+
+def saturated(monkeypatch):
+    """Point the chat routes at a loaded index and a pool with no room left"""
+    index = QAIndex()
+    index.add(QA)
+    index.loaded = True
+    quick_searches = []
+    quick_score = index.quick_score
+
+    def counted(prepared, limit):
+        quick_searches.append(prepared)
+        return quick_score(prepared, limit)
+
+    monkeypatch.setattr(index, "quick_score", counted)
+    monkeypatch.setattr(ai_assistant, "qa_index", index)
+    monkeypatch.setattr(ai_assistant, "scoring_pool", ScoringPool(max_pending=0))
+    return quick_searches
+
+
+def test_saturated_batch_ranks_only_a_few_questions_on_the_event_loop(api, monkeypatch):
+    quick_searches = saturated(monkeypatch)
+    monkeypatch.setattr(ai_assistant, "CHAT_FALLBACK_BATCH", 3)
+    client = api(ai_assistant)
+
+    questions = [{"question": f"when to sow wheat {number}", "language": "english"} for number in range(50)]
+    answers = client.post("/api/ai/chat/batch", json=questions).json()
+
+    assert len(quick_searches) == 3
+    assert len(answers) == 50
+    busy = ai_assistant.busy_response("english").answer
+    assert [answer["answer"] == busy for answer in answers] == [False] * 3 + [True] * 47
+
+
+def test_fallback_answers_are_not_cached(api, monkeypatch):
+    quick_searches = saturated(monkeypatch)
+    client = api(ai_assistant)
+    question = [{"question": "wheat", "language": "english"}]
+
+    client.post("/api/ai/chat/batch", json=question)
+    client.post("/api/ai/chat/batch", json=question)
+    assert len(quick_searches) == 2
@@ -0,0 +1,254 @@
+import asyncio
+import os
+
+import pytest
+
+from conftest import run
+from services import coherence
+from services.cache import ANSWER_CACHE, LIST_TAG, content_cache, item_tag
+from services.coherence import (
+    VERSIONS_COLLECTION, CacheCoherence, invalidate_answers, invalidate_content_cache, publish_change
+)
+from services.qa_index import QAIndex
+
+REPLICA_SET_URL = os.environ.get("MONGO_REPLICA_SET_URL")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(coherence, "_seen_versions", {})
+    monkeypatch.setattr(coherence, "_listeners", [invalidate_content_cache])
+
+
+async def publish_remotely(db, monkeypatch, *change):
+    """Publish as another worker would, without this worker's version bookkeeping"""
+    with monkeypatch.context() as patch:
+        patch.setattr(coherence, "_seen_versions", {})
+        await publish_change(db, *change)
+
+
+def publish_elsewhere(db, monkeypatch, *change):
+    run(publish_remotely(db, monkeypatch, *change))
+
+
+def fill(cache):
+    cache.set("list-page", "page", [LIST_TAG, item_tag("a"), item_tag("b")])
+    cache.set("item-a", "a", [item_tag("a")])
+    cache.set("item-b", "b", [item_tag("b")])
+
+
+def cached_keys(cache):
+    return sorted(key for key in ("list-page", "item-a", "item-b") if key in cache._entries)
+
+
+def qa(qa_id, question):
+    return {"id": qa_id, "question": {"english": question, "hindi": ""},
+            "answer": {"english": "", "hindi": ""}, "category": "general"}
+
+
+def test_delete_drops_only_the_affected_document():
+    crops = content_cache("crops")
+    fill(crops)
+
+    invalidate_content_cache("crops", "a", "delete")
+    assert cached_keys(crops) == ["item-b"]
+
+
+def test_insert_drops_list_pages_only():
+    crops = content_cache("crops")
+    fill(crops)
+
+    invalidate_content_cache("crops", "c", "insert")
+    assert cached_keys(crops) == ["item-a", "item-b"]
+
+
+def test_answer_cache_keeps_answers_from_other_pairs_on_update():
+    ANSWER_CACHE.set("q1", "answer", [LIST_TAG, item_tag("a")])
+    ANSWER_CACHE.set("q2", "answer", [LIST_TAG, item_tag("b")])
+
+    invalidate_answers("a", "update")
+    assert ANSWER_CACHE.get("q1") is None
+    assert ANSWER_CACHE.get("q2") == "answer"
+
+
+def test_polling_replays_logged_changes_per_document(db, monkeypatch):
+    crops = content_cache("crops")
+    worker = CacheCoherence(db, collections=["crops"], mode="poll")
+    run(worker.poll_once())
+    fill(crops)
+
+    publish_elsewhere(db, monkeypatch, "crops", "a", "delete")
+    run(worker.poll_once())
+    assert cached_keys(crops) == ["item-b"]
+
+    publish_elsewhere(db, monkeypatch, "crops", "c", "insert")
+    publish_elsewhere(db, monkeypatch, "crops", "b", "update")
+    fill(crops)
+    run(worker.poll_once())
+    assert cached_keys(crops) == ["item-a"]
+
+
+def test_polling_clears_when_the_log_no_longer_covers_the_gap(db, monkeypatch):
+    monkeypatch.setattr(coherence, "CHANGE_LOG_SIZE", 2)
+    crops = content_cache("crops")
+    worker = CacheCoherence(db, collections=["crops"], mode="poll")
+    run(worker.poll_once())
+    fill(crops)
+
+    for document_id in ("x", "y", "z"):
+        publish_elsewhere(db, monkeypatch, "crops", document_id, "update")
+    run(worker.poll_once())
+    assert cached_keys(crops) == []
+
+
+def test_own_writes_are_not_replayed(db):
+    crops = content_cache("crops")
+    worker = CacheCoherence(db, collections=["crops"], mode="poll")
+    run(worker.poll_once())
+
+    run(publish_change(db, "crops", "a", "delete"))
+    fill(crops)
+    run(worker.poll_once())
+    assert cached_keys(crops) == ["item-a", "item-b", "list-page"]
+
+
+def test_qa_index_patches_single_pairs_from_remote_changes(db, monkeypatch):
+    index = QAIndex()
+    worker = CacheCoherence(db, collections=["qa_pairs"], mode="poll")
+    reloads = []
+
+    async def scenario():
+        await db.qa_pairs.insert_many([qa("a", "wheat sowing"), qa("b", "rice irrigation")])
+        await index.load(db)
+        original_load = index.load
+
+        async def counting_load(db):
+            reloads.append(True)
+            await original_load(db)
+
+        monkeypatch.setattr(index, "load", counting_load)
+        index.follow_changes(db)
+        await worker.poll_once()
+
+        await db.qa_pairs.delete_one({"id": "a"})
+        await publish_remotely(db, monkeypatch, "qa_pairs", "a", "delete")
+        await worker.poll_once()
+        await asyncio.sleep(0.01)
+
+    run(scenario())
+    assert sorted(index.documents) == ["b"]
+    assert reloads == []
+
+
+def test_remote_qa_update_drops_answers_cached_before_the_index_caught_up(db, monkeypatch):
+    index = QAIndex()
+    worker = CacheCoherence(db, collections=["qa_pairs"], mode="poll")
+    key = ("wheat sowing", "english")
+
+    def answer_from_index():
+        """What a chat request would rank and cache at this moment"""
+        best = index.search("wheat sowing")[0]
+        ANSWER_CACHE.set(key, best.qa["answer"]["english"], [LIST_TAG, item_tag(best.qa["id"])])
+
+    async def scenario():
+        await db.qa_pairs.insert_one({**qa("a", "wheat sowing"), "answer": {"english": "old", "hindi": ""}})
+        await index.load(db)
+        index.follow_changes(db)
+        await worker.poll_once()
+        answer_from_index()
+
+        await db.qa_pairs.update_one({"id": "a"}, {"$set": {"answer.english": "new"}})
+        await publish_remotely(db, monkeypatch, "qa_pairs", "a", "update")
+        await worker.poll_once()
+        # A request served before the index refresh ran still sees the old pair
+        answer_from_index()
+        assert ANSWER_CACHE.get(key) == "old"
+        await asyncio.sleep(0.01)
+
+    run(scenario())
+    assert index.documents["a"]["answer"]["english"] == "new"
+    assert ANSWER_CACHE.get(key) is None
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for change in self.changes:
+            yield change
+
+
+class ChangeStreamDatabase:
+    """mongomock database plus a canned change stream"""
+
+    def __init__(self, db, changes):
+        self._db = db
+        self._changes = changes
+        self.pipelines = []
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def watch(self, pipeline, **options):
+        self.pipelines.append(pipeline)
+        return FakeStream(self._changes)
+
+
+def test_change_stream_takes_deletes_from_the_change_log(db):
+    crops = content_cache("crops")
+    fill(crops)
+    changes = [
+        {"ns": {"coll": "crops"}, "operationType": "update", "fullDocument": {"id": "b"}},
+        {"ns": {"coll": VERSIONS_COLLECTION}, "operationType": "update", "fullDocument": {
+            "_id": "crops", "version": 2, "changes": [
+                {"id": "b", "operation": "update"}, {"id": "a", "operation": "delete"},
+            ],
+        }},
+    ]
+    run(db[VERSIONS_COLLECTION].insert_one({"_id": "crops", "version": 0, "changes": []}))
+    worker = CacheCoherence(ChangeStreamDatabase(db, changes), collections=["crops"], mode="changestream")
+
+    run(worker._watch())
+    assert worker.active_mode == "changestream"
+    assert cached_keys(crops) == []
+
+
+@pytest.mark.skipif(not REPLICA_SET_URL, reason="set MONGO_REPLICA_SET_URL to a replica set to run")
+def test_change_stream_against_a_replica_set():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(REPLICA_SET_URL)
+        db = client["krishi_coherence_test"]
+        await db.crops.delete_many({})
+        await db.crops.insert_one({"id": "a"})
+        crops = content_cache("crops")
+        fill(crops)
+        worker = CacheCoherence(db, collections=["crops"], mode="changestream")
+        worker.start()
+        try:
+            await asyncio.sleep(1)
+            await db.crops.delete_one({"id": "a"})
+            await publish_remotely(db, pytest.MonkeyPatch(), "crops", "a", "delete")
+            for _ in range(50):
+                if "item-a" not in crops._entries:
+                    break
+                await asyncio.sleep(0.1)
+            assert worker.active_mode == "changestream"
+            assert cached_keys(crops) == ["item-b"]
+        finally:
+            await worker.stop()
+            await client.drop_database("krishi_coherence_test")
+            client.close()
+
+    run(scenario())
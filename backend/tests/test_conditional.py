@@ -0,0 +1,81 @@
+from routes import crops, market
+from services.cache import content_cache
+
+
+def text(english, hindi="हिंदी"):
+    return {"english": english, "hindi": hindi}
+
+
+CROP = {
+    "crop": text("Wheat", "गेहूं"), "season": text("Rabi", "रबी"), "soil_type": text("Loam", "दोमट"),
+    "sowing_time": text("November"), "harvest_time": text("April"), "tips": text("Irrigate"),
+    "region": "Punjab",
+}
+
+PRICE = {
+    "commodity": text("Wheat", "गेहूं"), "market": "Azadpur", "price": 2400, "unit": "quintal",
+    "date": "2024-05-01",
+}
+
+
+def test_list_answers_304_until_a_write(api):
+    client = api(crops)
+    created = client.post("/api/crops", json=CROP).json()
+
+    first = client.get("/api/crops")
+    etag = first.headers["ETag"]
+    assert "Last-Modified" in first.headers
+    assert client.get("/api/crops", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/crops/{created['id']}", json={"region": "Haryana"})
+    changed = client.get("/api/crops", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()[0]["region"] == "Haryana"
+    assert changed.headers["ETag"] != etag
+
+
+def test_delete_changes_list_validators(api):
+    client = api(crops)
+    kept = client.post("/api/crops", json=CROP).json()
+    dropped = client.post("/api/crops", json={**CROP, "region": "Bihar"}).json()
+    etag = client.get("/api/crops").headers["ETag"]
+
+    client.delete(f"/api/crops/{dropped['id']}")
+    response = client.get("/api/crops", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [crop["id"] for crop in response.json()] == [kept["id"]]
+
+
+def test_cached_list_and_item_are_replayed_as_304(api):
+    client = api(crops)
+    created = client.post("/api/crops", json=CROP).json()
+    cache = content_cache("crops")
+
+    item = client.get(f"/api/crops/{created['id']}")
+    hits = cache.hits
+    replayed = client.get(f"/api/crops/{created['id']}", headers={"If-None-Match": item.headers["ETag"]})
+    assert replayed.status_code == 304
+    assert cache.hits == hits + 1
+
+
+def test_market_list_validators_follow_writes(api):
+    client = api(market)
+    created = client.post("/api/market", json=PRICE).json()
+    client.post("/api/market", json={**PRICE, "date": "2024-05-02"})
+
+    first = client.get("/api/market")
+    assert len(first.json()) == 2
+    etag = first.headers["ETag"]
+    assert client.get("/api/market", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(
+        "/api/market", headers={"If-Modified-Since": first.headers["Last-Modified"]}
+    ).status_code == 304
+
+    client.delete(f"/api/market/{created['id']}")
+    after_delete = client.get("/api/market", headers={"If-None-Match": etag})
+    assert after_delete.status_code == 200
+    assert len(after_delete.json()) == 1
+
+
+def test_missing_item_is_404(api):
+    assert api(crops).get("/api/crops/unknown").status_code == 404
@@ -0,0 +1,32 @@
+from pymongo import ASCENDING, IndexModel
+
+from conftest import run
+from services.indexes import INDEX_SPECS, ensure_indexes
+
+
+def test_creates_missing_indexes_once(db):
+    first = run(ensure_indexes(db))
+    assert "commodity_market_date_unique" in first["market_prices"]["created"]
+
+    second = run(ensure_indexes(db))
+    assert all(not report["created"] for report in second.values())
+    assert all(not report["errors"] for report in second.values())
+
+
+def test_reports_drift_instead_of_rebuilding(db):
+    run(db.crops.create_index([("region", ASCENDING)], name="region", unique=True))
+
+    report = run(ensure_indexes(db, {"crops": INDEX_SPECS["crops"]}))["crops"]
+
+    drifted = {drift["index"]: drift["differences"] for drift in report["drift"]}
+    assert drifted["region"]["unique"] == {"wanted": None, "found": True}
+    assert "region" not in report["created"]
+
+
+def test_lists_undeclared_indexes(db):
+    run(db.crops.create_index([("name.english", ASCENDING)], name="name_english"))
+
+    specs = {"crops": [IndexModel([("id", ASCENDING)], name="id_unique", unique=True)]}
+    report = run(ensure_indexes(db, specs))["crops"]
+
+    assert report["extra"] == ["name_english"]
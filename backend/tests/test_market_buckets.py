@@ -0,0 +1,71 @@
+from conftest import run
+from routes import market
+from services import market_buckets
+from services.indexes import INDEX_SPECS, ensure_indexes
+from services.market_buckets import BUCKETS_COLLECTION, bucket_query
+from services.market_ingest import MarketIngestor, json_rows
+from services.pagination import NEXT_CURSOR_HEADER
+
+
+def price(day, month, value, market_name="Azadpur"):
+    return {
+        "commodity": {"english": "Wheat", "hindi": "गेहूं"}, "market": market_name,
+        "price": value, "unit": "quintal", "date": f"2024-{month:02d}-{day:02d}",
+    }
+
+
+ROWS = [price(day, month, 2000 + day, name) for month in (4, 5) for day in (1, 15, 28) for name in ("Azadpur", "Karnal")]
+
+
+def ingest(db):
+    run(ensure_indexes(db, {"market_prices": INDEX_SPECS["market_prices"]}))
+    run(MarketIngestor(db).ingest(json_rows(ROWS)))
+
+
+def all_pages(client, params):
+    rows, after = [], None
+    while True:
+        response = client.get("/api/market", params={**params, **({"after": after} if after else {})})
+        rows += [(row["date"], row["market"], row["price"]) for row in response.json()]
+        after = response.headers.get(NEXT_CURSOR_HEADER)
+        if not after:
+            return rows
+
+
+def test_bucket_query_selects_months():
+    assert bucket_query({"market": "Azadpur", "date": {"$gte": "2024-04-10", "$lte": "2024-05-02"}}) == {
+        "market": "Azadpur", "month": {"$gte": "2024-04", "$lte": "2024-05"},
+    }
+
+
+def test_range_scans_from_buckets_match_the_observations(api, db, monkeypatch):
+    ingest(db)
+    client = api(market)
+    params = {"from": "2024-04-10", "to": "2024-05-20", "limit": 2}
+    expected = all_pages(client, params)
+
+    monkeypatch.setattr(market_buckets, "MARKET_STORAGE", "buckets")
+    run(market_buckets.backfill_buckets(db))
+    assert run(db[BUCKETS_COLLECTION].count_documents({})) == 4
+
+    assert all_pages(client, params) == expected
+    assert [row[0] for row in expected] == sorted((row[0] for row in expected), reverse=True)
+    assert len(expected) == 8
+
+
+def test_bucket_scans_may_spill_to_disk(api, db, monkeypatch):
+    ingest(db)
+    monkeypatch.setattr(market_buckets, "MARKET_STORAGE", "buckets")
+    run(market_buckets.backfill_buckets(db))
+    collection_type = type(db[BUCKETS_COLLECTION])
+    original = collection_type.aggregate
+    options = []
+
+    def recording(self, pipeline, *args, **kwargs):
+        options.append(kwargs)
+        return original(self, pipeline, *args, **kwargs)
+    monkeypatch.setattr(collection_type, "aggregate", recording)
+
+    response = api(market).get("/api/market", params={"from": "2024-04-01", "format": "ndjson"})
+    assert len(response.text.splitlines()) == 12
+    assert options == [{"allowDiskUse": True}]
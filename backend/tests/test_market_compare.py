@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from conftest import run
+from routes import market
+from services.market_compare import compare_markets, forward_fill
+
+
+def test_forward_fill_carries_last_price_but_not_before_the_first():
+    filled = forward_fill(__import__("numpy").array([[math.nan, 10, math.nan, 12]]))
+    assert [None if math.isnan(value) else value for value in filled[0]] == [None, 10, 10, 12]
+
+
+def test_percent_difference_against_local_mandi():
+    result = compare_markets(
+        ["A", "B", "A", "B"], ["2024-05-01", "2024-05-01", "2024-05-02", "2024-05-02"],
+        [100, 110, 100, 120], local="A", window=2,
+    )
+    assert result["markets"] == ["A", "B"]
+    assert result["latest"] == [100.0, 120.0]
+    assert result["pct_vs_local"] == [0.0, 20.0]
+    assert result["spread"]["latest"] == 20.0
+
+
+def test_zero_local_price_gives_nulls_not_infinities():
+    result = compare_markets(
+        ["A", "B", "A", "B"], ["2024-05-01", "2024-05-01", "2024-05-02", "2024-05-02"],
+        [100, 110, 0, 120], local="A", window=2, include_matrix=True,
+    )
+    assert result["pct_vs_local"] == [None, None]
+    assert result["mean_pct_vs_local"] == [0.0, 10.0]
+    assert result["volatility"][0] is None
+
+
+def test_unknown_local_market_is_an_error():
+    with pytest.raises(ValueError):
+        compare_markets(["A"], ["2024-05-01"], [100], local="Z")
+
+
+def test_compare_endpoint_with_a_zero_price(api, db):
+    run(db.market_prices.insert_many([
+        {"id": "1", "commodity": {"english": "Onion", "hindi": "प्याज"}, "market": "Lasalgaon",
+         "price": 0, "date": "2024-05-01"},
+        {"id": "2", "commodity": {"english": "Onion", "hindi": "प्याज"}, "market": "Azadpur",
+         "price": 1500, "date": "2024-05-01"},
+    ]))
+
+    response = api(market).get("/api/market/compare", params={
+        "commodity": "Onion", "local": "Lasalgaon", "from": "2024-04-01", "to": "2024-05-31", "matrix": True,
+    })
+    assert response.status_code == 200
+    assert response.json()["pct_vs_local"] == [None, None]
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import run
+from routes import market
+from services import market_export
+from services.market_export import COLUMNAR_MAGIC, decode_columnar
+from services.market_ingest import price_document
+from models.market import MarketPrice
+
+ROWS = [
+    ("w1", "2024-05-01", "Wheat", "गेहूं", "Azadpur", 2400.0, "+1.2%"),
+    ("w2", "2024-05-02", "Wheat", "गेहूं", "Azadpur", 2450.5, ""),
+    ("o1", "2024-05-02", "Onion", "प्याज", "Lasalgaon", 1800.0, "-3%"),
+    ("w3", "2024-05-03", "Wheat", "गेहूं", "Karnal", 2390.0, "+0.5%"),
+    ("o2", "2024-05-03", "Onion", "प्याज", "Lasalgaon", 1825.0, "+1.4%"),
+]
+
+
+def record(row):
+    price_id, day, english, hindi, market_name, price, change = row
+    return {
+        "id": price_id, "date": day, "commodity": {"english": english, "hindi": hindi},
+        "market": market_name, "price": price, "unit": "quintal", "change": change,
+    }
+
+
+EXPECTED = sorted((record(row) for row in ROWS), key=lambda r: (r["date"], r["id"]))
+
+
+@pytest.fixture
+def client(api, db, monkeypatch):
+    # Small batches so every format is written across several frames
+    monkeypatch.setattr(market_export, "EXPORT_BATCH_SIZE", 2)
+    run(db.market_prices.insert_many([price_document(MarketPrice(**record(row))) for row in ROWS]))
+    return api(market)
+
+
+def export(client, format, **params):
+    response = client.get("/api/market/export", params={"format": format, **params})
+    assert response.status_code == 200
+    return response
+
+
+def from_csv(text):
+    return [
+        {
+            "id": row["id"], "date": row["date"],
+            "commodity": {"english": row["commodity_english"], "hindi": row["commodity_hindi"]},
+            "market": row["market"], "price": float(row["price"]), "unit": row["unit"], "change": row["change"],
+        }
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def test_ndjson_export_round_trips(client):
+    lines = export(client, "ndjson").text.splitlines()
+    assert [json.loads(line) for line in lines] == EXPECTED
+
+
+def test_csv_export_round_trips(client):
+    assert from_csv(export(client, "csv").text) == EXPECTED
+
+
+def test_columnar_export_round_trips_with_ids_and_changes(client):
+    response = export(client, "columnar")
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert decode_columnar(response.content) == EXPECTED
+
+
+class BatchCursor:
+    """Cursor handing out at most `length` documents per to_list, like Motor's"""
+
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        batch, self.documents = self.documents[:length], self.documents[length:]
+        return batch
+
+
+def test_columnar_frames_list_only_new_dictionary_strings(monkeypatch):
+    monkeypatch.setattr(market_export, "EXPORT_BATCH_SIZE", 2)
+
+    async def collect():
+        return b"".join([chunk async for chunk in market_export.columnar_stream(BatchCursor(EXPECTED))])
+
+    data = run(collect())
+    headers, position = [], 4
+    while position < len(data):
+        length = int.from_bytes(data[position:position + 4], "little")
+        header = json.loads(data[position + 4:position + 4 + length])
+        headers.append(header)
+        position += 4 + length + sum(column["nbytes"] for column in header["columns"])
+
+    assert [header["rows"] for header in headers] == [2, 2, 1]
+    assert [header["dictionaries"]["market"] for header in headers] == [["Azadpur", "Lasalgaon"], [], ["Karnal"]]
+    assert decode_columnar(data) == EXPECTED
+
+
+def test_filtered_export_round_trips_in_every_format(client):
+    expected = [r for r in EXPECTED if r["commodity"]["english"] == "Onion"]
+    params = {"commodity": "onion"}
+    assert [json.loads(line) for line in export(client, "ndjson", **params).text.splitlines()] == expected
+    assert from_csv(export(client, "csv", **params).text) == expected
+    assert decode_columnar(export(client, "columnar", **params).content) == expected
+
+
+def test_empty_exports(client):
+    params = {"commodity": "saffron"}
+    assert export(client, "ndjson", **params).content == b""
+    assert from_csv(export(client, "csv", **params).text) == []
+    columnar = export(client, "columnar", **params).content
+    assert columnar == COLUMNAR_MAGIC
+    assert decode_columnar(columnar) == []
@@ -0,0 +1,103 @@
+import json
+
+from pymongo.errors import BulkWriteError
+
+from conftest import run
+from routes import market
+from services.indexes import INDEX_SPECS, ensure_indexes
+from services.market_ingest import MarketIngestor, json_rows
+
+
+def price(day, value=2400, market_name="Azadpur", commodity="Wheat"):
+    return {
+        "commodity": {"english": commodity, "hindi": "गेहूं"}, "market": market_name,
+        "price": value, "unit": "quintal", "date": f"2024-05-{day:02d}",
+    }
+
+
+def market_indexes(db):
+    run(ensure_indexes(db, {"market_prices": INDEX_SPECS["market_prices"]}))
+
+
+def test_bulk_json_inserts_then_updates_on_the_natural_key(api, db):
+    market_indexes(db)
+    client = api(market)
+
+    first = client.post("/api/market/bulk", json=[price(1), price(2), {"market": "x"}]).json()
+    assert (first["received"], first["inserted"], first["updated"], first["failed"]) == (3, 2, 0, 1)
+    assert first["errors"][0]["row"] == 3
+    assert first["unchanged"] == 0
+
+    second = client.post("/api/market/bulk", json=[price(1, 2500), price(2)]).json()
+    assert (second["inserted"], second["updated"]) == (0, 2)
+    assert run(db.market_prices.count_documents({})) == 2
+    assert run(db.market_prices.find_one({"date": "2024-05-01"}))["price"] == 2500
+
+
+def test_rows_repeating_a_stored_observation_are_counted(db):
+    market_indexes(db)
+    # The same observation twice in one chunk: the second write matches but changes nothing
+    report = run(MarketIngestor(db).ingest(json_rows([price(1), price(2), price(1)])))
+    assert (report.received, report.inserted, report.updated, report.unchanged) == (3, 2, 0, 1)
+    assert report.inserted + report.updated + report.unchanged + report.failed == report.received
+
+
+def test_bulk_ndjson_reports_bad_lines(api, db):
+    market_indexes(db)
+    body = "\n".join([json.dumps(price(1)), "{not json", json.dumps(price(3))])
+
+    report = api(market).post(
+        "/api/market/bulk", content=body, headers={"content-type": "application/x-ndjson"}
+    ).json()
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["row"] == 2
+
+
+def test_single_create_updates_an_existing_observation(api, db):
+    market_indexes(db)
+    client = api(market)
+
+    created = client.post("/api/market", json=price(1)).json()
+    again = client.post("/api/market", json=price(1, 2600)).json()
+    assert again["id"] == created["id"]
+    assert again["price"] == 2600
+    assert run(db.market_prices.count_documents({})) == 1
+
+
+def test_update_onto_an_existing_key_is_a_conflict(api, db):
+    market_indexes(db)
+    client = api(market)
+    client.post("/api/market", json=price(1))
+    second = client.post("/api/market", json=price(2)).json()
+
+    response = client.put(f"/api/market/{second['id']}", json={"date": "2024-05-01"})
+    assert response.status_code == 409
+    assert client.put("/api/market/unknown", json={"price": 1}).status_code == 404
+
+
+def test_duplicate_key_from_a_concurrent_insert_is_retried_as_update(db, monkeypatch):
+    market_indexes(db)
+    collection_type = type(db.market_prices)
+    real_bulk_write = collection_type.bulk_write
+    calls = []
+
+    async def racing_bulk_write(self, operations, ordered=True):
+        if self.name != "market_prices":
+            return await real_bulk_write(self, operations, ordered=ordered)
+        calls.append(len(operations))
+        if len(calls) > 1:
+            return await real_bulk_write(self, operations, ordered=ordered)
+        # Another ingest inserts the first row's key just before this write lands
+        await self.insert_one({**price(1, 1000), "id": "other", "created_at": None})
+        result = await real_bulk_write(self, operations[1:], ordered=ordered)
+        details = dict(result.bulk_api_result)
+        details["writeErrors"] = [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]
+        raise BulkWriteError(details)
+
+    monkeypatch.setattr(collection_type, "bulk_write", racing_bulk_write)
+    report = run(MarketIngestor(db).ingest(json_rows([price(1), price(2)])))
+
+    assert calls == [2, 1]
+    assert (report.inserted, report.updated, report.failed) == (1, 1, 0)
+    stored = run(db.market_prices.find({"date": "2024-05-01"}).to_list(None))
+    assert [(document["id"], document["price"]) for document in stored] == [("other", 2400)]
@@ -0,0 +1,78 @@
+from conftest import run
+from routes import market
+from services import market_buckets
+from services.indexes import INDEX_SPECS, ensure_indexes
+from services.latest_prices import LATEST_COLLECTION
+from services.market_buckets import BUCKETS_COLLECTION
+from services.market_ingest import MarketIngestor, json_rows
+from services.rollups import ROLLUPS_COLLECTION
+
+
+def price(day, value, market_name="Azadpur", commodity="Wheat"):
+    return {
+        "commodity": {"english": commodity, "hindi": commodity}, "market": market_name,
+        "price": value, "unit": "quintal", "date": f"2024-05-{day:02d}",
+    }
+
+
+def ingest(db, rows, chunk_size=1000):
+    run(ensure_indexes(db, {"market_prices": INDEX_SPECS["market_prices"]}))
+    return run(MarketIngestor(db, chunk_size).ingest(json_rows(rows)))
+
+
+def rollup(db, period, start, market_name="Azadpur"):
+    return run(db[ROLLUPS_COLLECTION].find_one(
+        {"period": period, "market": market_name, "start": start}, {"_id": 0}
+    ))
+
+
+def test_ingest_maintains_rollups_and_latest(db):
+    ingest(db, [price(6, 2000), price(7, 2200), price(8, 2100), price(8, 1500, "Karnal")])
+
+    week = rollup(db, "week", "2024-05-06")
+    assert (week["first"], week["last"], week["min"], week["max"], week["count"]) == (2000, 2100, 2000, 2200, 3)
+    assert rollup(db, "month", "2024-05-01")["mean"] == 2100
+
+    latest = run(db[LATEST_COLLECTION].find_one({"market": "Azadpur"}))
+    assert (latest["price"], latest["previous_price"], latest["change"]) == (2100, 2200, "-100")
+    karnal = run(db[LATEST_COLLECTION].find_one({"market": "Karnal"}))
+    assert karnal["previous_price"] is None
+
+
+def test_update_and_delete_keep_views_exact(api, db):
+    ingest(db, [price(6, 2000), price(7, 2200)])
+    client = api(market)
+    newest = run(db.market_prices.find_one({"date": "2024-05-07"}))
+
+    client.put(f"/api/market/{newest['id']}", json={"price": 2600})
+    assert rollup(db, "day", "2024-05-07")["last"] == 2600
+    assert run(db[LATEST_COLLECTION].find_one({}))["change"] == "+600"
+
+    client.delete(f"/api/market/{newest['id']}")
+    assert rollup(db, "day", "2024-05-07") is None
+    assert rollup(db, "week", "2024-05-06")["count"] == 1
+    latest = run(db[LATEST_COLLECTION].find_one({}))
+    assert (latest["price"], latest["previous_price"]) == (2000, None)
+
+
+def test_view_refresh_cost_does_not_grow_with_touched_pairs(db, monkeypatch):
+    collection_type = type(db.market_prices)
+    reads = []
+    for method in ("find", "aggregate"):
+        original = getattr(collection_type, method)
+
+        def counting(self, *args, _original=original, _method=method, **kwargs):
+            if self.name == "market_prices":
+                reads.append(_method)
+            return _original(self, *args, **kwargs)
+        monkeypatch.setattr(collection_type, method, counting)
+    monkeypatch.setattr(market_buckets, "MARKET_STORAGE", "buckets")
+
+    rows = [price(day, 2000 + day, f"Mandi {number}") for number in range(50) for day in (1, 2)]
+    report = ingest(db, rows, chunk_size=50)
+
+    assert report.inserted == 100
+    # Per chunk: one read each for buckets and rollups, two for latest
+    assert len(reads) == 2 * 4
+    assert run(db[LATEST_COLLECTION].count_documents({})) == 50
+    assert run(db[BUCKETS_COLLECTION].count_documents({})) == 50
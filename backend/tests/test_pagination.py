@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import run
+from routes import storage
+from services.pagination import (
+    DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_filter
+)
+
+
+def guides(count):
+    return [
+        {"id": f"guide-{number:04d}", "item": {"english": f"Item {number}", "hindi": "वस्तु"}, "tips": []}
+        for number in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(["2024-05-01", "abc"])) == ["2024-05-01", "abc"]
+    with pytest.raises(HTTPException):
+        decode_cursor("not a cursor")
+
+
+def test_keyset_filter_flips_descending_keys():
+    assert keyset_filter([("date", -1), ("id", -1)], ["2024-05-01", "x"]) == {"$or": [
+        {"date": {"$lt": "2024-05-01"}},
+        {"date": "2024-05-01", "id": {"$lt": "x"}},
+    ]}
+
+
+def test_default_page_keeps_previous_row_count(api, db):
+    run(db.storage_guides.insert_many(guides(DEFAULT_PAGE_SIZE + 5)))
+    client = api(storage)
+
+    first = client.get("/api/storage")
+    assert len(first.json()) == DEFAULT_PAGE_SIZE == 1000
+    assert NEXT_CURSOR_HEADER in first.headers
+
+    rest = client.get("/api/storage", params={"after": first.headers[NEXT_CURSOR_HEADER]})
+    assert [g["id"] for g in rest.json()] == [f"guide-{n:04d}" for n in range(1000, 1005)]
+    assert NEXT_CURSOR_HEADER not in rest.headers
+
+
+def test_pages_with_explicit_limit_cover_every_row_once(api, db):
+    run(db.storage_guides.insert_many(guides(7)))
+    client = api(storage)
+
+    seen, after = [], None
+    while True:
+        page = client.get("/api/storage", params={"limit": 3, **({"after": after} if after else {})})
+        seen += [g["id"] for g in page.json()]
+        after = page.headers.get(NEXT_CURSOR_HEADER)
+        if after is None:
+            break
+    assert seen == [f"guide-{n:04d}" for n in range(7)]
+
+
+def test_ndjson_stream(api, db):
+    run(db.storage_guides.insert_many(guides(3)))
+
+    response = api(storage).get("/api/storage", params={"format": "ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == ["guide-0000", "guide-0001", "guide-0002"]
@@ -0,0 +1,83 @@
+from conftest import run
+from routes import market
+from services.indexes import INDEX_SPECS, ensure_indexes
+from services.price_importer import (
+    CHECKPOINTS_COLLECTION, CsvPriceImport, file_import_id, read_lines, resolve_columns
+)
+
+HEADER = "State,District,Market,Commodity,Variety,Arrival_Date,Modal_x0020_Price\n"
+
+
+def csv_file(rows):
+    return (HEADER + "".join(
+        f"Delhi,Delhi,Azadpur,{commodity},Other,{day:02d}/05/2024,{price}\n" for commodity, day, price in rows
+    )).encode()
+
+
+def reader(data: bytes):
+    position = 0
+
+    async def read(size):
+        nonlocal position
+        chunk = data[position:position + size]
+        position += len(chunk)
+        return chunk
+    return read
+
+
+def test_resolves_agmarknet_headers():
+    columns = resolve_columns(HEADER.strip().split(","))
+    assert columns["price"] == 6 and columns["date"] == 5 and columns["market"] == 2
+
+
+def test_uploads_with_the_same_name_but_different_content_both_import(api, db):
+    run(ensure_indexes(db, {"market_prices": INDEX_SPECS["market_prices"]}))
+    client = api(market)
+
+    first = client.post("/api/market/import", files={"file": ("prices.csv", csv_file([("Wheat", 1, 2400)]))})
+    second = client.post("/api/market/import", files={"file": ("prices.csv", csv_file([("Onion", 1, 1800)]))})
+    assert first.json()["status"] == second.json()["status"] == "completed"
+    assert first.json()["import_id"] != second.json()["import_id"]
+    assert second.json()["inserted"] == 1
+    assert run(db.market_prices.count_documents({})) == 2
+
+    repeated = client.post("/api/market/import", files={"file": ("prices.csv", csv_file([("Onion", 1, 1800)]))})
+    assert repeated.json()["status"] == "already completed"
+
+
+def test_interrupted_import_resumes_after_the_last_committed_chunk(db):
+    data = csv_file([("Wheat", day, 2000 + day) for day in range(1, 8)])
+
+    class Interrupted(Exception):
+        pass
+
+    async def failing_lines():
+        async for line in read_lines(reader(data), chunk_bytes=16):
+            if b"06/05/2024" in line:
+                raise Interrupted()
+            yield line
+
+    importer = CsvPriceImport(db, "resume-test", chunk_size=2)
+    try:
+        run(importer.run(failing_lines()))
+    except Interrupted:
+        pass
+    checkpoint = run(db[CHECKPOINTS_COLLECTION].find_one({"_id": "resume-test"}))
+    assert checkpoint["rows"] == 4
+
+    result = run(CsvPriceImport(db, "resume-test", chunk_size=2).run(read_lines(reader(data))))
+    assert result["resumed_from_row"] == 4
+    assert result["inserted"] == 3
+    assert run(db.market_prices.count_documents({})) == 7
+
+
+def test_files_on_disk_with_the_same_name_and_size_get_different_import_ids(tmp_path):
+    first, second = tmp_path / "a" / "prices.csv", tmp_path / "b" / "prices.csv"
+    for path, price in ((first, b"2400"), (second, b"2500")):
+        path.parent.mkdir()
+        path.write_bytes(b"Commodity,Market,Modal Price\nWheat,Azadpur," + price + b"\n")
+
+    first_id, second_id = run(file_import_id(str(first))), run(file_import_id(str(second)))
+    assert first_id.startswith("prices.csv:") and second_id.startswith("prices.csv:")
+    assert first_id != second_id
+    assert run(file_import_id(str(first))) == first_id
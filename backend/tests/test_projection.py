@@ -0,0 +1,99 @@
+from models.crops import Crop
+from routes import crops, storage
+from services.pagination import ID_SORT
+from services.projection import partial_model, projection_for
+
+
+def text(english, hindi):
+    return {"english": english, "hindi": hindi}
+
+
+WHEAT = {
+    "crop": text("Wheat", "गेहूं"),
+    "season": text("Rabi", "रबी"),
+    "soil_type": text("Loamy", "दोमट"),
+    "sowing_time": text("November", "नवंबर"),
+    "harvest_time": text("April", "अप्रैल"),
+    "tips": text("Irrigate at crown root stage", "शिखर जड़ अवस्था पर सिंचाई करें"),
+    "region": "Punjab",
+}
+ONION = {"item": text("Onion", "प्याज"), "tips": [text("Cure before storing", "भंडारण से पहले सुखाएं"),
+                                                  text("Keep ventilated", "हवादार रखें")]}
+
+
+def test_fields_limit_list_and_item_responses(api):
+    client = api(crops)
+    crop_id = client.post("/api/crops", json=WHEAT).json()["id"]
+
+    listed = client.get("/api/crops", params={"fields": "crop,region"}).json()
+    assert listed == [{"id": crop_id, "crop": WHEAT["crop"], "region": "Punjab"}]
+
+    item = client.get(f"/api/crops/{crop_id}", params={"fields": " season , season"}).json()
+    assert item == {"id": crop_id, "season": WHEAT["season"]}
+
+    # Without fields the full model comes back
+    assert set(client.get(f"/api/crops/{crop_id}").json()) == set(Crop.model_fields)
+
+
+def test_unknown_fields_are_rejected(api):
+    client = api(crops)
+    crop_id = client.post("/api/crops", json=WHEAT).json()["id"]
+
+    response = client.get("/api/crops", params={"fields": "crop,yield,price"})
+    assert response.status_code == 400
+    assert "yield, price" in response.json()["detail"]
+    assert client.get(f"/api/crops/{crop_id}", params={"fields": "search_terms"}).status_code == 400
+    assert client.get("/api/crops", params={"lang": "tamil"}).status_code == 400
+
+
+def test_lang_flattens_bilingual_text_and_lists(api):
+    client = api(storage)
+    guide_id = client.post("/api/storage", json=ONION).json()["id"]
+
+    hindi = client.get("/api/storage", params={"lang": "hindi", "fields": "item,tips"}).json()
+    assert hindi == [{"id": guide_id, "item": "प्याज", "tips": ["भंडारण से पहले सुखाएं", "हवादार रखें"]}]
+
+    english = client.get(f"/api/storage/{guide_id}", params={"lang": "english"}).json()
+    assert english["item"] == "Onion"
+    assert english["tips"] == ["Cure before storing", "Keep ventilated"]
+    assert "created_at" in english
+
+
+def test_lang_auto_follows_accept_language(api):
+    client = api(crops)
+    crop_id = client.post("/api/crops", json=WHEAT).json()["id"]
+
+    def crop_name(accept_language):
+        return client.get(
+            f"/api/crops/{crop_id}", params={"lang": "auto", "fields": "crop"},
+            headers={"Accept-Language": accept_language},
+        ).json()["crop"]
+
+    assert crop_name("hi-IN,en;q=0.8") == "गेहूं"
+    assert crop_name("en-GB, hi;q=0.5") == "Wheat"
+    # No stored language in the header keeps both
+    assert crop_name("fr") == WHEAT["crop"]
+
+
+def test_cached_responses_are_kept_apart_per_fieldset_and_language(api):
+    client = api(crops)
+    crop_id = client.post("/api/crops", json=WHEAT).json()["id"]
+    url = f"/api/crops/{crop_id}"
+
+    assert client.get(url, params={"fields": "crop"}).json() == {"id": crop_id, "crop": WHEAT["crop"]}
+    assert client.get(url, params={"fields": "crop", "lang": "hindi"}).json() == {"id": crop_id, "crop": "गेहूं"}
+    assert client.get(url, params={"fields": "region"}).json() == {"id": crop_id, "region": "Punjab"}
+
+
+def test_projection_reads_only_the_selected_fields_and_language():
+    assert projection_for(Crop, None) is None
+    assert projection_for(Crop, ("id", "crop", "region"), ID_SORT, "hindi") == {
+        "_id": 0, "id": 1, "crop.hindi": 1, "region": 1,
+    }
+    # Sort keys stay readable for the next cursor
+    assert projection_for(Crop, ("id", "crop"), [("price", -1)]) == {"_id": 0, "id": 1, "crop": 1, "price": 1}
+
+    assert partial_model(Crop, None) is Crop
+    assert partial_model(Crop, ("id", "crop"), "english") is partial_model(Crop, ("id", "crop"), "english")
+    view = partial_model(Crop, ("id", "crop"), "english")
+    assert view(id="c1", crop=WHEAT["crop"]).model_dump() == {"id": "c1", "crop": "Wheat"}
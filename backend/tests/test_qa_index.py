@@ -0,0 +1,39 @@
+from services.qa_index import QAIndex
+
+PAIRS = [
+    ("When should I sow wheat?", "Sow wheat in November after the paddy harvest.", "sowing"),
+    ("How do I control rust on wheat?", "Spray a fungicide when rust pustules appear.", "disease"),
+    ("Which fertilizer suits paddy?", "Apply urea in three split doses.", "fertilizer"),
+    ("How much water does sugarcane need?", "Irrigate every ten days in summer.", "irrigation"),
+]
+
+QUERIES = [
+    "wheat rust",
+    "wheat rust tractor loan subsidy",
+    "paddy fertilizer urea",
+    "sugarcane water pump repair",
+    "rust",
+]
+
+
+def build():
+    index = QAIndex()
+    for number, (question, answer, category) in enumerate(PAIRS):
+        index.add({"id": f"q{number}", "question": question, "answer": answer, "category": category})
+    return index
+
+
+def test_quick_confidence_never_exceeds_full_confidence():
+    index = build()
+    for query in QUERIES:
+        full = {match.qa["id"]: match.confidence for match in index.search(query, limit=len(PAIRS))}
+        for match in index.quick_search(query, limit=len(PAIRS)):
+            assert match.confidence <= full[match.qa["id"]] + 1e-9, query
+
+
+def test_unknown_query_terms_lower_quick_confidence():
+    index = build()
+    focused = index.quick_search("wheat rust")[0]
+    diluted = index.quick_search("wheat rust tractor loan subsidy")[0]
+    assert focused.qa["id"] == diluted.qa["id"] == "q1"
+    assert diluted.confidence < focused.confidence
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+
+from conftest import run
+from services.qa_index import QAIndex
+from services.scoring_pool import ScoringPool
+
+WORDS = [f"term{number}" for number in range(150)]
+
+
+def large_index(size=4000):
+    rng = random.Random(7)
+    index = QAIndex()
+    for number in range(size):
+        index.add({
+            "id": str(number),
+            "question": " ".join(rng.sample(WORDS, 8)),
+            "answer": " ".join(rng.sample(WORDS, 12)),
+            "category": "general",
+        })
+    return index
+
+
+async def longest_stall(job):
+    """Longest gap between 1 ms ticks of a coroutine sharing the loop with `job`"""
+    gaps = []
+    finished = asyncio.Event()
+
+    async def tick():
+        last = time.perf_counter()
+        while not finished.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0.005)
+    try:
+        await job()
+    finally:
+        finished.set()
+        await ticker
+    return max(gaps)
+
+
+def test_pool_scoring_keeps_the_event_loop_responsive():
+    index = large_index()
+    rng = random.Random(11)
+    prepared = [index.prepare(" ".join(rng.sample(WORDS, 6))) for _ in range(1500)]
+    pool = ScoringPool(workers=2, deadline=30)
+
+    async def on_loop():
+        index.score_many(prepared)
+
+    async def on_pool():
+        rankings, degraded = await pool.run(index.score_many, index.score_many, prepared)
+        assert not degraded and len(rankings) == len(prepared)
+
+    async def scenario():
+        try:
+            return await longest_stall(on_loop), await longest_stall(on_pool)
+        finally:
+            pool.shutdown()
+
+    blocked, offloaded = run(scenario())
+    # Scoring on the loop stalls it for the whole batch; on the pool the loop keeps ticking
+    assert blocked > 0.02
+    assert offloaded < blocked / 3
+
+
+def test_prepared_scoring_matches_search():
+    index = large_index(500)
+    query = "term1 term2 term3"
+    direct = [(match.qa["id"], match.score) for match in index.search(query)]
+    ranking = index.score(index.prepare(query))
+    assert [(match.qa["id"], match.score) for match in index.matches(ranking)] == direct
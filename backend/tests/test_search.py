@@ -0,0 +1,87 @@
+from conftest import run
+from routes import storage
+from services.search import (
+    SEARCH_TERMS_FIELD, SEARCH_TERMS_VERSION, SEARCH_VERSION_FIELD, backfill_search_terms,
+    any_term_clause, match_clause, tokenize, with_search_terms
+)
+from services.data_seeder import INITIAL_STORAGE_GUIDES, seed_documents
+
+
+def guide(english, hindi):
+    return with_search_terms("storage_guides", {
+        "id": english.lower(),
+        "item": {"english": english, "hindi": hindi},
+        "tips": [],
+    })
+
+
+def test_hindi_spelling_variants_share_terms():
+    assert tokenize("हिन्दी") == tokenize("हिंदी")
+    assert tokenize("गेहूँ") == tokenize("गेहूं")
+
+
+def test_hindi_verb_inflections_share_a_stem():
+    assert tokenize("बोएं") == tokenize("बोना") == tokenize("बोने") == tokenize("बोइए")
+
+
+def test_english_inflections_share_a_stem():
+    assert tokenize("seeds sowing") == tokenize("seed sowed")
+
+
+def test_stopword_only_query_does_not_filter():
+    assert match_clause(["item"], "what is the") == {}
+    assert match_clause(["item"], "क्या है") == {}
+    assert match_clause(["item"], "wheat") == {SEARCH_TERMS_FIELD: {"$all": ["item:wheat"]}}
+    assert any_term_clause(["item"], "the") == {}
+
+
+def test_multi_word_filter_needs_every_term(api, db):
+    run(db.storage_guides.insert_many([
+        guide("Onion", "प्याज"), guide("Red Chilli", "लाल मिर्च"), guide("Red Onion", "लाल प्याज"),
+    ]))
+    client = api(storage)
+
+    assert [g["id"] for g in client.get("/api/storage", params={"item": "red onion"}).json()] == ["red onion"]
+    assert [g["id"] for g in client.get("/api/storage", params={"item": "लाल प्याज"}).json()] == ["red onion"]
+    assert len(client.get("/api/storage", params={"item": "onion"}).json()) == 2
+
+
+def test_multi_field_filter_needs_every_term_in_some_field():
+    clause = match_clause(["name", "description"], "kisan loan")
+    assert clause == {"$and": [
+        {SEARCH_TERMS_FIELD: {"$in": ["name:kisan", "description:kisan"]}},
+        {SEARCH_TERMS_FIELD: {"$in": ["name:loan", "description:loan"]}},
+    ]}
+
+
+def test_seeded_documents_are_searchable(api, db):
+    run(db.storage_guides.insert_many(seed_documents("storage_guides", INITIAL_STORAGE_GUIDES)))
+    assert all(SEARCH_TERMS_FIELD not in document for document in INITIAL_STORAGE_GUIDES)
+
+    english = INITIAL_STORAGE_GUIDES[0]["item"]["english"]
+    found = api(storage).get("/api/storage", params={"item": english}).json()
+    assert INITIAL_STORAGE_GUIDES[0]["id"] in [g["id"] for g in found]
+
+
+def test_storage_search_by_term_and_by_stopwords(api, db):
+    run(db.storage_guides.insert_many([guide("Wheat", "गेहूं"), guide("Onion", "प्याज")]))
+    client = api(storage)
+
+    matched = client.get("/api/storage", params={"item": "गेहूँ"}).json()
+    assert [g["id"] for g in matched] == ["wheat"]
+
+    unfiltered = client.get("/api/storage", params={"item": "the"}).json()
+    assert [g["id"] for g in unfiltered] == ["onion", "wheat"]
+
+
+def test_backfill_recomputes_terms_from_older_tokenizer(db):
+    run(db.storage_guides.insert_one({
+        "id": "seed", "item": {"english": "Seeds", "hindi": "बीज"}, "tips": [],
+        SEARCH_TERMS_FIELD: ["item:stale"],
+    }))
+
+    assert run(backfill_search_terms(db))["storage_guides"] == 1
+    stored = run(db.storage_guides.find_one({"id": "seed"}))
+    assert "item:seed" in stored[SEARCH_TERMS_FIELD]
+    assert stored[SEARCH_VERSION_FIELD] == SEARCH_TERMS_VERSION
+    assert run(backfill_search_terms(db))["storage_guides"] == 0
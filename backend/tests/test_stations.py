@@ -0,0 +1,87 @@
+import math
+import random
+
+import pytest
+
+from services.stations import DEFAULT_STATIONS, EARTH_RADIUS_KM, StationIndex
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def brute_force(stations, lat, lon):
+    return min(haversine_km(lat, lon, station["lat"], station["lon"]) for station in stations)
+
+
+def station(name, lat, lon):
+    return {"name": name, "lat": lat, "lon": lon}
+
+
+def index_of(stations, leaf_size=4):
+    index = StationIndex(leaf_size=leaf_size)
+    index.build(stations)
+    return index
+
+
+@pytest.mark.parametrize("count", [1, 2, 17, 500])
+def test_nearest_matches_a_brute_force_scan(count):
+    rng = random.Random(count)
+    stations = [station(f"s{number}", rng.uniform(-90, 90), rng.uniform(-180, 180)) for number in range(count)]
+    index = index_of(stations)
+
+    for _ in range(300):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        found, distance = index.nearest(lat, lon)
+        expected = brute_force(stations, lat, lon)
+        assert distance == pytest.approx(expected, abs=1e-6)
+        assert haversine_km(lat, lon, found["lat"], found["lon"]) == pytest.approx(expected, abs=1e-6)
+
+
+def test_nearest_matches_a_brute_force_scan_over_the_built_in_stations():
+    rng = random.Random(7)
+    index = index_of(DEFAULT_STATIONS)
+    for _ in range(300):
+        lat, lon = rng.uniform(6, 36), rng.uniform(68, 98)
+        assert index.nearest(lat, lon)[1] == pytest.approx(brute_force(DEFAULT_STATIONS, lat, lon), abs=1e-6)
+
+
+def test_single_station_and_empty_index():
+    assert StationIndex().nearest(28.6, 77.2) is None
+    index = index_of([station("Delhi", 28.6139, 77.2090)])
+    found, distance = index.nearest(-33.9, 151.2)
+    assert found["name"] == "Delhi"
+    assert distance == pytest.approx(haversine_km(-33.9, 151.2, 28.6139, 77.2090), abs=1e-6)
+    assert index.nearest(28.6139, 77.2090)[1] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_stations_sharing_coordinates():
+    # More duplicates than fit in a leaf, so the tree has to split points it cannot separate
+    stations = [station(f"Karnal {number}", 29.6857, 76.9905) for number in range(40)]
+    stations.append(station("Hisar", 29.1492, 75.7217))
+    index = index_of(stations)
+
+    found, distance = index.nearest(29.6857, 76.9905)
+    assert found["name"].startswith("Karnal")
+    assert distance == pytest.approx(0.0, abs=1e-6)
+    assert index.nearest(29.2, 75.7)[0]["name"] == "Hisar"
+
+
+def test_points_either_side_of_the_antimeridian():
+    stations = [
+        station("East", -17.0, 179.95),
+        station("West", -17.0, -179.8),
+        station("Far", -17.0, 170.0),
+    ]
+    index = index_of(stations, leaf_size=1)
+
+    # Longitudes wrap: the closest station can sit on the other side of ±180
+    assert index.nearest(-17.0, -179.99)[0]["name"] == "East"
+    assert index.nearest(-17.0, 179.99)[0]["name"] == "East"
+    assert index.nearest(-17.0, -179.85)[0]["name"] == "West"
+    found, distance = index.nearest(-17.0, 180.0)
+    assert found["name"] == "East"
+    assert distance == pytest.approx(haversine_km(-17.0, 180.0, -17.0, 179.95), abs=1e-6)
+    assert index.nearest(-17.0, -180.0)[1] == pytest.approx(distance, abs=1e-6)
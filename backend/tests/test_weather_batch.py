@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import run
+from routes import weather
+from services.stations import DEFAULT_STATIONS, StationIndex
+from services.weather_cache import WeatherCache
+from services.weather_client import WeatherUnavailable
+from services.weather_prefetch import WeatherPrefetcher
+
+@pytest.fixture
+def client(api, db, monkeypatch):
+    """Weather routes over a stub upstream that fails for the stations in client.failing"""
+    stations = StationIndex()
+    stations.build(DEFAULT_STATIONS)
+    fetches = []
+    failing = {"Pune"}
+
+    async def fetch(location):
+        fetches.append(location)
+        if location in failing:
+            raise WeatherUnavailable("upstream answered 502")
+        return {"current": {"temperature": 30, "place": location}, "forecast": []}
+
+    cache = WeatherCache(db)
+    monkeypatch.setattr(weather, "station_index", stations)
+    monkeypatch.setattr(weather, "fetch_weather", fetch)
+    monkeypatch.setattr(weather, "weather_cache", cache)
+    monkeypatch.setattr(weather, "weather_prefetcher", WeatherPrefetcher(cache, fetch, enabled=False))
+    test_client = api(weather)
+    test_client.fetches = fetches
+    test_client.failing = failing
+    return test_client
+
+
+def by_location(body):
+    return {result["location"]: result for result in body["results"]}
+
+
+def test_batch_reports_each_city_on_its_own(client):
+    response = client.get("/api/weather/batch", params={"locations": "Delhi, pune,Atlantis,दिल्ली,Agra"})
+    assert response.status_code == 200
+    body = response.json()
+    results = by_location(body)
+
+    # दिल्ली and Delhi are the same station and are answered once
+    assert [result["location"] for result in body["results"]] == ["Delhi", "Pune", "Atlantis", "Agra"]
+    assert (body["count"], body["failed"]) == (4, 2)
+    assert results["Delhi"]["status"] == "ok" and results["Delhi"]["current"]["place"] == "Delhi"
+    assert results["Agra"]["status"] == "ok"
+    assert results["Pune"] == {
+        "location": "Pune", "status": "error", "error": "Weather unavailable: upstream answered 502",
+    }
+    assert results["Atlantis"]["status"] == "error" and "Unknown location" in results["Atlantis"]["error"]
+    assert sorted(client.fetches) == ["Agra", "Delhi", "Pune"]
+
+
+def test_batch_serves_the_last_known_copy_when_upstream_fails(client, db):
+    client.failing.clear()
+    assert by_location(client.get("/api/weather/batch", params={"locations": "Pune"}).json())["Pune"]["status"] == "ok"
+
+    # The entry expires everywhere and upstream fails again: the stale copy is still served
+    weather.weather_cache.peek("Pune").expires_at = 0
+    run(db.weather_cache.delete_many({}))
+    client.failing.add("Pune")
+    body = client.get("/api/weather/batch", params={"locations": "Pune"}).json()
+    assert body["failed"] == 0
+    assert by_location(body)["Pune"]["status"] == "stale"
+    assert by_location(body)["Pune"]["current"]["place"] == "Pune"
+    assert client.fetches == ["Pune", "Pune"]
+
+
+def test_fresh_entries_are_not_reloaded(client):
+    client.get("/api/weather/batch", params={"locations": "Delhi,Agra"})
+    client.post("/api/weather/batch", json={"locations": ["Delhi", "Agra", "Jaipur"]})
+    assert sorted(client.fetches) == ["Agra", "Delhi", "Jaipur"]
+
+
+def test_batch_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(weather, "MAX_WEATHER_BATCH", 3)
+    names = [station["name"] for station in DEFAULT_STATIONS]
+
+    assert client.get("/api/weather/batch", params={"locations": ",".join(names[:3])}).status_code == 200
+    too_many = client.post("/api/weather/batch", json={"locations": names[:4]})
+    assert too_many.status_code == 413
+    assert "At most 3" in too_many.json()["detail"]
+    # Repeats of one station count once
+    assert client.post("/api/weather/batch", json={"locations": ["Delhi"] * 10}).status_code == 200
+
+
+def test_empty_batch_is_rejected(client):
+    assert client.get("/api/weather/batch", params={"locations": " , ,"}).status_code == 400
+    assert client.post("/api/weather/batch", json={"locations": []}).status_code == 400
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from conftest import run
+from services import weather_cache
+from services.weather_cache import WeatherCache
+
+REFRESH = 600
+GRACE = 300
+
+
+class Clock:
+    def __init__(self, now=REFRESH * 1000 + 10):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(weather_cache.time, "time", clock)
+    return clock
+
+
+class Upstream:
+    """Fetcher counting calls; `gate` holds every call until it is set"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self, location):
+        self.calls.append(location)
+        await self.gate.wait()
+        return {"location": location, "call": len(self.calls)}
+
+
+def test_concurrent_misses_make_one_upstream_call(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+    upstream = Upstream()
+
+    async def scenario():
+        upstream.gate.clear()
+        waiting = [asyncio.create_task(cache.get(name, upstream)) for name in ["Delhi", "delhi", " DELHI "] * 4]
+        await asyncio.sleep(0)
+        upstream.gate.set()
+        return await asyncio.gather(*waiting)
+
+    entries = run(scenario())
+    assert upstream.calls == ["Delhi"]
+    assert {entry.data["call"] for entry in entries} == {1}
+    assert cache.stats()["upstream_fetches"] == 1
+    assert cache.stats()["coalesced"] == 11
+
+
+def test_a_caller_going_away_does_not_cancel_the_shared_load(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+    upstream = Upstream()
+
+    async def scenario():
+        upstream.gate.clear()
+        impatient = asyncio.create_task(cache.get("Pune", upstream))
+        patient = asyncio.create_task(cache.get("Pune", upstream))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        upstream.gate.set()
+        return await patient
+
+    assert run(scenario()).data["call"] == 1
+    assert upstream.calls == ["Pune"]
+
+
+def test_second_worker_reads_the_mongo_tier(db, clock):
+    upstream = Upstream()
+    first = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+    second = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+
+    run(first.get("Delhi", upstream))
+    entry = run(second.get("Delhi", upstream))
+    assert entry.source == "mongo"
+    assert upstream.calls == ["Delhi"]
+
+    # Both then answer from memory until the window ends
+    run(second.get("Delhi", upstream))
+    assert second.stats()["memory_hits"] == 1
+    assert upstream.calls == ["Delhi"]
+
+
+def test_stale_entry_within_grace_is_served_while_it_refreshes(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+    upstream = Upstream()
+    first = run(cache.get("Delhi", upstream))
+
+    # Just past the window boundary, inside the grace period
+    clock.now = first.expires_at + 5
+
+    async def scenario():
+        upstream.gate.clear()
+        served = await cache.get("Delhi", upstream)
+        again = await cache.get("Delhi", upstream)
+        # Let the background load reach upstream, where the gate holds it
+        await asyncio.sleep(0.01)
+        refreshing = upstream.calls[:]
+        upstream.gate.set()
+        await asyncio.sleep(0.01)
+        return served, again, refreshing
+
+    served, again, refreshing = run(scenario())
+    assert served is first and again is first
+    assert refreshing == ["Delhi", "Delhi"]
+    assert cache.stats()["stale_served"] == 2
+
+    refreshed = run(cache.get("Delhi", upstream))
+    assert refreshed.data["call"] == 2
+    assert refreshed.fresh()
+    assert len(upstream.calls) == 2
+
+
+def test_entry_past_grace_waits_for_upstream(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE)
+    upstream = Upstream()
+    first = run(cache.get("Delhi", upstream))
+
+    clock.now = first.expires_at + GRACE + 1
+    entry = run(cache.get("Delhi", upstream))
+    assert entry is not first and entry.data["call"] == 2
+    assert cache.stats()["stale_served"] == 0
+
+
+def test_memory_tier_evicts_least_recently_used(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=GRACE, max_entries=2)
+    upstream = Upstream()
+    for name in ("Delhi", "Pune", "Delhi", "Agra"):
+        run(cache.get(name, upstream))
+
+    assert cache.peek("Delhi") is not None and cache.peek("Agra") is not None
+    assert cache.peek("Pune") is None
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from conftest import run
+from services.weather_client import CircuitBreaker, CircuitOpen, WeatherClient, WeatherUnavailable
+
+CURRENT = {"main": {"temp": 30.4, "humidity": 55}, "wind": {"speed": 2}, "weather": [{"main": "Clear"}]}
+FORECAST = {
+    "city": {"timezone": 0},
+    "list": [{"dt": 0, "main": {"temp_max": 31, "temp_min": 22}, "weather": [{"main": "Rain"}]}],
+}
+RESET_SECONDS = 0.05
+
+
+def stub_upstream(mode):
+    """Stub provider serving /weather and /forecast; mode["value"] is ok, fail or slow"""
+    async def answer(payload):
+        if mode["value"] == "fail":
+            return web.Response(status=500)
+        if mode["value"] == "slow":
+            await asyncio.sleep(5)
+        return web.json_response(payload)
+
+    async def weather(request):
+        return await answer(CURRENT)
+
+    async def forecast(request):
+        return await answer(FORECAST)
+
+    app = web.Application()
+    app.router.add_get("/weather", weather)
+    app.router.add_get("/forecast", forecast)
+    return TestServer(app)
+
+
+def test_breaker_opens_half_opens_and_closes_again():
+    mode = {"value": "fail"}
+
+    async def scenario():
+        async with stub_upstream(mode) as server:
+            client = WeatherClient(
+                api_key="key", base_url=str(server.make_url("")),
+                breaker=CircuitBreaker(failure_threshold=2, reset_seconds=RESET_SECONDS),
+            )
+            try:
+                for _ in range(2):
+                    with pytest.raises(WeatherUnavailable):
+                        await client.fetch({"q": "Delhi"})
+                assert client.breaker.state == "open"
+                with pytest.raises(CircuitOpen):
+                    await client.fetch({"q": "Delhi"})
+
+                # The trial after the cool-down fails and reopens the circuit
+                await asyncio.sleep(RESET_SECONDS)
+                assert client.breaker.state == "half_open"
+                with pytest.raises(WeatherUnavailable):
+                    await client.fetch({"q": "Delhi"})
+                assert client.breaker.state == "open"
+
+                # A successful trial closes it
+                mode["value"] = "ok"
+                await asyncio.sleep(RESET_SECONDS)
+                data = await client.fetch({"q": "Delhi"})
+                assert data["current"]["temperature"] == 30
+                assert client.breaker.state == "closed"
+            finally:
+                await client.close()
+
+    run(scenario())
+
+
+def test_cancelled_trial_does_not_wedge_the_half_open_breaker():
+    mode = {"value": "fail"}
+
+    async def scenario():
+        async with stub_upstream(mode) as server:
+            client = WeatherClient(
+                api_key="key", base_url=str(server.make_url("")),
+                breaker=CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS),
+            )
+            try:
+                with pytest.raises(WeatherUnavailable):
+                    await client.fetch({"q": "Delhi"})
+                await asyncio.sleep(RESET_SECONDS)
+
+                # The caller gives up on the trial while upstream hangs
+                mode["value"] = "slow"
+                trial = asyncio.create_task(client.fetch({"q": "Delhi"}))
+                await asyncio.sleep(0.05)
+                trial.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await trial
+                assert client.breaker.state == "half_open"
+
+                # The next call is let through as a new trial and closes the circuit
+                mode["value"] = "ok"
+                await client.fetch({"q": "Delhi"})
+                assert client.breaker.state == "closed"
+            finally:
+                await client.close()
+
+    run(scenario())
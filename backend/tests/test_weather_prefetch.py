@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from conftest import run
+from services import weather_prefetch
+from services.weather_cache import WeatherCache
+from services.weather_client import CircuitOpen, WeatherUnavailable
+from services.weather_prefetch import WeatherPrefetcher
+
+REFRESH = 600
+START = REFRESH * 1000 + 100
+BOUNDARY = REFRESH * 1001
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """time.time, asyncio.sleep and random.uniform for the prefetcher, all deterministic"""
+
+    def __init__(self, now, stop_at):
+        self.now = now
+        self.stop_at = stop_at
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        if self.now + delay > self.stop_at:
+            # Park the loop past the end of the test; stop() cancels it
+            await real_sleep(3600)
+        self.now += delay
+        await real_sleep(0)
+
+    @staticmethod
+    def uniform(low, high):
+        return (low + high) / 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(START, stop_at=BOUNDARY + REFRESH - 1)
+    monkeypatch.setattr(weather_prefetch.time, "time", clock.time)
+    monkeypatch.setattr(weather_prefetch.asyncio, "sleep", clock.sleep)
+    monkeypatch.setattr(weather_prefetch.random, "uniform", clock.uniform)
+    return clock
+
+
+def prefetcher_for(db, clock):
+    fetches = []
+
+    async def fetch(location):
+        fetches.append((location, clock.now))
+        return {"current": {}, "forecast": []}
+
+    cache = WeatherCache(db, refresh_seconds=REFRESH, stale_grace=300)
+    prefetcher = WeatherPrefetcher(cache, fetch, top=2, rate=1.0, spread=120, enabled=True)
+    return prefetcher, cache, fetches
+
+
+async def one_round(prefetcher, fetches, expected):
+    prefetcher.start()
+    for _ in range(1000):
+        if len(fetches) >= expected:
+            break
+        await real_sleep(0)
+    for _ in range(10):
+        await real_sleep(0)
+    await prefetcher.stop()
+
+
+def test_hottest_locations_refresh_after_the_window_boundary(db, clock):
+    prefetcher, cache, fetches = prefetcher_for(db, clock)
+    for location, requests in (("Delhi", 5), ("pune", 3), ("Agra", 1)):
+        for _ in range(requests):
+            prefetcher.record(location, None)
+
+    run(one_round(prefetcher, fetches, expected=2))
+
+    # Waits for the boundary, then spreads the top two over the window's first minutes
+    assert clock.sleeps[0] == BOUNDARY - START
+    assert fetches == [("Delhi", BOUNDARY + 30), ("pune", BOUNDARY + 90)]
+    stats = prefetcher.stats()
+    assert (stats["refreshes"], stats["skipped"], stats["failures"]) == (2, 0, 0)
+    assert stats["refresh_lag_seconds"] == {"average": 60.0, "p95": 30.0, "max": 90.0}
+    assert stats["tracked_locations"] == 3
+    assert prefetcher.counts == {"delhi": 2.5, "pune": 1.5, "agra": 0.5}
+    assert not stats["running"]
+
+    # Requests answered by a prefetched entry count as prefetch hits
+    prefetcher.record("Delhi", cache.peek("Delhi"))
+    prefetcher.record("Agra", None)
+    assert prefetcher.stats()["prefetch_hits"] == 1
+    assert prefetcher.stats()["prefetch_hit_ratio"] == round(1 / 11, 4)
+
+
+def test_locations_already_fresh_are_skipped(db, clock):
+    prefetcher, cache, fetches = prefetcher_for(db, clock)
+    prefetcher.record("Delhi", None)
+    prefetcher.record("Pune", None)
+
+    async def scenario():
+        # A request for Pune reaches upstream right after the boundary, before its prefetch turn
+        clock.now = BOUNDARY - 1
+        prefetcher.start()
+        await real_sleep(0)
+        await cache.load("Pune", prefetcher.fetch)
+        await one_round(prefetcher, fetches, expected=2)
+
+    run(scenario())
+    assert [location for location, _ in fetches] == ["Pune", "Delhi"]
+    stats = prefetcher.stats()
+    assert (stats["refreshes"], stats["skipped"]) == (1, 1)
+
+
+def test_failures_are_counted_and_an_open_circuit_ends_the_round(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH)
+    attempted = []
+
+    async def fetch(location):
+        attempted.append(location)
+        if location == "Pune":
+            raise WeatherUnavailable("upstream returned 500")
+        raise CircuitOpen("weather upstream circuit is open")
+
+    prefetcher = WeatherPrefetcher(cache, fetch, top=3, rate=1.0, spread=120, enabled=True)
+    for location, requests in (("Pune", 3), ("Delhi", 2), ("Agra", 1)):
+        for _ in range(requests):
+            prefetcher.record(location, None)
+
+    clock.now = BOUNDARY
+    run(prefetcher.refresh(BOUNDARY))
+    assert attempted == ["Pune", "Delhi"]
+    stats = prefetcher.stats()
+    assert (stats["refreshes"], stats["failures"]) == (0, 1)
+    # Start offset of half the 40 second interval, then one gap after Pune's failure
+    assert clock.sleeps == [20.0, 40.0]
+
+
+def test_rarely_requested_locations_are_forgotten(db, clock):
+    prefetcher, _, _ = prefetcher_for(db, clock)
+    prefetcher.record("Agra", None)
+    for _ in range(3):
+        prefetcher._decay()
+    assert prefetcher.hottest() == ["Agra"]
+    prefetcher._decay()
+    assert prefetcher.hottest() == []
+    assert prefetcher.stats()["tracked_locations"] == 0
+
+
+def test_disabled_prefetcher_never_starts(db, clock):
+    cache = WeatherCache(db, refresh_seconds=REFRESH)
+    prefetcher = WeatherPrefetcher(cache, None, enabled=False)
+
+    async def scenario():
+        prefetcher.start()
+        return prefetcher.stats()["running"]
+
+    assert run(scenario()) is False